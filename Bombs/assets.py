@@ -0,0 +1,12 @@
+import os
+import sys
+
+# asset_manager is shared by every game and lives in the repo root, the modules of this
+# folder import it through here so the root is added to sys.path in a single place.
+# Map, Player, Bombs and GamePrototypeDienix each keep an identical copy of this file: every game
+# runs from its own folder, so this shim is the one thing that can not be shared through the root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from asset_manager import Animations, AtlasAnimations, cache, load_atlas, load_sprite_sheet
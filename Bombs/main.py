@@ -2,6 +2,7 @@
 
 import pygame
 from Map_test import *
+from assets import cache
 
 pygame.init()
 pygame.mixer.init()
@@ -13,9 +14,7 @@ screen = pygame.display.set_mode((draw_width, draw_height))
 
 
 
-explosion_fire_image = pygame.image.load(
-    r"Images\ExplosionFire.png"
-)
+explosion_fire_image = cache.image(r"Images\ExplosionFire.png")
 
 
 
@@ -28,10 +27,10 @@ explosion_sound = pygame.mixer.Sound(
 # ----- LOAD PRE-EXPLOSION ANIMATION FRAMES -----
 # These will be shown BEFORE the bomb explodes
 pre_explosion_frames = [
-    pygame.image.load(r"Images\preExplosion1.png"),
-    pygame.image.load(r"Images\preExplosion2.png"),
-    pygame.image.load(r"Images\preExplosion3.png"),
-    pygame.image.load(r"Images\preExplosion4.png")
+    cache.image(r"Images\preExplosion1.png"),
+    cache.image(r"Images\preExplosion2.png"),
+    cache.image(r"Images\preExplosion3.png"),
+    cache.image(r"Images\preExplosion4.png")
 ]
 
 
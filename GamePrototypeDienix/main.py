@@ -1,59 +1,10 @@
 import os
 import pygame
+from assets import Animations, AtlasAnimations, load_atlas
 
+# built by png_combiner.py, the spritesheets are used when it is missing
+REAPER_ATLAS = os.path.join("GamePrototypeDienix", "atlas", "reaper.json")
 
-def load_sprite_sheet(path, spritesheet_file, num_frames, scale_to_height=None, flipped=False):
-    """ 
-    Load image frames and return image object
-    
-    Args:
-        path (str): Path to the spritesheet directory
-        spritesheet_file (str): Filename of the spritesheet
-        num_frames (int): Number of frames in the spritesheet
-        scale_to_height (int, optional): Height to scale frames to. Defaults to None.
-        flipped (bool, optional): Whether to flip frames horizontally. Defaults to False.
-        Returns: List of pygame.Surface objects representing the frames
-    """
-
-
-    fullname = os.path.join(path, spritesheet_file)
-    try:
-        sheet = pygame.image.load(fullname)
-        if sheet.get_alpha is None:
-            sheet = sheet.convert()
-        else:
-            sheet = sheet.convert_alpha()
-        
-        sheet_width = sheet.get_width()
-        sheet_height = sheet.get_height()
-
-        frame_width = sheet_width // num_frames
-        frame_height = sheet_height
-
-        # Extract frames
-        frames = []
-        for i in range(num_frames):
-            frame = sheet.subsurface(
-                pygame.Rect(i * frame_width, 0, frame_width, frame_height)
-            )
-
-            # Optional scaling (keep aspect ratio)
-            if scale_to_height is not None:
-                scale_factor = scale_to_height / frame_height
-                new_width = int(frame_width * scale_factor)
-                frame = pygame.transform.scale(frame, (new_width, scale_to_height))
-
-            # Optional flipping
-            if flipped:
-                frame = pygame.transform.flip(frame, True, False)
-
-            frames.append(frame)
-
-    except FileNotFoundError:
-        print(f"Cannot load image: {fullname}")
-        raise SystemExit
-    
-    return frames
 
 class Reaper(pygame.sprite.Sprite):
     """
@@ -66,10 +17,12 @@ class Reaper(pygame.sprite.Sprite):
     Args:
         path (str): Path to the spritesheet directory   
         fps (int, optional): Animation frames per second. Defaults to 10.
+        atlas (asset_manager.Atlas, optional): Atlas with a region per state, used instead of
+            the spritesheets. Defaults to None.
     Returns: pygame.sprite.Sprite object
     """
 
-    def __init__(self, path, fps=10):
+    def __init__(self, path, fps=10, atlas=None):
         super().__init__()
         """
         We use Sprite class from pygame to manage our character
@@ -88,30 +41,26 @@ class Reaper(pygame.sprite.Sprite):
         2. we can call all_sprites.draw(screen) to draw all sprites in the group
         """
         self.spritesheet_list_path = path
-        # Load spritesheets for different states and directions using the helper function
-        # to a dictionary for easy access
-        self.spritesheets_dict = {
-            "right":
-                {
-                    "idle": load_sprite_sheet(self.spritesheet_list_path, "idle.png", 18, scale_to_height=100),
-                    "running": load_sprite_sheet(self.spritesheet_list_path, "running.png", 12, scale_to_height=100),
-                    "idle_slashing": load_sprite_sheet(self.spritesheet_list_path, "idle_slashing.png", 12, scale_to_height=100),
-                    "running_slashingg": load_sprite_sheet(self.spritesheet_list_path, "running_slashing.png", 12, scale_to_height=100)
-                },
-            "left":
-                {
-                    "idle": load_sprite_sheet(self.spritesheet_list_path, "idle.png", 18, scale_to_height=100, flipped=True),
-                    "running": load_sprite_sheet(self.spritesheet_list_path, "running.png", 12, scale_to_height=100, flipped=True),
-                    "idle_slashing": load_sprite_sheet(self.spritesheet_list_path, "idle_slashing.png", 12, scale_to_height=100, flipped=True),
-                    "running_slashingg": load_sprite_sheet(self.spritesheet_list_path, "running_slashing.png", 12, scale_to_height=100, flipped=True)
-                },
+        # Load spritesheets for different states and directions using the helper class
+        # to a dictionary for easy access, the "left" frames are mirrored on the first turn
+        sheets = {
+            "idle": ("idle.png", 18),
+            "running": ("running.png", 12),
+            "idle_slashing": ("idle_slashing.png", 12),
+            "running_slashingg": ("running_slashing.png", 12)
         }
+        if atlas is not None:
+            self.spritesheets_dict = AtlasAnimations(atlas, sheets)
+        else:
+            self.spritesheets_dict = Animations(self.spritesheet_list_path, sheets, scale_to_height=100)
 
         self.current_frame = 0
         self.face_direction = "right"
         self.state = "idle"
-        self.image = self.spritesheets_dict[self.face_direction][self.state][self.current_frame]
-        self.rect = self.image.get_rect()
+        # position is the untrimmed frame, it moves and hits the borders
+        # rect is where the current image is drawn, atlas frames are trimmed so it is offset inside position
+        self.position = pygame.Rect((0, 0), self.spritesheets_dict.size(self.state))
+        self.show(self.state, self.current_frame)
 
         # Set initial position to center of the screen
         # So we need to get the screen size to check for collisions with screen borders
@@ -212,12 +161,12 @@ class Reaper(pygame.sprite.Sprite):
 
         # Update position with collision detection against screen borders
         # we create a new rect with the proposed new position
-        newpos = self.rect.move(movepos)
+        newpos = self.position.move(movepos)
         # check if the new position is within the screen area
         if self.area.contains(newpos):
             # if yes, update the rect position
             # else we ignore the movement
-            self.rect = newpos
+            self.position = newpos
         
 
         # Update animation frame
@@ -232,7 +181,8 @@ class Reaper(pygame.sprite.Sprite):
                 elif self.state == "running":
                     self.state = "running_slashingg"
 
-                frames = self.spritesheets_dict[self.face_direction][self.state]
+                slashing_state = self.state
+                frames = self.spritesheets_dict[self.face_direction][slashing_state]
                 self.current_frame += 1
                 if self.current_frame >= len(frames):
                     # End of slashing animation
@@ -243,14 +193,24 @@ class Reaper(pygame.sprite.Sprite):
                         self.state = "running"
                     else:
                         self.state = "idle"
-                self.image = frames[self.current_frame]
+                self.show(slashing_state, self.current_frame)
             else:
                 self.current_frame += 1
                 frames = self.spritesheets_dict[self.face_direction][self.state]
                 if self.current_frame >= len(frames):
                     self.current_frame = 0
-                self.image = frames[self.current_frame]
-        
+                self.show(self.state, self.current_frame)
+
+        self.place()
+
+    def show(self, state, frame):
+        self.image = self.spritesheets_dict[self.face_direction][state][frame]
+        self.image_offset = self.spritesheets_dict.offset(self.face_direction, state, frame)
+        self.place()
+
+    def place(self):
+        # a trimmed atlas frame is drawn where it sat in the untrimmed frame
+        self.rect = self.image.get_rect(topleft=self.position.move(self.image_offset).topleft)
 
 
 def main():
@@ -275,7 +235,8 @@ def main():
 
     # Initialise players
     sprite_seet_path = r"GamePrototypeDienix\spritesheets"
-    player1 = Reaper(sprite_seet_path, fps=20)
+    atlas = load_atlas(REAPER_ATLAS) if os.path.exists(REAPER_ATLAS) else None
+    player1 = Reaper(sprite_seet_path, fps=20, atlas=atlas)
 
     # Initialise sprites
     all_sprites = pygame.sprite.Group()
@@ -1,9 +1,18 @@
+import json
 import pygame
 import os
 
-def make_spritesheet(folder_path, output_file):
+
+def init_display():
+    # convert_alpha() needs a video mode, a hidden 1x1 window gives it one without showing anything.
+    # Called from a running game it keeps the game's window.
     pygame.init()
-    pygame.display.set_mode((1, 1))  # FIX: allow convert_alpha()
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+
+
+def make_spritesheet(folder_path, output_file):
+    init_display()
 
     # Get list of image files
     files = sorted([
@@ -12,7 +21,7 @@ def make_spritesheet(folder_path, output_file):
     ])
 
     if not files:
-        raise Exception("No image files found in folder.")
+        raise FileNotFoundError(f"No image files found in {folder_path}")
 
     # Load first image to get width & height
     first_image = pygame.image.load(os.path.join(folder_path, files[0])).convert_alpha()
@@ -36,9 +45,155 @@ def make_spritesheet(folder_path, output_file):
     print(f"Spritesheet saved as {output_file}")
 
 
+# ---------------- Texture atlas ----------------
+# make_spritesheet keeps every frame at full size in one strip. make_atlas packs many animations
+# and props into a few pages instead: each frame is trimmed to its visible pixels and the
+# frames are placed on shelves, tallest first. A JSON manifest next to the pages records, per
+# frame, the page, the rect on it and where the trimmed rect sat in the untrimmed frame.
+# asset_manager.Atlas reads the manifest back and hands out subsurfaces of the pages.
+#
+# The Reaper of main.py is packed by running this file from the repo root:
+#     python GamePrototypeDienix/png_combiner.py
+# it writes GamePrototypeDienix/atlas/reaper.json and its pages, already scaled to the 100 px
+# the game draws. main.py loads that atlas when it is there (AtlasAnimations): one small page
+# instead of four 900 px high spritesheets. Without it the game falls back to the spritesheets.
+# Run it again after changing the frames in sprites/.
+
+ATLAS_PAGE_SIZE = 2048  # side of a page, what every GPU and SDL renderer accepts
+ATLAS_PADDING = 1  # transparent pixels between frames, so scaling never bleeds a neighbour in
+
+REAPER_SEQUENCES = os.path.join("GamePrototypeDienix", "sprites", "Reaper_Man_1", "PNG", "PNG Sequences")
+REAPER_ATLAS = os.path.join("GamePrototypeDienix", "atlas", "reaper.json")
+# region (the state name in main.Reaper) -> folder of its frames
+REAPER_REGIONS = {
+    "idle": "Idle",
+    "running": "Running",
+    "idle_slashing": "Slashing",
+    "running_slashingg": "Run Slashing",
+}
+
+
+def image_files(path):
+    # a folder is an animation, its frames in file name order; a file is a single frame
+    if os.path.isdir(path):
+        return [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.lower().endswith((".png", ".jpg"))]
+    return [path]
+
+
+def trimmed_frame(filename, scale_to_height=None):
+    """
+    Returns: tuple (trimmed pygame.Surface, (x, y) of the trimmed rect in the frame, (w, h) of the frame)
+    """
+
+    image = pygame.image.load(filename).convert_alpha()
+    if scale_to_height is not None:
+        width = int(image.get_width() * scale_to_height / image.get_height())
+        image = pygame.transform.scale(image, (width, scale_to_height))
+    bounds = image.get_bounding_rect()
+    if bounds.width == 0 or bounds.height == 0:
+        bounds = pygame.Rect(0, 0, 1, 1)  # fully transparent, keep one pixel so it still has a region
+    return image.subsurface(bounds).copy(), bounds.topleft, image.get_size()
+
+
+class ShelfPacker:
+    """
+    Places rects on horizontal shelves of fixed size pages, a new page when none fits
+
+    Rects have to come tallest first: a shelf is as high as its first rect, the ones after it
+    fit under that height.
+    """
+
+    def __init__(self, page_size, padding):
+        self.page_size = page_size
+        self.padding = padding
+        self.pages = []  # per page: list of shelves [y, height, next x], and the next free y
+
+    def place(self, width, height):
+        """
+        Returns: tuple (page, x, y)
+        Raises: ValueError if the rect is bigger than a page
+        """
+
+        width += self.padding
+        height += self.padding
+        if width > self.page_size or height > self.page_size:
+            raise ValueError(f"A {width}x{height} frame does not fit a {self.page_size} page")
+        for page, (shelves, _) in enumerate(self.pages):
+            for shelf in shelves:
+                if height <= shelf[1] and shelf[2] + width <= self.page_size:
+                    x = shelf[2]
+                    shelf[2] += width
+                    return page, x, shelf[0]
+        for page, entry in enumerate(self.pages):
+            if entry[1] + height <= self.page_size:
+                entry[0].append([entry[1], height, width])
+                entry[1] += height
+                return page, 0, entry[0][-1][0]
+        self.pages.append([[[0, height, width]], height])
+        return len(self.pages) - 1, 0, 0
+
+    def page_height(self, page):
+        return self.pages[page][1]
+
+
+def make_atlas(sources, output_dir, name="atlas", scale_to_height=None, page_size=ATLAS_PAGE_SIZE,
+               padding=ATLAS_PADDING):
+    """
+    Pack animations and props into a few pages plus a manifest
+
+    Args:
+        sources (dict): Region name -> folder of frames (an animation) or image file (a prop)
+        output_dir (str): Folder for the pages and the manifest
+        name (str, optional): Prefix of the files, pages are name_0.png, name_1.png...
+            and the manifest name.json. Defaults to "atlas".
+        scale_to_height (int, optional): Height to scale the untrimmed frames to. Defaults to None.
+        page_size (int, optional): Side of a page. Defaults to ATLAS_PAGE_SIZE.
+        padding (int, optional): Pixels between frames. Defaults to ATLAS_PADDING.
+    Returns: path of the manifest
+    """
+
+    init_display()
+
+    frames = []  # (region, index, trimmed surface, offset, size)
+    regions = {}  # region -> manifest entry of each frame
+    for region, path in sources.items():
+        files = image_files(path)
+        if not files:
+            raise FileNotFoundError(f"No image files found for {region}: {path}")
+        regions[region] = [None] * len(files)
+        for index, filename in enumerate(files):
+            frames.append((region, index) + trimmed_frame(filename, scale_to_height))
+
+    packer = ShelfPacker(page_size, padding)
+    placed = []
+    for region, index, image, offset, size in sorted(frames, key=lambda frame: -frame[2].get_height()):
+        placed.append((region, index, image, offset, size) + packer.place(*image.get_size()))
+
+    pages = [pygame.Surface((page_size, packer.page_height(page)), pygame.SRCALPHA)
+             for page in range(len(packer.pages))]
+    for region, index, image, offset, size, page, x, y in placed:
+        pages[page].blit(image, (x, y))
+        regions[region][index] = {"page": page, "rect": [x, y, image.get_width(), image.get_height()],
+                                  "offset": list(offset), "size": list(size)}
+
+    os.makedirs(output_dir, exist_ok=True)
+    page_files = []
+    for page, surface in enumerate(pages):
+        page_files.append(f"{name}_{page}.png")
+        pygame.image.save(surface, os.path.join(output_dir, page_files[-1]))
+    manifest = os.path.join(output_dir, f"{name}.json")
+    with open(manifest, "w") as file:
+        json.dump({"pages": page_files, "regions": regions}, file, indent=1)
+    print(f"Atlas saved as {manifest}: {len(frames)} frames on {len(pages)} pages")
+    return manifest
+
+
+def make_reaper_atlas():
+    sources = {region: os.path.join(REAPER_SEQUENCES, folder) for region, folder in REAPER_REGIONS.items()}
+    name = os.path.splitext(os.path.basename(REAPER_ATLAS))[0]
+    return make_atlas(sources, os.path.dirname(REAPER_ATLAS), name=name, scale_to_height=100)
+
+
 # Example use
 if __name__ == "__main__":
-    make_spritesheet(
-        r"GamePrototypeDienix\sprites\Reaper_Man_1\PNG\PNG Sequences\Run Slashing",
-        r"GamePrototypeDienix\spritesheets\running_slashing.png"
-    )
+    make_reaper_atlas()
@@ -1,79 +1,10 @@
 import pygame
 import random
-import os
+from assets import load_sprite_sheet
 
 #!!! Only odd numbers for MAP_TILES to ensure maze generation works properly !!!
 MAP_TILES = 19
 
-def load_sprite_sheet(path, spritesheet_file, num_frames = 1, scale_to_height=None, flipped=False):
-    """ 
-    Load image frames and return image object
-    
-    Args:
-        path (str): Path to the spritesheet directory
-        spritesheet_file (str): Filename of the spritesheet
-        num_frames (int, optional): Number of frames in the spritesheet. Defaults to 1.
-        scale_to_height (int, optional): Height to scale frames to. Defaults to None.
-        flipped (bool, optional): Whether to flip frames horizontally. Defaults to False.
-        Returns: List of pygame.Surface objects representing the frames
-    """
-
-
-    fullname = os.path.join(path, spritesheet_file)
-    try:
-        sheet = pygame.image.load(fullname)
-        if sheet.get_alpha is None:
-            sheet = sheet.convert()
-        else:
-            sheet = sheet.convert_alpha()
-        
-        sheet_width = sheet.get_width()
-        sheet_height = sheet.get_height()
-
-        frame_width = sheet_width // num_frames
-        frame_height = sheet_height
-
-        if num_frames > 1:
-            # Extract frames
-            frames = []
-            for i in range(num_frames):
-                frame = sheet.subsurface(
-                    pygame.Rect(i * frame_width, 0, frame_width, frame_height)
-                )
-
-                # Optional scaling (keep aspect ratio)
-                if scale_to_height is not None:
-                    scale_factor = scale_to_height / frame_height
-                    new_width = int(frame_width * scale_factor)
-                    frame = pygame.transform.scale(frame, (new_width, scale_to_height))
-
-                # Optional flipping
-                if flipped:
-                    frame = pygame.transform.flip(frame, True, False)
-
-                frames.append(frame)
-
-        else:
-            # Single frame (no subsurfaces needed)
-            frames = sheet
-
-            # Optional scaling (keep aspect ratio)
-            if scale_to_height is not None:
-                scale_factor = scale_to_height / frame_height
-                new_width = int(frame_width * scale_factor)
-                frames = pygame.transform.scale(frames, (new_width, scale_to_height))
-
-            # Optional flipping
-            if flipped:
-                frames = pygame.transform.flip(frames, True, False)
-
-    except FileNotFoundError:
-        print(f"Cannot load image: {fullname}")
-        raise SystemExit
-    
-    return frames
-
-
 class Map:
     """
     class to handle map generation and rendering
@@ -1,60 +1,7 @@
-import os
 import pygame
+from assets import Animations
 
 
-def load_sprite_sheet(path, spritesheet_file, num_frames, scale_to_height=None, flipped=False):
-    """ 
-    Load image frames and return image object
-    
-    Args:
-        path (str): Path to the spritesheet directory
-        spritesheet_file (str): Filename of the spritesheet
-        num_frames (int): Number of frames in the spritesheet
-        scale_to_height (int, optional): Height to scale frames to. Defaults to None.
-        flipped (bool, optional): Whether to flip frames horizontally. Defaults to False.
-        Returns: List of pygame.Surface objects representing the frames
-    """
-
-
-    fullname = os.path.join(path, spritesheet_file)
-    try:
-        sheet = pygame.image.load(fullname)
-        if sheet.get_alpha is None:
-            sheet = sheet.convert()
-        else:
-            sheet = sheet.convert_alpha()
-        
-        sheet_width = sheet.get_width()
-        sheet_height = sheet.get_height()
-
-        frame_width = sheet_width // num_frames
-        frame_height = sheet_height
-
-        # Extract frames
-        frames = []
-        for i in range(num_frames):
-            frame = sheet.subsurface(
-                pygame.Rect(i * frame_width, 0, frame_width, frame_height)
-            )
-
-            # Optional scaling (keep aspect ratio)
-            if scale_to_height is not None:
-                scale_factor = scale_to_height / frame_height
-                new_width = int(frame_width * scale_factor)
-                frame = pygame.transform.scale(frame, (new_width, scale_to_height))
-
-            # Optional flipping
-            if flipped:
-                frame = pygame.transform.flip(frame, True, False)
-
-            frames.append(frame)
-
-    except FileNotFoundError:
-        print(f"Cannot load image: {fullname}")
-        raise SystemExit
-    
-    return frames
-
 class Reaper(pygame.sprite.Sprite):
     """
     Reaper character class with movement and animation
@@ -88,24 +35,14 @@ class Reaper(pygame.sprite.Sprite):
         2. we can call all_sprites.draw(screen) to draw all sprites in the group
         """
         self.spritesheet_list_path = path
-        # Load spritesheets for different states and directions using the helper function
-        # to a dictionary for easy access
-        self.spritesheets_dict = {
-            "right":
-                {
-                    "idle": load_sprite_sheet(self.spritesheet_list_path, "idle.png", 18, scale_to_height),
-                    "running": load_sprite_sheet(self.spritesheet_list_path, "running.png", 12, scale_to_height),
-                    "idle_slashing": load_sprite_sheet(self.spritesheet_list_path, "idle_slashing.png", 12, scale_to_height),
-                    "running_slashingg": load_sprite_sheet(self.spritesheet_list_path, "running_slashing.png", 12, scale_to_height)
-                },
-            "left":
-                {
-                    "idle": load_sprite_sheet(self.spritesheet_list_path, "idle.png", 18, scale_to_height, flipped=True),
-                    "running": load_sprite_sheet(self.spritesheet_list_path, "running.png", 12, scale_to_height, flipped=True),
-                    "idle_slashing": load_sprite_sheet(self.spritesheet_list_path, "idle_slashing.png", 12, scale_to_height, flipped=True),
-                    "running_slashingg": load_sprite_sheet(self.spritesheet_list_path, "running_slashing.png", 12, scale_to_height, flipped=True)
-                },
-        }
+        # Load spritesheets for different states and directions using the helper class
+        # to a dictionary for easy access, the "left" frames are mirrored on the first turn
+        self.spritesheets_dict = Animations(self.spritesheet_list_path, {
+            "idle": ("idle.png", 18),
+            "running": ("running.png", 12),
+            "idle_slashing": ("idle_slashing.png", 12),
+            "running_slashingg": ("running_slashing.png", 12)
+        }, scale_to_height=scale_to_height)
 
         self.current_frame = 0
         self.face_direction = "right"
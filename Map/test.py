@@ -1,79 +1,11 @@
 import pygame
 import random
-import os
 from player import *
+from assets import cache, load_sprite_sheet
 
 #!!! Only odd numbers for MAP_TILES to ensure maze generation works properly !!!
 MAP_TILES = 13
-
-def load_sprite_sheet(path, spritesheet_file, num_frames = 1, scale_to_height=None, flipped=False):
-    """ 
-    Load image frames and return image object
-    
-    Args:
-        path (str): Path to the spritesheet directory
-        spritesheet_file (str): Filename of the spritesheet
-        num_frames (int, optional): Number of frames in the spritesheet. Defaults to 1.
-        scale_to_height (int, optional): Height to scale frames to. Defaults to None.
-        flipped (bool, optional): Whether to flip frames horizontally. Defaults to False.
-        Returns: List of pygame.Surface objects representing the frames
-    """
-
-
-    fullname = os.path.join(path, spritesheet_file)
-    try:
-        sheet = pygame.image.load(fullname)
-        if sheet.get_alpha is None:
-            sheet = sheet.convert()
-        else:
-            sheet = sheet.convert_alpha()
-        
-        sheet_width = sheet.get_width()
-        sheet_height = sheet.get_height()
-
-        frame_width = sheet_width // num_frames
-        frame_height = sheet_height
-
-        if num_frames > 1:
-            # Extract frames
-            frames = []
-            for i in range(num_frames):
-                frame = sheet.subsurface(
-                    pygame.Rect(i * frame_width, 0, frame_width, frame_height)
-                )
-
-                # Optional scaling (keep aspect ratio)
-                if scale_to_height is not None:
-                    scale_factor = scale_to_height / frame_height
-                    new_width = int(frame_width * scale_factor)
-                    frame = pygame.transform.scale(frame, (new_width, scale_to_height))
-
-                # Optional flipping
-                if flipped:
-                    frame = pygame.transform.flip(frame, True, False)
-
-                frames.append(frame)
-
-        else:
-            # Single frame (no subsurfaces needed)
-            frames = sheet
-
-            # Optional scaling (keep aspect ratio)
-            if scale_to_height is not None:
-                scale_factor = scale_to_height / frame_height
-                new_width = int(frame_width * scale_factor)
-                frames = pygame.transform.scale(frames, (new_width, scale_to_height))
-
-            # Optional flipping
-            if flipped:
-                frames = pygame.transform.flip(frames, True, False)
-
-    except FileNotFoundError:
-        print(f"Cannot load image: {fullname}")
-        raise SystemExit
-    
-    return frames
-
+SCREEN_SIZE = (1000, 500) # Sprites are scaled to it, build_bundle.py uses it too
 
 class Map:
     """
@@ -296,24 +228,36 @@ class Wall(pygame.sprite.Sprite):
 
 
 
+def load_game(map_path, sprite_seet_path):
+    """
+    Map and player of the first frame, build_bundle.py loads the same
+    Returns: tuple (Map, Reaper)
+    """
+
+    map = Map(map_path, MAP_TILES)
+    map.draw( )
+
+    # Initialise players
+    player1 = Reaper(sprite_seet_path, map.collision_borders, fps=40, scale_to_height=map.tile_height, )
+    player1.rect.topleft = map.collision_borders.topleft
+    return map, player1
+
+
 def main():
     # Initialise screen
     pygame.init()
-    screen = pygame.display.set_mode((1000, 500))
+    screen = pygame.display.set_mode(SCREEN_SIZE)
     pygame.display.set_caption("Dienix Game Prototype")
 
-    map = Map(r"Map\map_tiles_assets", MAP_TILES)
-    map.draw( )
+    # Sprites come from the prebuilt bundle when there is one (python build_bundle.py)
+    cache.mount()
+
+    map, player1 = load_game(r"Map\map_tiles_assets", r"GamePrototypeDienix\spritesheets")
     sturdy_walls = map.sturdy_walls_sprites_group
     broken_walls = map.broken_walls_sprites_group
 
     screen.blit(map.image, map.rect)
 
-    # Initialise players
-    sprite_seet_path = r"GamePrototypeDienix\spritesheets"
-    player1 = Reaper(sprite_seet_path, map.collision_borders, fps=40, scale_to_height=map.tile_height, )
-    player1.rect.topleft = map.collision_borders.topleft
-
     # Initialise sprites
     all_sprites = pygame.sprite.Group()
     all_sprites.add(player1)
@@ -1,5 +1,4 @@
 import pygame
-import os
 import random
 from Player import Player
 from map import *
@@ -21,7 +20,6 @@ MAP_W, MAP_H = 10, 10
 
 
 
-main_tile_group = pygame.sprite.Group()
 unbreakable_props_group = pygame.sprite.Group()
 breakable_props_group = pygame.sprite.Group()
 
@@ -30,7 +28,7 @@ my_player_group = pygame.sprite.Group()
 my_player_group.add(p1)
 
 
-map = Map(screen,4,6,main_tile_group,unbreakable_props_group,breakable_props_group)
+map = Map(screen,4,6,unbreakable_props_group,breakable_props_group)
 
 all_sprites = YAwareGroup()
 for prop in unbreakable_props_group:
@@ -55,7 +53,7 @@ while running:
 
     map.update()
     #Draw tiles
-    main_tile_group.draw(screen)     # ΤΑ tiles ΠΑΝΤΑ πρώτα
+    map.draw_tiles(screen)           # ΤΑ tiles ΠΑΝΤΑ πρώτα
     all_sprites.update()             # update όλων
     all_sprites.draw(screen)         # depth sorting όλων
     
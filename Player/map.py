@@ -1,5 +1,8 @@
+import os
 import pygame, random
+from array import array
 from mySprites import *
+from assets import cache
 
 TILE_SIZE = 48
 
@@ -21,16 +24,36 @@ BR_PROP_DATA = {
 }
 
 
-class Tile(pygame.sprite.Sprite):
+class TileSet():
+    """
+    Floor tile variants, loaded and scaled once and shared by every cell of every map
+    A map keeps one index per cell into variants instead of a sprite per tile.
+    Only the folder is listed up front, a variant is decoded the first time a map uses it.
 
-    def __init__(self, x, y, group):
-        super().__init__()
-        
-        self.image = load_random_image("tiles/Tiles",TILE_SIZE)
-        group.add(self)
+    Args:
+        folder (str): Folder of the tile .png files
+        tile_size (int): Side of a tile in pixels
+    """
+
+    def __init__(self, folder, tile_size):
+        self.folder = folder
+        self.tile_size = tile_size
+        self.files = cache.png_files(folder)
+        if not self.files:
+            raise FileNotFoundError(f"No tile .png files in {folder}")
+        self.variants = [None] * len(self.files)  # None until used
+
+    def random_indexes(self, count, rng):
+        # array("B") is a byte per cell, the tile sets have far fewer than 256 variants
+        return array("B", (rng.randrange(len(self.files)) for _ in range(count)))
+
+    def load(self, indexes):
+        """Decode the variants of these indexes that are not loaded yet"""
 
-        self.rect = self.image.get_rect()
-        self.rect.topleft = (x, y)
+        for index in set(indexes):
+            if self.variants[index] is None:
+                self.variants[index] = cache.image(os.path.join(self.folder, self.files[index]),
+                                                   size=(self.tile_size, self.tile_size))
 
 
 
@@ -42,13 +65,8 @@ class UnbreakableProps(pygame.sprite.Sprite):
             self.screen = screen           
             self.data = UNB_PROP_DATA[prop_type]
 
-            # --- LOAD & SCALE SPRITE ---
-            self.image = pygame.image.load(self.data["file"]).convert_alpha()
-            self.image = pygame.transform.scale(
-                self.image,
-                (int(self.image.get_width() * self.data["scale"]),
-                int(self.image.get_height() * self.data["scale"]))
-            )
+            # --- LOAD & SCALE SPRITE (decoded once, shared by every prop of this type) ---
+            self.image = cache.image(self.data["file"], scale=self.data["scale"])
 
             # --- RENDER RECT (where sprite is drawn) ---
             self.render_rect = self.image.get_rect()
@@ -79,13 +97,8 @@ class BreakableProps(pygame.sprite.Sprite):
 
             self.data = BR_PROP_DATA[prop_type]
 
-            # --- LOAD & SCALE SPRITE ---
-            self.image = pygame.image.load(self.data["file"]).convert_alpha()
-            self.image = pygame.transform.scale(
-                self.image,
-                (int(self.image.get_width() * self.data["scale"]),
-                int(self.image.get_height() * self.data["scale"]))
-            )
+            # --- LOAD & SCALE SPRITE (decoded once, shared by every prop of this type) ---
+            self.image = cache.image(self.data["file"], scale=self.data["scale"])
 
             # --- RENDER RECT (where sprite is drawn) ---
             self.render_rect = self.image.get_rect()
@@ -108,9 +121,14 @@ class BreakableProps(pygame.sprite.Sprite):
 
 
 class Map():
-    def __init__(self, screen, map_pos_x, map_pos_y, tiles_group, unb_props_group, brk_props_group):
+    """
+    Args:
+        seed (int, optional): Seed of the random tile variants, the same seed gives the same floor.
+            Defaults to None, a different floor every run.
+    """
+
+    def __init__(self, screen, map_pos_x, map_pos_y, unb_props_group, brk_props_group, seed=None):
 
-        self.tiles = tiles_group
         self.unb_props = unb_props_group
         self.brk_props = brk_props_group
         self.screen = screen
@@ -131,14 +149,19 @@ class Map():
             [2,0,0,0,0,0,0,0,0,2],
         ]
 
+        # --- FLOOR (one variant index per cell, row by row) ---
+        self.tile_set = TileSet("tiles/Tiles", TILE_SIZE)
+        self.rows = len(self.map)
+        self.cols = len(self.map[0])
+        self.tile_indexes = self.tile_set.random_indexes(self.rows * self.cols, random.Random(seed))
+        self.tile_set.load(self.tile_indexes)
+
         for i in range(len(self.map)):
             for j in range(len(self.map[i])):
 
                 world_x = self.map_pos_x * TILE_SIZE + j * TILE_SIZE
                 world_y = self.map_pos_y * TILE_SIZE + i * TILE_SIZE
 
-                Tile(world_x, world_y, self.tiles)
-
                 if self.map[i][j] != 0:
                     UnbreakableProps(world_x, world_y, self.map[i][j], self.screen, self.unb_props)
                     BreakableProps(world_x, world_y, self.map[i][j], self.screen, self.brk_props)
@@ -147,6 +170,13 @@ class Map():
     def update(self):
         pass
 
+    def draw_tiles(self, surface):
+        variants = self.tile_set.variants
+        x0 = self.map_pos_x * TILE_SIZE
+        y0 = self.map_pos_y * TILE_SIZE
+        surface.blits([(variants[index], (x0 + (cell % self.cols) * TILE_SIZE, y0 + (cell // self.cols) * TILE_SIZE))
+                       for cell, index in enumerate(self.tile_indexes)], False)
+
 
 
 #Ταξινομει τα αντικειμενα με βαση το y στα ποδια τους
@@ -177,7 +207,6 @@ def main():
 
 
 
-    main_tile_group = pygame.sprite.Group()
     unbreakable_props_group = pygame.sprite.Group()
     breakble = pygame.sprite.Group()
 
@@ -186,7 +215,7 @@ def main():
 
     clock = pygame.time.Clock()
     
-    map = Map(display_surface,6,4,main_tile_group,unbreakable_props_group, breakble)
+    map = Map(display_surface,6,4,unbreakable_props_group, breakble)
    
 
     running =True
@@ -200,7 +229,7 @@ def main():
         display_surface.fill((0,0,0))
         map.update()
         #Draw tiles
-        main_tile_group.draw(display_surface)
+        map.draw_tiles(display_surface)
 
         unbreakable_props_group.update()
         for prop in unbreakable_props_group:
@@ -1,5 +1,6 @@
 import pygame, random
 import os
+from assets import cache
 
 
 
@@ -11,12 +12,8 @@ def load_filed_sprites(FILE, frames_count, SCALE):
     try:
         for file in sorted(os.listdir(FILE)):
             if file.endswith(".png"):
-                img = pygame.image.load(os.path.join(FILE, file)).convert_alpha()
-
-                img = pygame.transform.scale(
-                    img,
-                    (img.get_width() * SCALE, img.get_height() * SCALE)
-                )
+                # decoded and scaled once, later calls cut the frames from the cached image
+                img = cache.image(os.path.join(FILE, file), scale=SCALE)
 
                 frame_w = img.get_width() // frames_count   # 4 frames horizontally
                 frame_h = img.get_height()
@@ -41,12 +38,7 @@ def load_sprite(filename, frames_count, scale_amount):
     try:
         for file in sorted(os.listdir(filename)):
             if file.endswith(".png"):
-                img = pygame.image.load(os.path.join(filename, file)).convert_alpha()
-
-                img = pygame.transform.scale(
-                    img,
-                    (img.get_width() * scale_amount, img.get_height() * scale_amount)
-                )
+                img = cache.image(os.path.join(filename, file), scale=scale_amount)
 
                 frame_w = img.get_width() // frames_count   # 4 frames horizontally
                 frame_h = img.get_height()
@@ -66,22 +58,18 @@ def load_tiles(folder, tile_size):
     for filename in os.listdir(folder):
         if filename.endswith(".png"):
             img_path = os.path.join(folder, filename)
-            image = pygame.image.load(img_path).convert_alpha()
-            image = pygame.transform.scale(image, (tile_size, tile_size))
-            tiles.append(image)
+            tiles.append(cache.image(img_path, size=(tile_size, tile_size)))
     return tiles
 
 def load_random_image(folder, tile_size):
     # Πάρε όλα τα .png από τον φάκελο
-    files = [f for f in os.listdir(folder) if f.endswith(".png")]
+    files = cache.png_files(folder)  # ο φάκελος διαβάζεται μία φορά
 
     # Διάλεξε τυχαία μία
     chosen = random.choice(files)
 
     # Φόρτωσε την εικόνα
-    img = pygame.image.load(os.path.join(folder, chosen)).convert_alpha()
-    img = pygame.transform.scale(img, (tile_size, tile_size))
-    return img
+    return cache.image(os.path.join(folder, chosen), size=(tile_size, tile_size))
 
 
 
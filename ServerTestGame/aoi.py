@@ -0,0 +1,128 @@
+# Area of interest filtering
+# The server keeps every player in a uniform grid so it can find who is near a client
+# without looking at every other player. Each client only gets the players inside its
+# view rectangle plus a margin. Leaving uses a bigger margin than entering, so a player
+# walking along the border does not flicker in and out of the snapshots.
+# The view follows the client's player like a camera that stops at the world edges, so a view
+# as big as the world shows all of it.
+
+
+class SpatialGrid:
+    """
+    Uniform grid of entity positions
+
+    Args:
+        cell_size (int): Width and height of one cell in pixels
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> set of entity ids
+        self.entity_cells = {}  # entity id -> (cx, cy)
+        self.positions = {}  # entity id -> (x, y)
+
+    def cell_of(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, entity_id, x, y):
+        self.positions[entity_id] = (x, y)
+        cell = self.cell_of(x, y)
+        self.entity_cells[entity_id] = cell
+        self.cells.setdefault(cell, set()).add(entity_id)
+
+    def remove(self, entity_id):
+        self.positions.pop(entity_id, None)
+        cell = self.entity_cells.pop(entity_id, None)
+        if cell is None:
+            return
+        members = self.cells[cell]
+        members.discard(entity_id)
+        if not members:
+            del self.cells[cell]
+
+    def move(self, entity_id, x, y):
+        cell = self.cell_of(x, y)
+        if self.entity_cells.get(entity_id) != cell:
+            self.remove(entity_id)
+            self.entity_cells[entity_id] = cell
+            self.cells.setdefault(cell, set()).add(entity_id)
+        self.positions[entity_id] = (x, y)
+
+    def query(self, left, top, right, bottom):
+        """
+        Entities whose cell touches the rectangle
+        The result can hold entities a little outside the rectangle (same cell), that is fine for interest management
+        Returns: set of entity ids
+        """
+
+        min_cx, min_cy = self.cell_of(left, top)
+        max_cx, max_cy = self.cell_of(right, bottom)
+        found = set()
+        cells = self.cells
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(cells):
+            # rectangle covers more cells than are occupied, walk the occupied ones
+            for (cx, cy), members in cells.items():
+                if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy:
+                    found |= members
+            return found
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                members = cells.get((cx, cy))
+                if members:
+                    found |= members
+        return found
+
+
+def covers_world(view_size, world_size):
+    """
+    True when the view shows the whole world wherever its player is, filtering would only cost time
+    """
+
+    return view_size[0] >= world_size[0] and view_size[1] >= world_size[1]
+
+
+def camera_center(center, view_size, world_size):
+    """
+    Center of a view that follows a point but does not leave the world
+    Args:
+        center (tuple): (x, y) the view follows, usually the middle of the client's player
+        view_size (tuple): (width, height) of the view
+        world_size (tuple): (width, height) of the world, it starts at (0, 0)
+    Returns: tuple (x, y)
+    """
+
+    return tuple(world / 2 if view >= world else min(max(point, view / 2), world - view / 2)
+                 for point, view, world in zip(center, view_size, world_size))
+
+
+def update_visible(grid, visible, center, view_size, margin):
+    """
+    Work out which entities a client should receive this tick
+    Args:
+        grid (SpatialGrid): Grid with every entity
+        visible (set): Entities the client received last time
+        center (tuple): (x, y) the client's view is centered on, usually its own player
+        view_size (tuple): (width, height) of the client's view
+        margin (int): Entities within this many pixels outside the view enter, they leave at twice the margin
+    Returns: set of entity ids
+    """
+
+    half_w = view_size[0] / 2 + margin
+    half_h = view_size[1] / 2 + margin
+    x, y = center
+    # one grid query for the bigger leave rectangle, then exact checks: against the leave
+    # rectangle for entities already visible, against the enter rectangle for the others
+    leave_left, leave_top = x - half_w - margin, y - half_h - margin
+    leave_right, leave_bottom = x + half_w + margin, y + half_h + margin
+    enter_left, enter_top, enter_right, enter_bottom = x - half_w, y - half_h, x + half_w, y + half_h
+    candidates = grid.query(leave_left, leave_top, leave_right, leave_bottom)
+    positions = grid.positions
+    result = set()
+    for entity_id in candidates:
+        ex, ey = positions[entity_id]
+        if entity_id in visible:
+            if leave_left <= ex <= leave_right and leave_top <= ey <= leave_bottom:
+                result.add(entity_id)
+        elif enter_left <= ex <= enter_right and enter_top <= ey <= enter_bottom:
+            result.add(entity_id)
+    return result
@@ -0,0 +1,84 @@
+"""
+Benchmark: per tick snapshot cost with area of interest filtering on and off
+
+64 players wander around a 4000x4000 world, then around the 600x600 world of the game,
+every tick each client gets a snapshot. The game's view (VIEW_SIZE) is the whole window, in the
+small world it covers everything and the room does not filter at all. The half window view
+filters in both worlds, clients seeing the same players share encoded frames.
+Run from the ServerTestGame folder:
+    python bench_aoi.py
+"""
+
+import random
+import time
+import protocol
+import server
+from snapshots import SnapshotHistory
+
+PLAYERS = 64
+WORLDS = ((4000, 4000), (server.W, server.H))
+TICKS = 300
+VIEWS = (("unfiltered", None), ("game view", server.VIEW_SIZE), ("half view", (server.W // 2, server.H // 2)))
+
+
+class BenchClient:
+    """Stand-in for a connection, counts bytes instead of sending them"""
+
+    def __init__(self, player):
+        self.player = player
+        self.history = SnapshotHistory()
+        self.visible = set()
+        self.sent = 0
+
+    def send(self, data, reliable=False):
+        self.sent += len(data)
+        # acknowledge right away, like a client on a fast link
+        self.history.ack(self.history.order[-1])
+
+    def send_snapshot(self, parts):
+        self.send(b"".join(parts))
+
+
+def run(view_size, world, seed=1):
+    rng = random.Random(seed)
+    game = server.Room(1, tick_rate=60, snapshot_rate=60, view_size=view_size,
+                       bounds=(world[0] - server.RectW, world[1] - server.RectH))
+    for _ in range(PLAYERS):
+        player = game.state.join()
+        player.x, player.y = rng.randrange(game.state.bounds[0]), rng.randrange(game.state.bounds[1])
+        game.state.grid.move(player.id, player.x, player.y)
+        game.clients[player.id] = BenchClient(player)
+
+    keys = [protocol.KEY_LEFT, protocol.KEY_RIGHT, protocol.KEY_UP, protocol.KEY_DOWN]
+    held = {player_id: rng.choice(keys) for player_id in game.clients}
+    seq = 0
+    duration = 0.0
+    for _ in range(TICKS):
+        seq += 1
+        for player_id, client in game.clients.items():
+            if rng.random() < 0.05:
+                held[player_id] = rng.choice(keys)
+            client.player.inputs.append((seq, held[player_id]))
+        start = time.perf_counter()
+        game.run_tick()
+        duration += time.perf_counter() - start
+
+    sent = sum(client.sent for client in game.clients.values())
+    visible = sum(len(client.visible) for client in game.clients.values()) / PLAYERS
+    return duration / TICKS, sent / TICKS / PLAYERS, visible, game.view_size is not None
+
+
+def main():
+    for world in WORLDS:
+        print(f"{PLAYERS} players, {world[0]}x{world[1]} world, {TICKS} ticks")
+        print(f"{'mode':<12}{'ms/tick':>10}{'bytes/client/tick':>20}{'players seen':>15}")
+        for name, view_size in VIEWS:
+            tick_time, per_client, visible, filtered = run(view_size, world)
+            if not filtered:
+                visible = PLAYERS
+            print(f"{name:<12}{tick_time * 1000:>10.3f}{per_client:>20.1f}{visible:>15.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
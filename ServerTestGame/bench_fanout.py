@@ -0,0 +1,101 @@
+"""
+Benchmark: CPU cost of broadcasting one room snapshot to every client
+
+    pickle        pickle.dumps of the players for each client, the old server
+    per client    protocol delta encoded separately for each client, then send()
+    shared        encoded once per baseline, shared frame + 4 byte trailer with sendmsg()
+
+Every client is a real socketpair, the receiving ends are drained after each broadcast.
+Every player moves every tick and every client acknowledges right away.
+Run from the ServerTestGame folder:
+    python bench_fanout.py
+"""
+
+import pickle
+import random
+import socket
+import time
+from snapshots import SnapshotHistory
+
+ROOM_SIZES = (2, 8, 16, 32, 64)
+ROUNDS = 300
+COLOR = (0, 200, 255)
+
+
+def make_sockets(count):
+    pairs = [socket.socketpair() for _ in range(count)]
+    for sender, receiver in pairs:
+        receiver.setblocking(False)
+    return pairs
+
+
+def drain(pairs):
+    for _, receiver in pairs:
+        try:
+            while receiver.recv(65536):
+                pass
+        except BlockingIOError:
+            pass
+
+
+def states(players, rng):
+    positions = {player_id: [rng.randrange(550), rng.randrange(550)] for player_id in range(1, players + 1)}
+    for _ in range(ROUNDS):
+        for position in positions.values():
+            position[0] = (position[0] + 3) % 550
+            position[1] = (position[1] + rng.choice((-3, 0, 3))) % 550
+        yield {player_id: (x, y, COLOR) for player_id, (x, y) in positions.items()}
+
+
+def bench_pickle(players, pairs, rng):
+    duration = 0.0
+    for tick, state in enumerate(states(players, rng), 1):
+        start = time.process_time()
+        entities = [{"id": player_id, "color": color, "position": (x, y)} for player_id, (x, y, color) in state.items()]
+        for sender, _ in pairs:
+            sender.send(pickle.dumps(entities))
+        duration += time.process_time() - start
+        drain(pairs)
+    return duration
+
+
+def bench_encode(players, pairs, rng, shared):
+    histories = [SnapshotHistory() for _ in pairs]
+    sendmsg = shared and hasattr(socket.socket, "sendmsg")
+    duration = 0.0
+    for tick, state in enumerate(states(players, rng), 1):
+        start = time.process_time()
+        cache = {} if shared else None
+        for (sender, _), history in zip(pairs, histories):
+            parts = history.encode_parts(tick, state, tick, cache)
+            if sendmsg:
+                sender.sendmsg(parts)
+            else:
+                sender.send(b"".join(parts))
+        duration += time.process_time() - start
+        for history in histories:
+            history.ack(tick)
+        drain(pairs)
+    return duration
+
+
+def main():
+    print(f"{ROUNDS} broadcasts per room size, CPU time per broadcast")
+    print(f"{'players':>8}{'pickle us':>12}{'per client us':>15}{'shared us':>12}{'speedup':>10}")
+    for players in ROOM_SIZES:
+        pairs = make_sockets(players)
+        try:
+            pickled = bench_pickle(players, pairs, random.Random(1))
+            per_client = bench_encode(players, pairs, random.Random(1), shared=False)
+            shared = bench_encode(players, pairs, random.Random(1), shared=True)
+        finally:
+            for sender, receiver in pairs:
+                sender.close()
+                receiver.close()
+        scale = 1e6 / ROUNDS
+        print(f"{players:>8}{pickled * scale:>12.1f}{per_client * scale:>15.1f}{shared * scale:>12.1f}"
+              f"{pickled / shared:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
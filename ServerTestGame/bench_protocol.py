@@ -0,0 +1,60 @@
+"""
+Microbenchmark: pickle messages (old wire format) vs protocol.py frames
+
+Frames are 2-3x smaller than pickle, but not cheaper to make: pickle is C code, a frame is a
+few struct calls from Python. A 16 player snapshot takes about 13 us to encode against 7 us
+for pickle, roughly 2x slower. What pays for it is that the snapshot body is encoded once per
+tick and shared by every client (bench_fanout.py), and that deltas are smaller still.
+
+Run from the ServerTestGame folder:
+    python bench_protocol.py
+"""
+
+import pickle
+import timeit
+import protocol
+
+ROUNDS = 100000
+
+
+def bench(name, encode, decode):
+    data = encode()
+    encode_time = timeit.timeit(encode, number=ROUNDS) / ROUNDS
+    decode_time = timeit.timeit(lambda: decode(data), number=ROUNDS) / ROUNDS
+    print(f"{name:<28}{len(data):>8} B{encode_time * 1e6:>12.2f} us{decode_time * 1e6:>12.2f} us")
+
+
+def decode_frame(data):
+    length, msg_type = protocol.HEADER.unpack_from(data, 0)
+    return protocol.decode(msg_type, data[protocol.HEADER.size:])
+
+
+def main():
+    position = (123, 456)
+    color = (0, 200, 255)
+    other = {"color": color, "position": position}
+
+    print(f"{'message':<28}{'size':>10}{'encode':>15}{'decode':>15}")
+
+    # Position sent by the client every frame
+    bench("position pickle", lambda: pickle.dumps(position), pickle.loads)
+    bench("position protocol", lambda: protocol.encode_position(*position), decode_frame)
+
+    # Reply with the other player's state
+    bench("other player pickle", lambda: pickle.dumps(other), pickle.loads)
+    bench("snapshot protocol (1)", lambda: protocol.encode_snapshot(1, [(2, position, color)]), decode_frame)
+
+    # Input message has no pickle equivalent, shown for reference
+    bench("input protocol", lambda: protocol.encode_input(1, protocol.KEY_LEFT | protocol.KEY_UP), decode_frame)
+
+    # Bigger rooms
+    players = [(i, (i, i), color) for i in range(16)]
+    players_dict = [{"id": i, "color": color, "position": (i, i)} for i in range(16)]
+    bench("16 players pickle", lambda: pickle.dumps(players_dict), pickle.loads)
+    bench("snapshot protocol (16)", lambda: protocol.encode_snapshot(1, players), decode_frame)
+    moved = [(i, protocol.FIELD_X, (i, i), color) for i in range(4)]
+    bench("delta protocol (4 of 16)", lambda: protocol.encode_delta(2, 1, moved, []), decode_frame)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: cost of a rollback in a two-player match
+
+The remote peer's inputs always arrive ROLLBACK_FRAMES frames late and change often, so
+most frames start with a rollback of the full window. Both players move and drop bombs,
+walls break and flames burn, like in a real match.
+Run from the ServerTestGame folder:
+    python bench_rollback.py
+"""
+
+import random
+import time
+import protocol
+import rollback
+from settings import ROLLBACK_FRAMES
+
+FRAMES = 3000
+BUDGET_MS = 2.0  # an 8 frame rollback must fit in here, next to rendering a 60 fps frame
+KEYS = (protocol.KEY_LEFT, protocol.KEY_RIGHT, protocol.KEY_UP, protocol.KEY_DOWN,
+        protocol.KEY_RIGHT | protocol.KEY_BOMB, protocol.KEY_DOWN | protocol.KEY_BOMB, 0)
+
+
+def random_inputs(rng, frames):
+    keys = bytearray()
+    current = 0
+    for _ in range(frames):
+        if rng.random() < 0.2:
+            current = rng.choice(KEYS)
+        keys.append(current)
+    return bytes(keys)
+
+
+def main():
+    rng = random.Random(1)
+    local_keys = random_inputs(rng, FRAMES)
+    remote_keys = random_inputs(rng, FRAMES)
+
+    state = rollback.initial_state(seed=1)
+    start = time.perf_counter()
+    for frame in range(FRAMES):
+        state = rollback.step(state, (local_keys[frame], remote_keys[frame]))
+    step_us = (time.perf_counter() - start) / FRAMES * 1e6
+
+    session = rollback.RollbackSession(0, rollback.initial_state(seed=1), ROLLBACK_FRAMES)
+    durations = []
+    for frame in range(FRAMES):
+        late = frame - ROLLBACK_FRAMES
+        if late >= 0:
+            session.add_remote_inputs(late, remote_keys[late:late + 1])
+        rollbacks = session.stats["rollbacks"]
+        before = session.stats["rollback_time"]
+        session.advance(local_keys[frame])
+        if session.stats["rollbacks"] != rollbacks:
+            durations.append((session.stats["rollback_time"] - before) * 1000)
+    session.add_remote_inputs(FRAMES - ROLLBACK_FRAMES, remote_keys[FRAMES - ROLLBACK_FRAMES:])
+    session.advance(0)
+    same = session.saved[FRAMES % len(session.saved)].checksum() == state.checksum()
+
+    durations.sort()
+    stats = session.stats
+    print(f"{FRAMES} frames, step {step_us:.1f} us per frame")
+    print(f"{stats['rollbacks']} rollbacks, {stats['resimulated'] / max(1, stats['rollbacks']):.1f} frames each, "
+          f"{stats['stalls']} stalls")
+    if durations:
+        print(f"rollback ms: avg {sum(durations) / len(durations):.3f} "
+              f"p95 {durations[int(len(durations) * 0.95)]:.3f} max {durations[-1]:.3f} (budget {BUDGET_MS} ms)")
+    print(f"state after rollbacks matches a straight simulation: {same}")
+
+
+if __name__ == "__main__":
+    main()
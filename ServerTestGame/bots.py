@@ -0,0 +1,409 @@
+"""
+Headless bot load generator
+
+Opens N bot connections to a game server with the same protocol as networkClass.Network.
+Every bot sends random movement inputs at a fixed rate and pings the server, then the tool
+reports round trip time, snapshot arrival jitter and throughput for each bot count.
+
+Run from the ServerTestGame folder, everything stays on localhost:
+    python bots.py --bots 50                       # server already running on port 5555
+    python bots.py --spawn --ramp 10,50,100,200    # start a server here, step up the bot count
+    python bots.py --pid 1234 --bots 100           # also report the CPU use of that server process
+
+With --spawn the server puts every bot in one room (unless --room-size is given) and reports
+its tick time, so the first bot count with overruns is where a room stops meeting its tick budget.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import deque
+import protocol
+import transport
+from settings import SNAPSHOT_RATE
+from snapshots import SnapshotReceiver
+from joinstate import JoinReceiver
+from stats import percentile
+
+MOVES = [0, protocol.KEY_LEFT, protocol.KEY_RIGHT, protocol.KEY_UP, protocol.KEY_DOWN,
+         protocol.KEY_LEFT | protocol.KEY_UP, protocol.KEY_RIGHT | protocol.KEY_DOWN]
+
+
+class LoadStats:
+    """Numbers collected by every bot of one run, only while measuring is True"""
+
+    def __init__(self):
+        self.measuring = False
+        self.rtts = []  # seconds
+        self.intervals = []  # seconds between two snapshots of the same bot
+        self.snapshots = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.failed = 0  # bots that could not connect
+        self.dropped = 0  # bots the server disconnected
+        self.join_times = []  # seconds from connect until the room map and state arrived, every bot
+
+
+class Bot:
+    """
+    One fake player
+    Subclasses provide open(), send() and close() for their transport.
+
+    Args:
+        bot_id (int): Number of the bot, only for messages
+        stats (LoadStats): Where the measurements go
+        input_rate (float): Inputs sent per second
+        ping_interval (float): Seconds between two pings
+        rng (random.Random): Source of the random moves
+    """
+
+    def __init__(self, bot_id, stats, input_rate, ping_interval, rng):
+        self.id = bot_id
+        self.stats = stats
+        self.input_rate = input_rate
+        self.ping_interval = ping_interval
+        self.rng = rng
+        self.receiver = SnapshotReceiver()
+        self.join = JoinReceiver()  # no cache: every bot downloads the map, the worst case
+        self.started = None
+        self.welcome = None
+        self.welcomed = None  # future set when the welcome arrives
+        self.closed = False
+        self.input_seq = 0
+        self.keys = 0
+        self.last_snapshot = None  # arrival time of the previous snapshot
+
+    def handle_frame(self, msg_type, payload):
+        now = time.perf_counter()
+        stats = self.stats
+        if msg_type == protocol.MSG_WELCOME:
+            self.welcome = protocol.decode_welcome(payload)
+            if not self.welcomed.done():
+                self.welcomed.set_result(True)
+        elif msg_type == protocol.MSG_SNAPSHOT or msg_type == protocol.MSG_DELTA:
+            if self.receiver.apply(msg_type, payload) is None:
+                return
+            if stats.measuring:
+                stats.snapshots += 1
+                if self.last_snapshot is not None:
+                    stats.intervals.append(now - self.last_snapshot)
+            self.last_snapshot = now
+        elif msg_type == protocol.MSG_PONG:
+            if stats.measuring:
+                stats.rtts.append((time.perf_counter_ns() - protocol.decode_ping(payload)) / 1e9)
+        elif msg_type in (protocol.MSG_JOIN_INFO, protocol.MSG_JOIN_CHUNK, protocol.MSG_JOIN_DONE):
+            reply = self.join.handle(msg_type, payload)
+            if reply is not None:
+                self.send(reply, reliable=True)
+            if msg_type == protocol.MSG_JOIN_DONE:
+                stats.join_times.append(now - self.started)
+
+    def received(self, size):
+        if self.stats.measuring:
+            self.stats.bytes_in += size
+
+    def next_input(self):
+        # hold a direction for a while like a player would, then pick another one
+        if self.rng.random() < 0.05:
+            self.keys = self.rng.choice(MOVES)
+        self.input_seq += 1
+        return protocol.encode_input(self.input_seq, self.keys, self.receiver.last_tick)
+
+    async def run(self, host, port, stop):
+        self.welcomed = asyncio.get_running_loop().create_future()
+        self.started = time.perf_counter()
+        try:
+            await self.open(host, port)
+            await asyncio.wait_for(self.welcomed, 5)
+        except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+            print(f"Bot {self.id} could not connect: {e}")
+            self.stats.failed += 1
+            self.close()
+            return
+
+        interval = 1 / self.input_rate
+        next_input = time.perf_counter()
+        next_ping = next_input + self.rng.random() * self.ping_interval  # spread the pings out
+        try:
+            while not stop.is_set():
+                if self.closed:
+                    self.stats.dropped += 1
+                    return
+                now = time.perf_counter()
+                if now >= next_ping:
+                    self.send(protocol.encode_ping(time.perf_counter_ns()))
+                    next_ping = now + self.ping_interval
+                self.send_input(self.next_input())
+                next_input += interval
+                await asyncio.sleep(max(0, next_input - time.perf_counter()))
+        finally:
+            self.close()
+
+    def send_input(self, data):
+        self.send(data)
+
+
+class TcpBot(Bot):
+    """Bot over TCP"""
+
+    writer = None
+    reader_task = None
+
+    async def open(self, host, port):
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.reader_task = asyncio.create_task(self.read_loop(reader))
+
+    async def read_loop(self, reader):
+        decoder = protocol.FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                self.received(len(data))
+                for msg_type, payload in decoder.feed(data):
+                    self.handle_frame(msg_type, payload)
+        except (ConnectionError, OSError, protocol.ProtocolError):
+            pass
+        self.closed = True
+
+    def send(self, data, reliable=False):
+        if self.stats.measuring:
+            self.stats.bytes_out += len(data)
+        self.writer.write(data)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+
+
+class UdpBot(Bot, asyncio.DatagramProtocol):
+    """Bot over UDP, repeats its last inputs in every datagram like Network does"""
+
+    endpoint = None
+    peer = None
+    token = None
+
+    async def open(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.accepted = loop.create_future()
+        self.recent_inputs = deque(maxlen=3)
+        self.endpoint, _ = await loop.create_datagram_endpoint(lambda: self, remote_addr=(host, port))
+        self.token = self.rng.getrandbits(32)
+        packet = transport.handshake_packet(transport.PKT_CONNECT, self.token)
+        for _ in range(20):
+            self.endpoint.sendto(packet)
+            try:
+                await asyncio.wait_for(asyncio.shield(self.accepted), 0.25)
+                return
+            except asyncio.TimeoutError:
+                continue
+        raise ConnectionError("No answer from server")
+
+    def datagram_received(self, data, addr):
+        self.received(len(data))
+        if self.peer is None:
+            if data and data[0] == transport.PKT_ACCEPT and transport.parse_handshake(data)[1] == self.token:
+                self.peer = transport.UdpPeer(self.endpoint.sendto)
+                self.accepted.set_result(True)
+            return
+        try:
+            for channel, frames in self.peer.datagram_received(data):
+                for msg_type, payload in protocol.split_frames(frames):
+                    self.handle_frame(msg_type, payload)
+        except protocol.ProtocolError:
+            self.closed = True
+        if self.peer.closed:
+            self.closed = True
+
+    def send(self, data, reliable=False):
+        if self.stats.measuring:
+            self.stats.bytes_out += len(data)
+        if reliable:
+            self.peer.send_reliable(data)
+        else:
+            self.peer.send_unreliable(data)
+
+    def send_input(self, data):
+        self.recent_inputs.append(data)
+        self.send(b"".join(self.recent_inputs))
+        if not self.peer.update():
+            self.closed = True
+
+    def close(self):
+        if self.peer is not None:
+            self.peer.disconnect()
+        if self.endpoint is not None:
+            self.endpoint.close()
+
+
+def spawned_server(port, transport_name, room_size, conn):
+    # child process for --spawn: a quiet server that answers stats requests on the pipe
+    import threading
+    from server import GameServer
+    sys.stdout = open(os.devnull, "w")
+
+    async def main():
+        game = GameServer("127.0.0.1", port, transport=transport_name, room_size=room_size, stats_interval=None)
+        await game.start()
+        loop = asyncio.get_running_loop()
+
+        async def current_stats():
+            return game.stats()
+
+        def answer():
+            # the stats are read on the event loop thread, the tick loop changes them
+            try:
+                while conn.recv():
+                    conn.send(asyncio.run_coroutine_threadsafe(current_stats(), loop).result())
+            except (EOFError, OSError):
+                pass
+            loop.call_soon_threadsafe(game.tick_task.cancel)
+
+        conn.send(game.port)
+        threading.Thread(target=answer, daemon=True).start()
+        try:
+            await game.tick_task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+
+
+def process_cpu_time(pid):
+    """CPU seconds used by a process, from /proc (Linux only), None when unavailable"""
+
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class ServerProbe:
+    """Reads server CPU use and tick stats, from the spawned server or from /proc for --pid"""
+
+    def __init__(self, conn=None, pid=None):
+        self.conn = conn
+        self.pid = pid
+
+    def sample(self):
+        if self.conn is not None:
+            self.conn.send(True)
+            stats = self.conn.recv()
+            return time.perf_counter(), stats["cpu_time"], stats
+        if self.pid is not None:
+            return time.perf_counter(), process_cpu_time(self.pid), None
+        return time.perf_counter(), None, None
+
+
+def format_percentiles(values, scale=1000):
+    if not values:
+        return f"{'-':>22}"
+    ordered = sorted(values)
+    return f"{' / '.join(f'{percentile(ordered, f) * scale:.1f}' for f in (0.5, 0.95, 0.99)):>22}"
+
+
+async def run_step(args, count, probe):
+    stats = LoadStats()
+    stop = asyncio.Event()
+    bot_class = UdpBot if args.transport == "udp" else TcpBot
+    rng = random.Random(args.seed + count)
+    bots = [bot_class(i + 1, stats, args.input_rate, args.ping_interval, random.Random(rng.random()))
+            for i in range(count)]
+    tasks = []
+    for bot in bots:
+        tasks.append(asyncio.create_task(bot.run(args.host, args.port, stop)))
+        await asyncio.sleep(args.connect_delay)
+
+    await asyncio.sleep(args.warmup)
+    start_time, start_cpu, start_stats = probe.sample()
+    stats.measuring = True
+    await asyncio.sleep(args.duration)
+    stats.measuring = False
+    end_time, end_cpu, end_stats = probe.sample()
+
+    stop.set()
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(0.5)  # let the server notice the disconnects before the next step
+
+    elapsed = end_time - start_time
+    expected = 1 / args.snapshot_rate
+    jitter = [abs(interval - expected) for interval in stats.intervals]
+    cpu = "n/a"
+    if start_cpu is not None and end_cpu is not None:
+        cpu = f"{(end_cpu - start_cpu) / elapsed * 100:.0f}%"
+    line = (f"{count:>6}{format_percentiles(stats.rtts)}  {format_percentiles(jitter)}"
+            f"{stats.snapshots / elapsed / max(1, count):>9.1f}"
+            f"{stats.bytes_in / elapsed / 1024:>10.1f}{stats.bytes_out / elapsed / 1024:>10.1f}{cpu:>7}")
+    if end_stats is not None:
+        overruns = end_stats["tick_overruns"] - start_stats["tick_overruns"]
+        line += f"{end_stats['tick_p95_ms']:>9.2f}{overruns:>9}"
+        if overruns:
+            line += "  over budget"
+    if stats.failed or stats.dropped:
+        line += f"  ({stats.failed} failed, {stats.dropped} dropped)"
+    print(line)
+    if stats.join_times:
+        print(f"{'':>6}join to playable ms p50/p95/p99 {format_percentiles(stats.join_times).strip()}")
+
+
+async def main(args):
+    conn = None
+    process = None
+    if args.spawn:
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=spawned_server, daemon=True,
+                                          args=(args.port, args.transport, args.room_size, child_conn))
+        process.start()
+        args.port = conn.recv()
+    probe = ServerProbe(conn, process.pid if process else args.pid)
+
+    counts = [int(n) for n in args.ramp.split(",")] if args.ramp else [args.bots]
+    print(f"{args.transport.upper()} server {args.host}:{args.port}, {args.input_rate:g} inputs/s per bot, "
+          f"{args.duration:g}s per step")
+    header = f"{'bots':>6}{'rtt ms p50/p95/p99':>22}  {'jitter ms p50/p95/p99':>22}{'snap/s':>9}{'KB/s in':>10}{'KB/s out':>10}{'cpu':>7}"
+    if args.spawn:
+        header += f"{'tick p95':>9}{'overruns':>9}"
+    print(header)
+    try:
+        for count in counts:
+            await run_step(args, count, probe)
+    finally:
+        if process is not None:
+            conn.close()
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the game server with bot clients")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--bots", type=int, default=20, help="number of bots (ignored with --ramp)")
+    parser.add_argument("--ramp", help="comma separated bot counts, one measurement each, e.g. 10,50,100")
+    parser.add_argument("--input-rate", type=float, default=60, help="inputs per second per bot")
+    parser.add_argument("--ping-interval", type=float, default=0.5, help="seconds between pings")
+    parser.add_argument("--snapshot-rate", type=float, default=SNAPSHOT_RATE,
+                        help="snapshot rate of the server, the jitter is measured against it")
+    parser.add_argument("--duration", type=float, default=10, help="seconds measured per step")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds between connecting and measuring")
+    parser.add_argument("--connect-delay", type=float, default=0.002, help="seconds between two bot connects")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spawn", action="store_true", help="start a server in a child process on --port (0 = any)")
+    parser.add_argument("--room-size", type=int, default=None, help="room size of the spawned server, default one room")
+    parser.add_argument("--pid", type=int, help="server process to report CPU use for (Linux)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
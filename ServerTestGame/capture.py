@@ -0,0 +1,93 @@
+import struct
+import time
+
+# Traffic capture
+# The server can append every message it receives from clients to a binary log, replay.py feeds
+# the log back into a server to get the same load again without real players.
+#
+# File: MAGIC, then records back to back, each one
+#   [seconds since the capture started: float64][connection id: uint32][event: uint8]
+#   [message type: uint8][payload length: uint16][payload ...]
+# Connection ids are only unique inside one capture. A file written by several server runs
+# holds several captures, each starts with its own MAGIC and its time starts at 0 again.
+
+MAGIC = b"SRVCAP01"
+RECORD = struct.Struct("!dIBBH")  # time, connection id, event, message type, payload length
+
+EVENT_CONNECT = 1     # a client joined, no payload
+EVENT_MESSAGE = 2     # a message from the client, message type and payload as received
+EVENT_DISCONNECT = 3  # the client left, no payload
+
+
+class CaptureWriter:
+    """
+    Append-only capture log
+
+    Args:
+        path (str): File to append to, created if missing
+        flush_interval (float, optional): Seconds between flushes to disk. Defaults to 1.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.file = open(path, "ab", buffering=1 << 16)
+        self.file.write(MAGIC)
+        self.start = time.perf_counter()
+        self.flush_interval = flush_interval
+        self.last_flush = self.start
+        self.records = 0
+
+    def record(self, connection_id, event, msg_type=0, payload=b""):
+        now = time.perf_counter()
+        self.file.write(RECORD.pack(now - self.start, connection_id, event, msg_type, len(payload)))
+        if payload:
+            self.file.write(payload)
+        self.records += 1
+        # the buffer is written out now and then, a crash loses at most the last second
+        if now - self.last_flush >= self.flush_interval:
+            self.file.flush()
+            self.last_flush = now
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_capture(path):
+    """
+    Read a capture log
+    A record cut short at the end of the file (server killed while writing) is ignored.
+    Args:
+        path (str): Capture file
+    Returns: generator of (time, connection id, event, message type, payload).
+        Times and connection ids of later captures in the same file are shifted to follow the earlier ones.
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+    # a record can not start with MAGIC: as a float64 time it would be about 1e93 seconds
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a capture file")
+    offset = 0
+    time_base = 0.0
+    id_base = 0
+    last_time = 0.0
+    last_id = 0
+    while offset < len(data):
+        if data.startswith(MAGIC, offset):
+            # next capture in the same file
+            time_base = last_time
+            id_base = last_id
+            offset += len(MAGIC)
+            continue
+        if len(data) - offset < RECORD.size:
+            return
+        timestamp, connection_id, event, msg_type, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if len(data) - offset < length:
+            return
+        payload = data[offset:offset + length]
+        offset += length
+        last_time = max(last_time, time_base + timestamp)
+        last_id = max(last_id, id_base + connection_id)
+        yield time_base + timestamp, id_base + connection_id, event, msg_type, payload
@@ -0,0 +1,247 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from multiprocessing import reduction
+import plugins
+from server import GameServer, server_ip, port
+from settings import ROOM_SIZE
+
+# Multi process server
+# One GameServer runs in every worker process, each with its own rooms, so matches use all cores.
+# The front end owns the listening socket: it accepts TCP connections and hands the socket
+# to a worker over a pipe. The worker serves the connection like a normal server.
+# A connection goes to a worker whose rooms still have a free slot, so players fill a match
+# together instead of each starting their own room on another worker. Only when every room
+# is full does the least loaded worker get the player and open a new room.
+# Workers report their load (rooms, clients, free slots, tick time) to the front end through a queue.
+# Only TCP is sharded, a UDP "connection" has no socket of its own that could be handed over.
+
+
+def send_socket(conn, sock, pid):
+    # the worker gets its own copy of the socket, the caller can close its one afterwards
+    if sys.platform == "win32":
+        conn.send(sock.share(pid))
+    else:
+        reduction.send_handle(conn, sock.fileno(), pid)
+
+
+def receive_socket(conn):
+    if sys.platform == "win32":
+        return socket.fromshare(conn.recv())
+    return socket.socket(fileno=reduction.recv_handle(conn))
+
+
+def worker_main(worker_id, conn, stats_queue, server_options, report_interval):
+    try:
+        asyncio.run(run_worker(worker_id, conn, stats_queue, server_options, report_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_worker(worker_id, conn, stats_queue, server_options, report_interval):
+    if server_options.get("metrics_port"):
+        # every worker has its own counters and its own endpoint
+        server_options = dict(server_options, metrics_port=server_options["metrics_port"] + worker_id - 1)
+    game = GameServer(None, 0, listen=False, stats_interval=None, **server_options)
+    await game.start()
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    def adopt(sock):
+        task = asyncio.create_task(game.adopt(sock))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def receive_loop():
+        # pipes can not be awaited on every platform, a thread waits and hands sockets to the loop
+        try:
+            while True:
+                sock = receive_socket(conn)
+                loop.call_soon_threadsafe(adopt, sock)
+        except (EOFError, OSError):
+            loop.call_soon_threadsafe(game.tick_task.cancel)  # front end is gone
+
+    threading.Thread(target=receive_loop, daemon=True).start()
+    try:
+        while True:
+            await asyncio.sleep(report_interval)
+            stats = game.stats()
+            stats.update(worker=worker_id, pid=os.getpid())
+            stats_queue.put(stats)
+            if game.tick_task.done():
+                break
+    finally:
+        await game.stop()
+
+
+class Worker:
+    """
+    Front end view of one worker process
+
+    Args:
+        room_size (int): Players per room of the worker, None for rooms without a limit
+    """
+
+    def __init__(self, worker_id, process, conn, room_size):
+        self.id = worker_id
+        self.process = process
+        self.conn = conn
+        self.room_size = room_size
+        self.routed = 0  # connections sent to the worker
+        self.stats = {"rooms": 0, "clients": 0, "free_slots": 0, "accepted": 0, "tick_avg_ms": 0.0,
+                      "tick_p95_ms": 0.0, "tick_max_ms": 0.0}
+
+    def pending(self):
+        # connections sent that the worker had not put in a room at its last report
+        return self.routed - self.stats["accepted"]
+
+    def load(self):
+        # clients from the last report plus connections the worker had not picked up yet
+        return self.stats["clients"] + self.pending()
+
+    def free_slots(self):
+        """
+        Free slots in the worker's open rooms once the pending connections are in
+        The pending ones fill the free slots first, every room_size more open a new room.
+        """
+
+        free = self.stats["free_slots"] or 0
+        pending = self.pending()
+        if pending <= free:
+            return free - pending
+        return (free - pending) % self.room_size
+
+
+class ClusterServer:
+    """
+    Accepts connections and spreads them over worker processes running GameServer
+
+    Args:
+        host (str): Address to bind
+        port (int): Port to bind
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        backlog (int, optional): Listen backlog. Defaults to 128.
+        stats_interval (float, optional): Seconds between worker stats reports, None to disable. Defaults to 10.
+        report_interval (float, optional): Seconds between load reports of the workers. Defaults to 0.5.
+        **server_options: Passed to the GameServer of every worker (tick_rate, room_size, view_size ...)
+    """
+
+    def __init__(self, host, port, workers=None, backlog=128, stats_interval=10, report_interval=0.5,
+                 **server_options):
+        self.host = host
+        self.port = port
+        self.worker_count = workers or os.cpu_count() or 1
+        self.backlog = backlog
+        self.stats_interval = stats_interval
+        self.report_interval = report_interval
+        self.server_options = server_options
+        self.workers = []
+        self.stats_queue = None
+        self.listener = None
+
+    def start_workers(self):
+        self.stats_queue = multiprocessing.Queue()
+        for worker_id in range(1, self.worker_count + 1):
+            front_conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=worker_main, daemon=True,
+                args=(worker_id, worker_conn, self.stats_queue, self.server_options, self.report_interval))
+            process.start()
+            worker_conn.close()
+            self.workers.append(Worker(worker_id, process, front_conn,
+                                       self.server_options.get("room_size", ROOM_SIZE)))
+
+    def pick_worker(self):
+        """
+        Worker for the next connection: the one whose open room is closest to full, like
+        RoomManager.join does inside a worker, else the least loaded one
+        """
+
+        alive = [w for w in self.workers if w.process.is_alive()]
+        if alive[0].room_size is not None:
+            open_workers = [w for w in alive if w.free_slots() > 0]
+            if open_workers:
+                return min(open_workers, key=Worker.free_slots)
+        return min(alive, key=Worker.load)
+
+    def route(self, sock):
+        worker = self.pick_worker()
+        send_socket(worker.conn, sock, worker.process.pid)
+        worker.routed += 1
+        sock.close()
+
+    def read_stats(self):
+        while True:
+            try:
+                stats = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.workers[stats["worker"] - 1].stats = stats
+
+    def report(self):
+        for worker in self.workers:
+            s = worker.stats
+            state = "" if worker.process.is_alive() else " (dead)"
+            print(f"Worker {worker.id}{state}: rooms={s['rooms']} clients={s['clients']} "
+                  f"tick avg={s['tick_avg_ms']:.3f}ms p95={s['tick_p95_ms']:.3f}ms max={s['tick_max_ms']:.3f}ms")
+
+    async def stats_loop(self):
+        next_report = time.monotonic() + (self.stats_interval or 0)
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.read_stats()
+            if self.stats_interval and time.monotonic() >= next_report:
+                self.report()
+                next_report = time.monotonic() + self.stats_interval
+
+    async def start(self):
+        self.start_workers()
+        self.listener = socket.create_server((self.host, self.port), backlog=self.backlog)
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        print(f"Cluster started with {self.worker_count} workers, listening on TCP port:", self.port)
+
+    async def serve_forever(self):
+        if self.listener is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        stats_task = asyncio.create_task(self.stats_loop())
+        try:
+            while True:
+                sock, addr = await loop.sock_accept(self.listener)
+                try:
+                    self.route(sock)
+                except (OSError, ValueError) as e:
+                    print(f"Could not hand {addr} to a worker: {e}")
+                    sock.close()
+        finally:
+            stats_task.cancel()
+            self.stop()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.close()
+        for worker in self.workers:
+            worker.conn.close()
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+
+async def main(workers=None):
+    cluster = ClusterServer(server_ip, port, workers)
+    await cluster.start()
+    plugin_task = asyncio.create_task(plugins.run_plugins(["firewall", "upnp"], cluster.port))
+    try:
+        await cluster.serve_forever()
+    finally:
+        await plugins.stop(plugin_task)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else None))
@@ -0,0 +1,92 @@
+"""
+Dedicated headless game server
+
+Binds first and does nothing else before that: no pygame, no firewall or UPnP setup at import.
+Those run as optional plugins after the listener is up (see plugins.py).
+
+Run from the ServerTestGame folder:
+    python dedicated_server.py                                  # 0.0.0.0:5555, TCP
+    python dedicated_server.py --host 192.168.1.250 --plugins firewall,upnp
+    python dedicated_server.py --transport udp --room-size 8 --capture traffic.cap
+    python dedicated_server.py --workers 4                      # rooms spread over 4 processes (TCP)
+    python dedicated_server.py --metrics-port 9100              # Prometheus metrics on 127.0.0.1:9100/metrics
+"""
+
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+from server import GameServer
+from settings import TICK_RATE, SNAPSHOT_RATE, ROOM_SIZE, SEND_QUEUE_SIZE, MAX_SEND_LAG
+import plugins
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless game server")
+    parser.add_argument("--host", default="0.0.0.0", help="address to bind (default all interfaces)")
+    parser.add_argument("--port", type=int, default=5555, help="port to bind, 0 for any free port")
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--max-players", type=int, help="refuse players above this many (default no limit)")
+    parser.add_argument("--room-size", type=int, default=ROOM_SIZE, help="players per room, 0 for one room")
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    parser.add_argument("--snapshot-rate", type=int, default=SNAPSHOT_RATE)
+    parser.add_argument("--stats-interval", type=float, default=10, help="seconds between stats reports, 0 = off")
+    parser.add_argument("--send-queue-size", type=int, default=SEND_QUEUE_SIZE,
+                        help="messages queued for a client before it is disconnected")
+    parser.add_argument("--max-send-lag", type=float, default=MAX_SEND_LAG,
+                        help="seconds a client may stay behind on snapshots, 0 = never disconnect")
+    parser.add_argument("--capture", help="append received traffic to this file, see replay.py")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on this port, worker N of --workers on port + N - 1")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="address of the metrics endpoint")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, more than 1 uses cluster.py")
+    parser.add_argument("--plugins", default="", help=f"comma separated, from: {', '.join(plugins.PLUGINS)}")
+    parser.add_argument("--plugin-timeout", type=float, default=10, help="seconds before a plugin is given up")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    names = [name for name in args.plugins.split(",") if name]
+    for name in names:
+        if name not in plugins.PLUGINS:
+            raise SystemExit(f"Unknown plugin: {name}, choose from {', '.join(plugins.PLUGINS)}")
+    options = {
+        "max_players": args.max_players,
+        "room_size": args.room_size or None,
+        "tick_rate": args.tick_rate,
+        "snapshot_rate": args.snapshot_rate,
+        "stats_interval": args.stats_interval or None,
+        "send_queue_size": args.send_queue_size,
+        "max_send_lag": args.max_send_lag or None,
+        "metrics_port": args.metrics_port,
+        "metrics_host": args.metrics_host,
+    }
+
+    if args.workers > 1:
+        if args.transport != "tcp" or args.capture:
+            raise SystemExit("--workers only works with TCP and without --capture")
+        from cluster import ClusterServer
+        server = ClusterServer(args.host, args.port, args.workers, **options)
+    else:
+        server = GameServer(args.host, args.port, transport=args.transport, capture=args.capture, **options)
+    await server.start()
+    print(f"Accepting connections {(time.perf_counter() - STARTED) * 1000:.1f} ms after start")
+
+    plugin_task = None
+    if names:
+        plugin_task = asyncio.create_task(
+            plugins.run_plugins(names, server.port, args.transport, args.plugin_timeout))
+    try:
+        await server.serve_forever()
+    finally:
+        await plugins.stop(plugin_task)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
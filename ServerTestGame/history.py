@@ -0,0 +1,124 @@
+from array import array
+from contextlib import contextmanager
+
+# Lag compensation
+# A client sees other players INTERPOLATION_DELAY plus its latency in the past. To check a hit
+# against what the attacker saw, the server keeps the positions of the last ticks and moves the
+# other players back to the attacker's view tick for the check.
+#
+# Positions live in preallocated arrays, one row of `capacity` slots per tick, indexed by player id.
+# The row of a tick is tick % frames, so looking a tick up does not depend on how much is kept,
+# and the memory is frames * capacity * 5 bytes whatever happens in the game.
+# Clients draw remote players between snapshots, so the view tick of an attack can fall between
+# two ticks: the positions of the ticks around it are interpolated.
+
+
+class PositionHistory:
+    """
+    Ring buffer of player positions for the last frames ticks
+
+    Args:
+        frames (int): Ticks kept
+        capacity (int, optional): Player ids below this fit without growing the arrays. Defaults to 17.
+    """
+
+    def __init__(self, frames, capacity=17):
+        self.frames = frames
+        self.capacity = 0
+        self.ticks = array("l", [-1]) * frames  # tick stored in each row, -1 for none
+        self.xs = array("h")
+        self.ys = array("h")
+        self.alive = bytearray()  # 1 where the player existed at that tick
+        self.resize(capacity)
+
+    def resize(self, capacity):
+        # only when a player id does not fit, rows are copied into arrays of the new width
+        old = self.capacity
+        xs = array("h", bytes(2 * self.frames * capacity))
+        ys = array("h", bytes(2 * self.frames * capacity))
+        alive = bytearray(self.frames * capacity)
+        keep = min(old, capacity)
+        for row in range(self.frames):
+            xs[row * capacity:row * capacity + keep] = self.xs[row * old:row * old + keep]
+            ys[row * capacity:row * capacity + keep] = self.ys[row * old:row * old + keep]
+            alive[row * capacity:row * capacity + keep] = self.alive[row * old:row * old + keep]
+        self.xs, self.ys, self.alive = xs, ys, alive
+        self.capacity = capacity
+
+    def record(self, tick, players):
+        """
+        Store the positions of a tick, overwriting the oldest one
+        Args:
+            tick (int): Server tick
+            players (iterable): PlayerState objects
+        """
+
+        players = list(players)
+        highest = max((player.id for player in players), default=0)
+        if highest >= self.capacity:
+            self.resize(max(highest + 1, self.capacity * 2))
+        capacity = self.capacity
+        base = (tick % self.frames) * capacity
+        self.ticks[tick % self.frames] = tick
+        self.alive[base:base + capacity] = bytes(capacity)
+        xs, ys, alive = self.xs, self.ys, self.alive
+        for player in players:
+            index = base + player.id
+            xs[index] = int(player.x)
+            ys[index] = int(player.y)
+            alive[index] = 1
+
+    def has(self, tick):
+        return tick >= 0 and self.ticks[tick % self.frames] == tick
+
+    def recorded(self, tick, player_id):
+        # (x, y) at a whole tick, None if the tick is not kept or the player was not there
+        if not self.has(tick) or player_id >= self.capacity:
+            return None
+        index = (tick % self.frames) * self.capacity + player_id
+        if not self.alive[index]:
+            return None
+        return self.xs[index], self.ys[index]
+
+    def position(self, tick, player_id):
+        """
+        Args:
+            tick (float): Server tick, between two ticks the positions of both are interpolated
+        Returns: (x, y) of the player at tick, None if the tick is not kept or the player was not there.
+            When only the tick before is kept or the player is not in the one after, the tick before.
+        """
+
+        whole = int(tick)
+        before = self.recorded(whole, player_id)
+        fraction = tick - whole
+        if before is None or not fraction:
+            return before
+        after = self.recorded(whole + 1, player_id)
+        if after is None:
+            return before
+        return (before[0] + (after[0] - before[0]) * fraction,
+                before[1] + (after[1] - before[1]) * fraction)
+
+    @contextmanager
+    def rewind(self, players, tick):
+        """
+        Move players to where they were at tick, put them back when the block ends
+        Players that were not in the game at that tick, and every player when the tick is
+        not kept any more, stay where they are.
+
+            with history.rewind(others, view_tick):
+                hits = [p for p in others if overlaps(box, p.x, p.y, size)]
+        Args:
+            tick (float): Server tick, can fall between two ticks, see position()
+        """
+
+        saved = [(player, player.x, player.y) for player in players]
+        try:
+            for player in players:
+                position = self.position(tick, player.id)
+                if position is not None:
+                    player.x, player.y = position
+            yield
+        finally:
+            for player, x, y in saved:
+                player.x, player.y = x, y
@@ -0,0 +1,168 @@
+import time
+from collections import deque
+
+
+class ServerClock:
+    """
+    Estimates the server clock from snapshot ticks
+
+    Every snapshot tells us the server time it was taken at (tick / tick_rate).
+    The offset between that and our local clock is smoothed, so one late packet
+    does not shift where remote players are drawn.
+
+    Args:
+        tick_rate (int): Server ticks per second
+        smoothing (float, optional): How much a new sample moves the offset (0..1). Defaults to 0.05.
+        resync (float, optional): If a sample is this many seconds off, jump to it. Defaults to 0.5.
+    """
+
+    def __init__(self, tick_rate, smoothing=0.05, resync=0.5):
+        self.tick_rate = tick_rate
+        self.smoothing = smoothing
+        self.resync = resync
+        self.offset = None  # server time - local time
+
+    def observe(self, tick, arrival=None):
+        if arrival is None:
+            arrival = time.perf_counter()
+        sample = tick / self.tick_rate - arrival
+        if self.offset is None or abs(sample - self.offset) > self.resync:
+            self.offset = sample
+        else:
+            self.offset += (sample - self.offset) * self.smoothing
+
+    def now(self, local=None):
+        """
+        Returns: estimated server time in seconds, None before the first snapshot
+        """
+
+        if self.offset is None:
+            return None
+        if local is None:
+            local = time.perf_counter()
+        return local + self.offset
+
+
+class EntityBuffer:
+    """
+    Timestamped positions of one remote entity
+
+    Args:
+        size (int, optional): Number of samples kept. Defaults to 32.
+    """
+
+    def __init__(self, size=32):
+        self.samples = deque(maxlen=size)  # (server time, x, y), oldest first
+
+    def push(self, server_time, position):
+        if self.samples and server_time <= self.samples[-1][0]:
+            return  # old or duplicate snapshot
+        self.samples.append((server_time, position[0], position[1]))
+
+    def sample(self, render_time, max_extrapolation):
+        """
+        Position at render_time
+        Between two samples we interpolate. Past the newest sample we keep moving
+        with the last known velocity for at most max_extrapolation seconds, then stop.
+        Args:
+            render_time (float): Server time to draw
+            max_extrapolation (float): Seconds we are allowed to guess past the newest sample
+        Returns: tuple (x, y) or None if there are no samples
+        """
+
+        samples = self.samples
+        if not samples:
+            return None
+        if render_time <= samples[0][0]:
+            return samples[0][1], samples[0][2]
+
+        newest = samples[-1]
+        if render_time >= newest[0]:
+            if len(samples) < 2:
+                return newest[1], newest[2]
+            previous = samples[-2]
+            ahead = min(render_time - newest[0], max_extrapolation)
+            t = ahead / (newest[0] - previous[0])
+            return newest[1] + (newest[1] - previous[1]) * t, newest[2] + (newest[2] - previous[2]) * t
+
+        # walk back from the newest sample, render time is usually close to it
+        for i in range(len(samples) - 1, 0, -1):
+            before = samples[i - 1]
+            if before[0] <= render_time:
+                after = samples[i]
+                t = (render_time - before[0]) / (after[0] - before[0])
+                return before[1] + (after[1] - before[1]) * t, before[2] + (after[2] - before[2]) * t
+        return samples[0][1], samples[0][2]
+
+
+class Interpolator:
+    """
+    Smooth movement for remote players
+
+    Remote players are drawn delay seconds in the past, between two snapshots we already have,
+    so bunched or late packets do not make them jump.
+
+    Args:
+        tick_rate (int): Server ticks per second (from the welcome message)
+        delay (float): How far in the past remote players are drawn, usually 2 snapshot intervals
+        max_extrapolation (float, optional): Seconds we guess ahead when snapshots are late. Defaults to 0.1.
+        local_id (int, optional): Our own player id, skipped because it is predicted instead. Defaults to None.
+    """
+
+    def __init__(self, tick_rate, delay, max_extrapolation=0.1, local_id=None):
+        self.clock = ServerClock(tick_rate)
+        self.tick_rate = tick_rate
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.local_id = local_id
+        self.entities = {}  # entity id -> EntityBuffer
+
+    def push_snapshot(self, snapshot, arrival=None):
+        """
+        Args:
+            snapshot (dict): Snapshot from Network
+            arrival (float, optional): perf_counter time it arrived. Defaults to now.
+        """
+
+        self.clock.observe(snapshot["tick"], arrival)
+        server_time = snapshot["tick"] / self.tick_rate
+        seen = set()
+        for entity in snapshot["entities"]:
+            if entity["id"] == self.local_id:
+                continue
+            seen.add(entity["id"])
+            buffer = self.entities.get(entity["id"])
+            if buffer is None:
+                buffer = self.entities[entity["id"]] = EntityBuffer()
+            buffer.push(server_time, entity["position"])
+        # entities missing from the snapshot left the game
+        for entity_id in list(self.entities):
+            if entity_id not in seen:
+                del self.entities[entity_id]
+
+    def view_tick(self, local=None):
+        """
+        Server tick other players are drawn at right now, sent with attacks for lag compensation
+        Returns: float, between two ticks while players are drawn between snapshots, 0 before the first snapshot
+        """
+
+        server_now = self.clock.now(local)
+        if server_now is None:
+            return 0
+        return max(0, (server_now - self.delay) * self.tick_rate)
+
+    def positions(self, local=None):
+        """
+        Returns: dict entity id -> (x, y) to draw this frame
+        """
+
+        server_now = self.clock.now(local)
+        if server_now is None:
+            return {}
+        render_time = server_now - self.delay
+        positions = {}
+        for entity_id, buffer in self.entities.items():
+            position = buffer.sample(render_time, self.max_extrapolation)
+            if position is not None:
+                positions[entity_id] = (round(position[0]), round(position[1]))
+        return positions
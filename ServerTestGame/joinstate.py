@@ -0,0 +1,201 @@
+import hashlib
+import os
+import struct
+import time
+import protocol
+
+# Late join
+# A player joining a running room needs its map. Rooms do not simulate bombs, so walls never
+# break and the map is all there is to send. It rarely changes, so it is keyed by content hash:
+#
+#   server -> client   MSG_JOIN_INFO     hash and size of the map
+#   client -> server   MSG_JOIN_REQUEST  hash, and whether the client has it in its cache
+#   server -> client   MSG_JOIN_CHUNK    only when not cached, a few per tick (JoinTransfer)
+#   server -> client   MSG_JOIN_DONE     the map is through, sent last
+#   client -> server   MSG_JOIN_READY    the client can play, the server measures the join time
+#
+# Chunks are paced by the room tick: a room sends at most JOIN_BUDGET bytes per tick over
+# all joining players, and a player with JOIN_WINDOW chunks still queued gets no more, so a
+# join never sends a burst that stalls the tick or fills the send queue.
+
+MAP_HEADER = struct.Struct("!B")  # tiles along one side, then one byte per tile row by row
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def encode_map(layout, tiles):
+    """
+    Args:
+        layout (bytes): One tile value per tile, row by row
+        tiles (int): Tiles along one side
+    Returns: bytes the client caches and rebuilds the map from
+    """
+
+    return MAP_HEADER.pack(tiles) + bytes(layout)
+
+
+def decode_map(data):
+    """
+    Returns: tuple (tiles, layout bytes)
+    Raises: protocol.ProtocolError on a map of the wrong size
+    """
+
+    (tiles,) = MAP_HEADER.unpack_from(data, 0)
+    layout = bytes(data[MAP_HEADER.size:])
+    if len(layout) != tiles * tiles:
+        raise protocol.ProtocolError(f"Bad map size: {len(layout)} tiles, expected {tiles * tiles}")
+    return tiles, layout
+
+
+class World:
+    """
+    Map of one room, what a late joiner has to receive
+
+    Args:
+        layout (bytes): One tile value per tile, row by row
+        tiles (int): Tiles along one side
+    """
+
+    def __init__(self, layout, tiles):
+        self.layout = bytes(layout)
+        self.tiles = tiles
+        self.map_data = encode_map(self.layout, tiles)
+        self.map_hash = content_hash(self.map_data)
+
+
+class JoinTransfer:
+    """
+    Join of one player, from the welcome to MSG_JOIN_READY
+
+    Args:
+        client: ClientConnection or UdpClientConnection
+        world (World): Map of the room
+    """
+
+    def __init__(self, client, world):
+        self.client = client
+        self.world = world
+        self.started = time.perf_counter()
+        self.offset = None  # next map byte to send, None until the client answered MSG_JOIN_INFO
+        self.cached = False
+        self.done = False  # MSG_JOIN_DONE sent
+        self.sent_bytes = 0
+
+    def request(self, map_hash, cached):
+        # a client can only skip the download for the map we have, not for an older one
+        self.cached = cached and map_hash == self.world.map_hash
+        self.offset = len(self.world.map_data) if self.cached else 0
+
+    def send_more(self, budget, chunk_size, window):
+        """
+        Send the next chunks, then MSG_JOIN_DONE once the map is through
+        Args:
+            budget (int): Bytes this transfer may send now
+            chunk_size (int): Map bytes per chunk
+            window (int): Send no more while the client has this many messages queued
+        Returns: bytes sent
+        """
+
+        if self.offset is None or self.done:
+            return 0
+        data = self.world.map_data
+        sent = 0
+        while self.offset < len(data) and budget - sent > 0 and self.client.queue_depth() < window:
+            chunk = data[self.offset:self.offset + min(chunk_size, budget - sent)]
+            self.client.send(protocol.encode_join_chunk(self.offset, chunk), reliable=True)
+            self.offset += len(chunk)
+            sent += len(chunk)
+        if self.offset >= len(data):
+            message = protocol.encode_join_done()
+            self.client.send(message, reliable=True)
+            sent += len(message)
+            self.done = True
+        self.sent_bytes += sent
+        return sent
+
+
+class ContentCache:
+    """
+    Folder of downloaded content, one file per content hash
+
+    Args:
+        directory (str): Folder to keep the files in, created when something is stored
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key.hex())
+
+    def get(self, key):
+        """
+        Returns: the bytes stored under the hash, None if missing or not matching the hash
+        """
+
+        try:
+            with open(self.path(key), "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        return data if content_hash(data) == key else None
+
+    def put(self, key, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = self.path(key) + ".tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, self.path(key))
+        except OSError as e:
+            print(f"Cannot cache {key.hex()}: {e}")
+
+
+class JoinReceiver:
+    """
+    Client side of a late join, runs on the network thread
+
+    Args:
+        cache (ContentCache, optional): Where maps are looked up and stored. Defaults to none.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.map_hash = None
+        self.buffer = None
+        self.received = 0
+        self.cached = False
+        self.world = None  # {"tiles", "layout"} once the join is complete
+
+    def handle(self, msg_type, payload):
+        """
+        Returns: frame to send back to the server, or None
+        Raises: protocol.ProtocolError if the map does not match its hash
+        """
+
+        message = protocol.decode(msg_type, payload)
+        if msg_type == protocol.MSG_JOIN_INFO:
+            self.map_hash = message["hash"]
+            data = self.cache.get(self.map_hash) if self.cache is not None else None
+            self.cached = data is not None
+            self.buffer = bytearray(data) if self.cached else bytearray(message["size"])
+            self.received = len(self.buffer) if self.cached else 0
+            return protocol.encode_join_request(self.map_hash, self.cached)
+        if msg_type == protocol.MSG_JOIN_CHUNK and self.buffer is not None:
+            data = message["data"]
+            self.buffer[message["offset"]:message["offset"] + len(data)] = data
+            self.received += len(data)
+            return None
+        if msg_type == protocol.MSG_JOIN_DONE and self.buffer is not None:
+            data = bytes(self.buffer)
+            if content_hash(data) != self.map_hash:
+                raise protocol.ProtocolError("Map does not match its content hash")
+            if not self.cached and self.cache is not None:
+                self.cache.put(self.map_hash, data)
+            tiles, layout = decode_map(data)
+            self.world = {"tiles": tiles, "layout": layout}
+            self.buffer = None
+            return protocol.encode_join_ready()
+        return None
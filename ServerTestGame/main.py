@@ -1,5 +1,8 @@
 import pygame
 from networkClass import Network
+import protocol
+from prediction import Prediction
+from interpolation import Interpolator
 from settings import *
 
 pygame.init() # Init pygame
@@ -7,6 +10,9 @@ pygame.init() # Init pygame
 win = pygame.display.set_mode((W, H))
 pygame.display.set_caption("Test Game")
 
+# Clock
+clock = pygame.time.Clock()
+
 class Player:
     def __init__(self, x, y, width, height, color):
         self.x = x
@@ -14,7 +20,7 @@ class Player:
         self.width = width
         self.height = height
         self.color = color
-        self.move_speed = 3
+        self.facing = protocol.KEY_RIGHT
 
     def draw(self, win):
         pygame.draw.rect(win, self.color, (self.x, self.y, self.width, self.height))
@@ -26,24 +32,32 @@ class Player:
     def update_color(self, color):
         self.color = color
 
-    def move(self):
-        # Paddle movement
+    def get_input(self):
+        # Pressed keys as a bitmask, the server moves the player
         keys = pygame.key.get_pressed()
+        pressed = 0
         if keys[pygame.K_LEFT]:
-            self.x -= self.move_speed
+            pressed |= protocol.KEY_LEFT
         if keys[pygame.K_RIGHT]:
-            self.x += self.move_speed
+            pressed |= protocol.KEY_RIGHT
         if keys[pygame.K_UP]:
-            self.y -= self.move_speed
+            pressed |= protocol.KEY_UP
         if keys[pygame.K_DOWN]:
-            self.y += self.move_speed
+            pressed |= protocol.KEY_DOWN
+        if pressed:
+            self.facing = pressed # Direction of the next attack
+        return pressed
 
-conn = Network("192.168.1.250", 5555) # Network instance
-data = conn.resive()  # Receive initial data from server
+conn = Network("192.168.1.250", 5555, TRANSPORT) # Network instance
+data = conn.welcome  # Initial data received from server at connect
+conn.start() # From now on the network runs in a background thread
 
 player1 = Player(data["position"][0], data["position"][1], RectW, RectH, data["color"]) # Player instance
+prediction = Prediction(data["position"], MOVE_SPEED, WORLD_BOUNDS) # Moves player1 before the server answers
 
-player2 = Player(0, 0, RectW, RectH, BLK) # Player2 instance
+interpolator = Interpolator(data["tick_rate"], INTERPOLATION_DELAY, local_id=conn.id) # Smooths other players
+others = {} # Other players by id
+join_reported = False # Time until the room map and state arrived is printed once
 
 # Game loop
 running = True
@@ -51,18 +65,43 @@ while running:
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+            conn.send_attack(player1.facing, interpolator.view_tick()) # Server checks it against what we see
     
     win.fill(BLK)
-    player1.move() # Update player position
-    data = conn.send((player1.x, player1.y)) # Initial position send
-    player2.update_position(data["position"][0], data["position"][1]) # Update player2 position
-    player2.update_color(data["color"]) # Update player2 color
+    keys = player1.get_input()
+    seq = conn.send_input(keys) # Send pressed keys to server
+    prediction.apply_input(seq, keys) # and move right away without waiting for it
+    for arrival, data in conn.new_snapshots(): # Every state pushed by the server since last frame
+        interpolator.push_snapshot(data, arrival)
+        for entity in data["entities"]:
+            if entity["id"] == conn.id:
+                prediction.reconcile(entity["position"], data["ack"]) # Server decides where we are, replay what it has not seen yet
+            elif entity["id"] not in others:
+                others[entity["id"]] = Player(entity["position"][0], entity["position"][1], RectW, RectH, entity["color"])
+            else:
+                others[entity["id"]].update_color(entity["color"]) # Update other player color
+    if not join_reported and conn.join_time is not None:
+        print(f"Playable {conn.join_time * 1000:.0f} ms after connecting")
+        join_reported = True
+    for msg_type, event in conn.new_events():
+        if msg_type == protocol.MSG_HIT:
+            print(f"Player {event['attacker']} hit Player {event['target']}")
+    positions = interpolator.positions() # Other players drawn slightly in the past
+    for player_id in list(others):
+        if player_id in positions:
+            others[player_id].update_position(*positions[player_id]) # Update other player position
+        else:
+            del others[player_id] # Player left
+    player1.update_position(*prediction.position)
     player1.draw(win) # Draw player
-    player2.draw(win) # Draw player2
+    for other in others.values():
+        other.draw(win) # Draw other players
 
     pygame.display.flip()
 
     clock.tick(60) # Frame rate 60 FPS
 
 # Quit Pygame
+conn.close()
 pygame.quit()
\ No newline at end of file
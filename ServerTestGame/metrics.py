@@ -0,0 +1,129 @@
+import asyncio
+from bisect import bisect_left
+
+# Metrics in the Prometheus text format
+#
+# Everything is updated from the event loop thread only, so the counters are plain ints and
+# floats: no locks, no atomics, an update is one attribute add. Scraping reads them on the
+# same thread, between two callbacks, so it always sees whole values.
+#
+#     game = GameServer(..., metrics_port=9100)
+#     curl http://127.0.0.1:9100/metrics
+
+TICK_BUCKETS = (0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.066)  # seconds, 1/60 s is the budget
+
+
+class Histogram:
+    """
+    Counts of values below fixed bucket bounds, plus their sum
+
+    Args:
+        bounds (tuple): Upper bound of each bucket, ascending, +Inf is added on top
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name):
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            yield f'{name}_bucket{{le="{bound:g}"}} {total}'
+        yield f'{name}_bucket{{le="+Inf"}} {self.count}'
+        yield f"{name}_sum {self.sum:.6f}"
+        yield f"{name}_count {self.count}"
+
+
+class ServerMetrics:
+    """Counters of one GameServer, updated in place by the hot paths"""
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = [0] * 256  # by message type
+        self.decode_seconds = 0.0  # splitting, decoding and handling received frames
+        self.encode_seconds = 0.0  # encoding and queueing snapshots
+        self.tick = Histogram(TICK_BUCKETS)
+
+
+def metric(lines, name, kind, help_text, value):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    lines.append(f"{name} {value}")
+
+
+def render(game):
+    """
+    Args:
+        game (GameServer): Server to report
+    Returns: str in the Prometheus text exposition format
+    """
+
+    m = game.metrics
+    stats = game.stats()
+    lines = []
+    metric(lines, "gameserver_clients", "gauge", "Connected clients.", stats["clients"])
+    metric(lines, "gameserver_rooms", "gauge", "Open rooms.", stats["rooms"])
+    lines.append("# HELP gameserver_tick_duration_seconds Time to simulate one tick of every room.")
+    lines.append("# TYPE gameserver_tick_duration_seconds histogram")
+    lines.extend(m.tick.lines("gameserver_tick_duration_seconds"))
+    metric(lines, "gameserver_tick_overruns_total", "counter", "Ticks over the tick budget.", stats["tick_overruns"])
+    metric(lines, "gameserver_received_bytes_total", "counter", "Bytes received from clients.", m.bytes_in)
+    metric(lines, "gameserver_sent_bytes_total", "counter", "Bytes written to clients.", m.bytes_out)
+    lines.append("# HELP gameserver_messages_received_total Messages received from clients, by type.")
+    lines.append("# TYPE gameserver_messages_received_total counter")
+    for msg_type, count in enumerate(m.messages_in):
+        if count:
+            lines.append(f'gameserver_messages_received_total{{type="{msg_type}"}} {count}')
+    metric(lines, "gameserver_decode_seconds_total", "counter",
+           "Time spent decoding and handling received frames.", f"{m.decode_seconds:.6f}")
+    metric(lines, "gameserver_encode_seconds_total", "counter",
+           "Time spent encoding and queueing snapshots.", f"{m.encode_seconds:.6f}")
+    metric(lines, "gameserver_send_queue_max", "gauge", "Deepest client send queue.", stats["send_queue_max"])
+    metric(lines, "gameserver_send_queue_total", "gauge", "Messages queued for all clients.",
+           sum(client.queue_depth() for client in game.clients))
+    metric(lines, "gameserver_snapshots_dropped_total", "counter",
+           "Snapshots coalesced because a client was behind.", stats["snapshots_dropped"])
+    metric(lines, "gameserver_lag_disconnects_total", "counter",
+           "Clients disconnected for staying behind on snapshots too long.", stats["lag_disconnects"])
+    metric(lines, "gameserver_queue_full_disconnects_total", "counter",
+           "Clients disconnected for a full send queue.", stats["queue_full_disconnects"])
+    metric(lines, "gameserver_joins_total", "counter", "Completed late joins.", stats["joins"])
+    metric(lines, "gameserver_cpu_seconds_total", "counter", "CPU time of the server process.",
+           f"{stats['cpu_time']:.3f}")
+    return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(game, host, port):
+    """
+    Start the HTTP endpoint, GET /metrics answers with render(game)
+    Returns: the asyncio server
+    """
+
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass  # headers
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4", render(game).encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not found, try /metrics\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,395 @@
+"""
+Network conditioner proxy
+
+Sits between Network clients and the server and makes localhost behave like a real network:
+delay, jitter, loss, reordering and a bandwidth cap, in both directions.
+
+    python netem_proxy.py --server 127.0.0.1:5555 --port 5556 --delay 50 --jitter 10 --loss 2
+    python netem_proxy.py --transport udp --server 127.0.0.1:5555 --port 5556 --reorder 1 --bandwidth 64
+
+then point the client at port 5556. From a test:
+
+    proxy = NetemProxy(("127.0.0.1", server.port), Conditions(delay=0.05, loss=0.02), transport="udp")
+    await proxy.start()                # proxy.port is where clients connect
+    proxy.conditions.delay = 0.2       # can be changed while it runs
+    await proxy.stop()
+
+or start_in_thread() for blocking code such as Network.
+
+Every packet is scheduled with loop.call_at for its exact delivery time, the proxy never sleeps
+per packet, so it adds no timing noise of its own even with hundreds of connections.
+TCP can not lose or reorder bytes: there a "lost" chunk is held back for tcp_retransmit seconds,
+like a TCP retransmission would, and jitter never lets a chunk overtake an earlier one.
+With a bandwidth cap a link queues at most queue_size bytes, like a router: a TCP pipe stops
+reading until the queue drains, so the sender's socket buffers fill up as on a slow link, and
+UDP datagrams arriving at a full queue are dropped.
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+
+TCP_CHUNK = 65536
+UDP_IDLE_TIMEOUT = 30.0  # seconds without a datagram either way before a client's upstream socket is closed
+
+
+class Conditions:
+    """
+    What the proxy does to traffic, applied to each direction on its own
+
+    Args:
+        delay (float, optional): Seconds added to every packet, one way. Defaults to 0.
+        jitter (float, optional): Random extra seconds between -jitter and +jitter. Defaults to 0.
+        loss (float, optional): Fraction of packets dropped (0..1). Defaults to 0.
+        reorder (float, optional): Fraction of packets held back so later ones overtake them. Defaults to 0.
+        reorder_gap (float, optional): Seconds a reordered packet is held back. Defaults to 0.02.
+        bandwidth (float, optional): Bytes per second each direction of a connection can carry,
+            None for no cap. Defaults to None.
+        tcp_retransmit (float, optional): Seconds a "lost" TCP chunk is held back. Defaults to 0.2.
+        queue_size (int, optional): Bytes waiting for the bandwidth cap before TCP stops reading and
+            UDP drops. Defaults to 64 KB.
+    """
+
+    def __init__(self, delay=0.0, jitter=0.0, loss=0.0, reorder=0.0, reorder_gap=0.02, bandwidth=None,
+                 tcp_retransmit=0.2, queue_size=65536):
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_gap = reorder_gap
+        self.bandwidth = bandwidth
+        self.tcp_retransmit = tcp_retransmit
+        self.queue_size = queue_size
+
+
+class Link:
+    """
+    One direction of one connection
+    Works out when a packet comes out of the far end.
+    """
+
+    def __init__(self, conditions, rng, ordered):
+        self.conditions = conditions
+        self.rng = rng
+        self.ordered = ordered  # TCP: a packet never leaves before the one in front of it
+        self.busy_until = 0.0  # bandwidth cap: when the link finished sending the last packet
+        self.last_delivery = 0.0
+
+    def backlog(self, now):
+        # bytes still waiting for the bandwidth cap
+        bandwidth = self.conditions.bandwidth
+        return max(0.0, self.busy_until - now) * bandwidth if bandwidth else 0.0
+
+    def drain_time(self, now):
+        """
+        Returns: seconds until the backlog is back under queue_size, 0 if it already is
+        """
+
+        c = self.conditions
+        if not c.bandwidth:
+            return 0.0
+        return max(0.0, self.busy_until - now - c.queue_size / c.bandwidth)
+
+    def schedule(self, now, size, stats):
+        """
+        Returns: delivery time on the loop clock, None if the packet is lost
+        """
+
+        c = self.conditions
+        if not self.ordered and self.backlog(now) + size > c.queue_size:
+            stats["lost"] += 1  # queue full, tail drop
+            return None
+        extra = 0.0
+        if c.loss and self.rng.random() < c.loss:
+            stats["lost"] += 1
+            if not self.ordered:
+                return None
+            extra += c.tcp_retransmit
+        if c.reorder and not self.ordered and self.rng.random() < c.reorder:
+            stats["reordered"] += 1
+            extra += c.reorder_gap
+        sent = now
+        if c.bandwidth:
+            sent = max(now, self.busy_until) + size / c.bandwidth
+            self.busy_until = sent
+        delivery = sent + c.delay + extra
+        if c.jitter:
+            delivery += self.rng.uniform(-c.jitter, c.jitter)
+        delivery = max(delivery, now)
+        if self.ordered:
+            delivery = max(delivery, self.last_delivery)
+        self.last_delivery = delivery
+        stats["forwarded"] += 1
+        return delivery
+
+
+class UdpClientSide(asyncio.DatagramProtocol):
+    """Socket the clients send to, one upstream socket per client address"""
+
+    def __init__(self, proxy, idle_timeout=UDP_IDLE_TIMEOUT):
+        self.proxy = proxy
+        self.idle_timeout = idle_timeout
+        self.transport = None
+        self.upstreams = {}  # client addr -> UdpServerSide
+        self.expire_handle = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.expire_handle = asyncio.get_running_loop().call_later(self.idle_timeout / 2, self.expire)
+
+    def connection_lost(self, exc):
+        if self.expire_handle is not None:
+            self.expire_handle.cancel()
+        for upstream in self.upstreams.values():
+            upstream.close()
+        self.upstreams.clear()
+
+    def datagram_received(self, data, addr):
+        upstream = self.upstreams.get(addr)
+        if upstream is None:
+            upstream = UdpServerSide(self, addr, self.proxy)
+            self.upstreams[addr] = upstream
+            self.proxy.stats["connections"] += 1
+            task = asyncio.get_running_loop().create_task(upstream.open())
+            self.proxy.tasks.add(task)
+            task.add_done_callback(self.proxy.tasks.discard)
+        upstream.forward(data)
+
+    def expire(self):
+        # UDP has no close, a client that went quiet is gone
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        for addr, upstream in list(self.upstreams.items()):
+            if now - upstream.last_active > self.idle_timeout:
+                upstream.close()
+                del self.upstreams[addr]
+        self.expire_handle = loop.call_later(self.idle_timeout / 2, self.expire)
+
+
+class UdpServerSide(asyncio.DatagramProtocol):
+    """Upstream socket of one client, the server sees one address per client"""
+
+    def __init__(self, client_side, addr, proxy):
+        self.client_side = client_side
+        self.addr = addr
+        self.proxy = proxy
+        self.transport = None
+        self.waiting = []  # datagrams that arrived before the upstream socket was open
+        self.up = Link(proxy.conditions, proxy.rng, ordered=False)
+        self.down = Link(proxy.conditions, proxy.rng, ordered=False)
+        self.last_active = asyncio.get_running_loop().time()
+        self.closed = False
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.create_datagram_endpoint(lambda: self, remote_addr=self.proxy.server_address)
+        except OSError as e:
+            print(f"Proxy: no upstream socket for {self.addr}: {e}")
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.closed:
+            transport.close()  # expired or stopped while opening
+            return
+        for data in self.waiting:
+            self.forward(data)
+        self.waiting = []
+
+    def forward(self, data):
+        loop = asyncio.get_running_loop()
+        self.last_active = loop.time()
+        if self.transport is None:
+            self.waiting.append(data)
+            return
+        delivery = self.up.schedule(loop.time(), len(data), self.proxy.stats)
+        if delivery is not None:
+            loop.call_at(delivery, self.send_up, data)
+
+    def send_up(self, data):
+        if not self.transport.is_closing():
+            self.transport.sendto(data)
+
+    def datagram_received(self, data, addr):
+        loop = asyncio.get_running_loop()
+        self.last_active = loop.time()
+        delivery = self.down.schedule(loop.time(), len(data), self.proxy.stats)
+        if delivery is not None:
+            loop.call_at(delivery, self.send_down, data)
+
+    def send_down(self, data):
+        transport = self.client_side.transport
+        if transport is not None and not transport.is_closing():
+            transport.sendto(data, self.addr)
+
+    def close(self):
+        self.closed = True
+        if self.transport is not None:
+            self.transport.close()
+
+
+class NetemProxy:
+    """
+    asyncio TCP or UDP proxy that applies Conditions to the traffic
+
+    Args:
+        server_address (tuple): (host, port) of the real server
+        conditions (Conditions, optional): Shared by every connection, can be changed while running.
+            Defaults to no conditions.
+        transport (str, optional): "tcp" or "udp". Defaults to "tcp".
+        host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+        port (int, optional): Port to listen on, 0 for any free port. Defaults to 0.
+        seed (int, optional): Seed of the random numbers, the same seed drops the same packets. Defaults to None.
+        idle_timeout (float, optional): UDP only, seconds without a datagram before a client's upstream
+            socket is closed. Defaults to UDP_IDLE_TIMEOUT.
+    """
+
+    def __init__(self, server_address, conditions=None, transport="tcp", host="127.0.0.1", port=0, seed=None,
+                 idle_timeout=UDP_IDLE_TIMEOUT):
+        if transport not in ("tcp", "udp"):
+            raise ValueError(f"Unknown transport: {transport}")
+        self.server_address = server_address
+        self.conditions = conditions or Conditions()
+        self.transport = transport
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.idle_timeout = idle_timeout
+        self.stats = {"connections": 0, "forwarded": 0, "lost": 0, "reordered": 0}
+        self.server = None
+        self.udp = None
+        self.tasks = set()
+        self.loop = None
+        self.thread = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self.transport == "udp":
+            endpoint, self.udp = await self.loop.create_datagram_endpoint(
+                lambda: UdpClientSide(self, self.idle_timeout), local_addr=(self.host, self.port))
+            self.port = endpoint.get_extra_info("sockname")[1]
+        else:
+            self.server = await asyncio.start_server(self.handle_tcp, self.host, self.port)
+            self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.udp is not None:
+            for upstream in self.udp.upstreams.values():
+                upstream.close()
+            self.udp.transport.close()
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)  # let handle_tcp see its pipes end and close both sides
+
+    async def handle_tcp(self, client_reader, client_writer):
+        self.stats["connections"] += 1
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.server_address)
+        except OSError:
+            client_writer.close()
+            return
+        up = Link(self.conditions, self.rng, ordered=True)
+        down = Link(self.conditions, self.rng, ordered=True)
+        pipes = [asyncio.create_task(self.pipe(client_reader, server_writer, up)),
+                 asyncio.create_task(self.pipe(server_reader, client_writer, down))]
+        self.tasks.update(pipes)
+        try:
+            await asyncio.wait(pipes, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pipes:
+                task.cancel()
+                self.tasks.discard(task)
+            client_writer.close()
+            server_writer.close()
+
+    async def pipe(self, reader, writer, link):
+        loop = asyncio.get_running_loop()
+        last = None
+        while True:
+            try:
+                data = await reader.read(TCP_CHUNK)
+            except (ConnectionError, OSError):
+                data = b""
+            if not data:
+                # close once everything in flight was delivered
+                if last is not None and last > loop.time():
+                    await asyncio.sleep(last - loop.time())
+                return
+            now = loop.time()
+            last = link.schedule(now, len(data), self.stats)
+            loop.call_at(last, self.write, writer, data)
+            # backpressure: stop reading while the link queue is full, the sender's buffers fill instead
+            wait = link.drain_time(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    @staticmethod
+    def write(writer, data):
+        if not writer.is_closing():
+            writer.write(data)
+
+    def start_in_thread(self):
+        """
+        Run the proxy on its own event loop in a daemon thread, for blocking code
+        Returns: the port clients should connect to
+        """
+
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.port
+
+    def stop_thread(self):
+        if self.thread is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=1)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Proxy that adds delay, jitter, loss and bandwidth limits")
+    parser.add_argument("--server", default="127.0.0.1:5555", help="host:port of the game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5556)
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--delay", type=float, default=0, help="ms added each way")
+    parser.add_argument("--jitter", type=float, default=0, help="ms, +- around the delay")
+    parser.add_argument("--loss", type=float, default=0, help="percent of packets lost")
+    parser.add_argument("--reorder", type=float, default=0, help="percent of packets reordered (UDP)")
+    parser.add_argument("--bandwidth", type=float, help="KB/s each way per connection")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stats-interval", type=float, default=10, help="seconds between stats, 0 = off")
+    args = parser.parse_args()
+
+    host, port = args.server.rsplit(":", 1)
+    conditions = Conditions(delay=args.delay / 1000, jitter=args.jitter / 1000, loss=args.loss / 100,
+                            reorder=args.reorder / 100,
+                            bandwidth=args.bandwidth * 1024 if args.bandwidth else None)
+    proxy = NetemProxy((host, int(port)), conditions, args.transport, args.host, args.port, args.seed)
+    await proxy.start()
+    print(f"{args.transport.upper()} proxy {args.host}:{proxy.port} -> {args.server}")
+    while True:
+        await asyncio.sleep(args.stats_interval or 3600)
+        if args.stats_interval:
+            print(f"Proxy stats: {proxy.stats}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
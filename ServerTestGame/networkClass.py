@@ -1,39 +1,314 @@
+import os
+import queue
+import selectors
 import socket
-import pickle
+import threading
+import time
+from collections import deque
+import protocol
+import transport
+from snapshots import SnapshotReceiver
+from joinstate import JoinReceiver, ContentCache
+from settings import CONTENT_CACHE
 
 class Network:
-    def __init__(self, server_ip, server_port):
-        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    """
+    Client side connection to the game server
+
+    The handshake (connect + welcome) is blocking. After start() a background thread
+    owns the socket: it sends queued inputs and keeps the newest snapshot,
+    so the render loop only touches in-memory buffers and never waits on the network.
+
+    Args:
+        server_ip (str): Server address
+        server_port (int): Server port
+        transport (str, optional): "tcp" or "udp", must match the server. Defaults to "tcp".
+        timeout (float, optional): Seconds to wait for the server during connect. Defaults to 5.
+        cache_dir (str, optional): Folder of maps downloaded before, None to always download.
+            Defaults to CONTENT_CACHE from settings.
+    """
+
+    def __init__(self, server_ip, server_port, transport="tcp", timeout=5.0, cache_dir=CONTENT_CACHE):
+        if transport not in ("tcp", "udp"):
+            raise ValueError(f"Unknown transport: {transport}")
+        self.transport = transport
+        self.timeout = timeout
+        kind = socket.SOCK_DGRAM if transport == "udp" else socket.SOCK_STREAM
+        self.client = socket.socket(socket.AF_INET, kind)
         self.server_address = (server_ip, server_port)
+        self.decoder = protocol.FrameDecoder()
+        self.receiver = SnapshotReceiver()  # rebuilds full snapshots from deltas
+        self.peer = None  # transport.UdpPeer for UDP connections
+        self.pending = []  # frames received but not read yet
+        self.welcome = None  # {"id", "color", "position"} sent by the server at connect
+        self.input_seq = 0  # sequence number of the last input sent
+        self.recent_inputs = deque(maxlen=3)  # UDP repeats the last inputs so one lost packet loses nothing
+        self.join = JoinReceiver(ContentCache(cache_dir) if cache_dir else None)  # map and state of the room
+        self.started = time.perf_counter()
+        self.join_time = None  # seconds from creating the connection until the room state was complete
+
+        # Buffers shared with the network thread
+        self.lock = threading.Lock()
+        self.snapshots = []  # (arrival time, snapshot) not read yet, protected by lock
+        self.events = []  # game events (hits) not read yet, protected by lock
+        self.outgoing = queue.Queue()  # (encoded frames, reliable) waiting to be sent
+        self.connected = False
+        self.thread = None
+        # socketpair used to wake the network thread up when there is something to send
+        self.wake_recv, self.wake_send = socket.socketpair()
+
         self.id = self.connect()
 
-    # Send data to server and receive response
-    # The data parameter is expected to be a tuple (x, y) representing player position
-    # The method returns the other player's position as a tuple (x, y)
-    def send(self, data):
+    # Send the pressed keys of this frame to the server
+    # keys is a bitmask of protocol.KEY_* values
+    # Returns the sequence number given to this input
+    def send_input(self, keys):
+        self.input_seq += 1
+        # ack the newest snapshot so the server can send deltas against it
+        self.recent_inputs.append(protocol.encode_input(self.input_seq, keys, self.receiver.last_tick))
+        if self.transport == "udp":
+            self.queue_frame(b"".join(self.recent_inputs))
+        else:
+            self.queue_frame(self.recent_inputs[-1])
+        return self.input_seq
+
+    # Slash in a direction (protocol.KEY_* bitmask)
+    # view_tick is the server tick other players are drawn at (Interpolator.view_tick),
+    # the server checks the hit against where they were then
+    def send_attack(self, direction, view_tick):
+        self.queue_frame(protocol.encode_attack(view_tick, direction), reliable=True)
+
+    # Rollback matches: local inputs from first_frame on, relayed by the server to the other peer
+    # ack is how many frames of the other peer's inputs we have, it resends from there
+    # Unreliable, every call repeats what the other peer has not acknowledged yet
+    def send_peer_inputs(self, ack, first_frame, keys):
+        self.queue_frame(protocol.encode_peer_inputs(self.id, ack, first_frame, keys))
+
+    # Queue encoded frames for the network thread, never blocks
+    # reliable only matters for UDP: game events that must arrive go on the reliable channel
+    def queue_frame(self, data, reliable=False):
+        self.outgoing.put((data, reliable))
         try:
-            self.client.sendto(pickle.dumps(data), self.server_address)
-            response, _ = self.client.recvfrom(1024)
-            return pickle.loads(response)
-        except Exception as e:
-            print(f"Network error: {e}")
+            self.wake_send.send(b"\0")
+        except BlockingIOError:
+            pass  # a wake up is already pending
+
+    # Newest snapshot pushed by the server since the last call, or None
+    # Older snapshots that were never read are dropped
+    # The snapshot is {"tick", "entities", "ack"}, entities holds every player {"id", "position", "color"}
+    def latest_snapshot(self):
+        snapshots = self.new_snapshots()
+        if not snapshots:
             return None
-        
-    def resive(self):
+        return snapshots[-1][1]
+
+    # Every snapshot received since the last call as (arrival time, snapshot), oldest first
+    # arrival time is time.perf_counter() when the network thread decoded it
+    def new_snapshots(self):
+        with self.lock:
+            snapshots = self.snapshots
+            self.snapshots = []
+        return snapshots
+
+    # Game events received since the last call, oldest first
+    # Each one is (msg_type, decoded message), e.g. (protocol.MSG_HIT, {"attacker", "target"})
+    # or (protocol.MSG_PEER_INPUT, {"id", "ack", "frame", "keys"})
+    def new_events(self):
+        with self.lock:
+            events = self.events
+            self.events = []
+        return events
+
+    # Map of the room once the join is complete, None before
+    # {"tiles", "layout" (bytes, row by row)}
+    @property
+    def world(self):
+        return self.join.world
+
+    # Block until a whole frame arrives and return it decoded
+    # If msg_type is given, frames of other types are handled like the network thread would
+    # Only used for the handshake, before start()
+    def resive(self, msg_type=None):
         try:
-            response = self.client.recv(1024)
-            return pickle.loads(response)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                while not self.pending:
+                    self.client.settimeout(max(0.01, deadline - time.monotonic()))
+                    if self.transport == "udp":
+                        self.pending.extend(self.udp_frames(self.client.recv(transport.MAX_DATAGRAM)))
+                        continue
+                    data = self.client.recv(4096)
+                    if not data:
+                        raise ConnectionError("Server closed the connection")
+                    self.pending.extend(self.decoder.feed(data))
+                frame_type, payload = self.pending.pop(0)
+                if msg_type is None or frame_type == msg_type:
+                    return protocol.decode(frame_type, payload)
+                self.handle_frame(frame_type, payload)
         except Exception as e:
             print(f"Receive error: {e}")
             return None
-        
+        finally:
+            self.client.settimeout(None)
+
     def connect(self):
         try:
             self.client.connect(self.server_address)
-            return pickle.loads(self.client.recv(1024))
+            if self.transport == "udp":
+                self.udp_handshake()
+            self.welcome = self.resive(protocol.MSG_WELCOME)
+            self.connected = self.welcome is not None
+            return self.welcome["id"]
         except Exception as e:
             print(f"Connection error: {e}")
             return None
-        
 
+    def udp_handshake(self):
+        # Send CONNECT until the server answers with ACCEPT carrying our token
+        token = int.from_bytes(os.urandom(4), "big")
+        packet = transport.handshake_packet(transport.PKT_CONNECT, token)
+        deadline = time.monotonic() + self.timeout
+        try:
+            while time.monotonic() < deadline:
+                self.client.send(packet)
+                self.client.settimeout(0.25)
+                try:
+                    reply = self.client.recv(transport.MAX_DATAGRAM)
+                except socket.timeout:
+                    continue
+                if reply and reply[0] == transport.PKT_ACCEPT and transport.parse_handshake(reply)[1] == token:
+                    self.peer = transport.UdpPeer(self.client.send, timeout=self.timeout)
+                    return
+        finally:
+            self.client.settimeout(None)
+        raise ConnectionError("No answer from server")
+
+    def udp_frames(self, datagram):
+        frames = []
+        for channel, data in self.peer.datagram_received(datagram):
+            frames.extend(protocol.split_frames(data))
+        if self.peer.closed:
+            raise ConnectionError("Server closed the connection")
+        return frames
+
+    def start(self):
+        """Start the background network thread"""
+
+        if self.thread is None and self.connected:
+            self.client.setblocking(False)
+            self.wake_recv.setblocking(False)
+            self.wake_send.setblocking(False)
+            self.thread = threading.Thread(target=self.network_loop, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.connected = False
+        self.queue_frame(b"")
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        if self.peer is not None:
+            self.peer.disconnect()
+        self.client.close()
+
+    def handle_frame(self, msg_type, payload):
+        if msg_type == protocol.MSG_SNAPSHOT or msg_type == protocol.MSG_DELTA:
+            snapshot = self.receiver.apply(msg_type, payload)
+            if snapshot is None:
+                return  # delta against a snapshot we no longer have, the server will resend
+            arrival = time.perf_counter()
+            with self.lock:
+                self.snapshots.append((arrival, snapshot))
+                if len(self.snapshots) > 64:
+                    del self.snapshots[0]  # nobody is reading, keep memory bounded
+        elif msg_type in (protocol.MSG_JOIN_INFO, protocol.MSG_JOIN_CHUNK, protocol.MSG_JOIN_DONE):
+            reply = self.join.handle(msg_type, payload)
+            if reply is not None:
+                self.queue_frame(reply, reliable=True)
+            if self.join.world is not None and self.join_time is None:
+                self.join_time = time.perf_counter() - self.started
+        elif msg_type == protocol.MSG_HIT or msg_type == protocol.MSG_PEER_INPUT:
+            event = (msg_type, protocol.decode(msg_type, payload))
+            with self.lock:
+                self.events.append(event)
+                if len(self.events) > 256:
+                    del self.events[0]
 
+    def receive_ready(self):
+        # read everything the socket has and handle the frames
+        if self.transport == "udp":
+            while True:
+                try:
+                    datagram = self.client.recv(transport.MAX_DATAGRAM)
+                except BlockingIOError:
+                    return
+                for msg_type, payload in self.udp_frames(datagram):
+                    self.handle_frame(msg_type, payload)
+        try:
+            data = self.client.recv(65536)
+        except BlockingIOError:
+            return
+        if not data:
+            raise ConnectionError("Server closed the connection")
+        for msg_type, payload in self.decoder.feed(data):
+            self.handle_frame(msg_type, payload)
+
+    def network_loop(self):
+        # frames that arrived together with the welcome
+        for msg_type, payload in self.pending:
+            self.handle_frame(msg_type, payload)
+        self.pending = []
+
+        selector = selectors.DefaultSelector()
+        selector.register(self.client, selectors.EVENT_READ)
+        selector.register(self.wake_recv, selectors.EVENT_READ)
+        # UDP wakes up on its own to resend reliable messages and send keepalives
+        select_timeout = 0.05 if self.transport == "udp" else None
+        out_buffer = bytearray()
+        try:
+            while self.connected:
+                for key, mask in selector.select(select_timeout):
+                    if key.fileobj is self.wake_recv:
+                        try:
+                            self.wake_recv.recv(4096)
+                        except BlockingIOError:
+                            pass
+                    elif mask & selectors.EVENT_READ:
+                        self.receive_ready()
+
+                if self.transport == "udp":
+                    # one datagram per queued message, nothing to buffer
+                    while True:
+                        try:
+                            data, reliable = self.outgoing.get_nowait()
+                        except queue.Empty:
+                            break
+                        if not data:
+                            continue
+                        if reliable:
+                            self.peer.send_reliable(data)
+                        else:
+                            self.peer.send_unreliable(data)
+                    if not self.peer.update():
+                        raise ConnectionError("Connection timed out")
+                    continue
+
+                # move queued frames to the send buffer and write as much as the socket takes
+                while True:
+                    try:
+                        out_buffer += self.outgoing.get_nowait()[0]
+                    except queue.Empty:
+                        break
+                if out_buffer:
+                    try:
+                        sent = self.client.send(out_buffer)
+                        del out_buffer[:sent]
+                    except BlockingIOError:
+                        pass
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if out_buffer else 0)
+                selector.modify(self.client, events)
+        except Exception as e:
+            if self.connected:
+                print(f"Network error: {e}")
+        finally:
+            self.connected = False
+            selector.close()
@@ -0,0 +1,117 @@
+import asyncio
+import subprocess
+import sys
+import threading
+
+# Optional network setup plugins for the server
+# They open the port to the outside (Windows firewall rule, UPnP port mapping on the router).
+# Both are slow and can hang, so the server starts them after its listener is up: they run in
+# worker threads with a timeout and a failing plugin is only reported, the server keeps running.
+
+RULE_NAME = "MyGameServer"
+
+
+def firewall(port, transport="tcp"):
+    """Windows firewall rule that allows incoming connections on the port"""
+
+    if sys.platform != "win32":
+        return "skipped, not on Windows"
+    subprocess.run(
+        f'netsh advfirewall firewall add rule '
+        f'name="{RULE_NAME}" dir=in action=allow protocol={transport.upper()} localport={port}',
+        shell=True, check=True, capture_output=True
+    )
+    return f"rule {RULE_NAME} added"
+
+
+def upnp(port, transport="tcp"):
+    """UPnP port mapping on the router, same external and internal port"""
+
+    import miniupnpc
+    client = miniupnpc.UPnP()
+    client.discoverdelay = 2000
+    if not client.discover():
+        raise RuntimeError("no UPnP device found")
+    client.selectigd()
+    client.addportmapping(port, transport.upper(), client.lanaddr, port, RULE_NAME, '')
+    return f"{client.externalipaddress()}:{port} -> {client.lanaddr}:{port}"
+
+
+def in_daemon_thread(function, *args):
+    """
+    Run a blocking function in a daemon thread
+    Unlike asyncio.to_thread a hung call does not keep the process alive at exit.
+    Returns: asyncio future with the result
+    """
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result, error):
+        if future.done():
+            return  # nobody waits any more
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def target():
+        try:
+            result, error = function(*args), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(set_result, result, error)
+        except RuntimeError:
+            pass  # the loop is closed, the server stopped before the plugin finished
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+PLUGINS = {
+    "firewall": firewall,
+    "upnp": upnp,
+}
+
+
+async def run_plugin(name, port, transport="tcp", timeout=10.0):
+    """
+    Run one plugin in a worker thread
+    Args:
+        name (str): Key of PLUGINS
+        port (int): Port the server listens on
+        transport (str, optional): "tcp" or "udp". Defaults to "tcp".
+        timeout (float, optional): Seconds before giving up. Defaults to 10.
+    Returns: True if the plugin finished
+    """
+
+    plugin = PLUGINS[name]
+    try:
+        # the thread can not be stopped, on timeout we just stop waiting for it
+        result = await asyncio.wait_for(in_daemon_thread(plugin, port, transport), timeout)
+    except asyncio.TimeoutError:
+        print(f"Plugin {name}: no result after {timeout:g}s, skipped")
+        return False
+    except Exception as e:
+        print(f"Plugin {name} failed: {e}")
+        return False
+    print(f"Plugin {name}: {result}")
+    return True
+
+
+async def run_plugins(names, port, transport="tcp", timeout=10.0):
+    """Run several plugins at the same time, see run_plugin"""
+
+    for name in names:
+        if name not in PLUGINS:
+            raise ValueError(f"Unknown plugin: {name}, choose from {', '.join(PLUGINS)}")
+    return await asyncio.gather(*(run_plugin(name, port, transport, timeout) for name in names))
+
+
+async def stop(task):
+    """Cancel a run_plugins task at shutdown and wait until it is gone, None is fine"""
+
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
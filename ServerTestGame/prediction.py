@@ -0,0 +1,61 @@
+from collections import deque
+import simulation
+
+
+class Prediction:
+    """
+    Client side prediction for the local player
+
+    Inputs are applied locally as soon as they are sent, so controls feel instant.
+    When a snapshot arrives we jump to the server position and replay the inputs
+    the server has not processed yet (seq > ack). If client and server agree
+    the replay lands exactly where we already were and nothing moves on screen.
+
+    Args:
+        position (tuple): Starting (x, y) sent by the server
+        speed (int): Pixels moved per input, must match the server
+        bounds (tuple, optional): (max_x, max_y) used by the server. Defaults to None.
+    """
+
+    def __init__(self, position, speed, bounds=None):
+        self.x, self.y = position
+        self.speed = speed
+        self.bounds = bounds
+        self.pending = deque()  # (seq, keys) sent but not acknowledged yet
+        self.last_correction = 0  # distance between prediction and server state at the last reconcile
+
+    @property
+    def position(self):
+        return self.x, self.y
+
+    def apply_input(self, seq, keys):
+        """
+        Predict one input
+        Args:
+            seq (int): Sequence number returned by Network.send_input
+            keys (int): Keys bitmask sent with it
+        """
+
+        self.pending.append((seq, keys))
+        self.x, self.y = simulation.move(self.x, self.y, keys, self.speed, self.bounds)
+
+    def reconcile(self, server_position, ack_seq):
+        """
+        Correct the prediction with an authoritative state
+        Args:
+            server_position (tuple): (x, y) of the local player in the snapshot
+            ack_seq (int): Last input sequence the server simulated
+        Returns: int, how far (in pixels, manhattan) the prediction was off
+        """
+
+        while self.pending and self.pending[0][0] <= ack_seq:
+            self.pending.popleft()
+
+        predicted = (self.x, self.y)
+        x, y = server_position
+        for _, keys in self.pending:
+            x, y = simulation.move(x, y, keys, self.speed, self.bounds)
+        self.x, self.y = x, y
+
+        self.last_correction = abs(x - predicted[0]) + abs(y - predicted[1])
+        return self.last_correction
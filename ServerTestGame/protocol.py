@@ -0,0 +1,435 @@
+import struct
+
+# Wire protocol shared by server.py and networkClass.py
+# Every message travels inside a frame:
+#   [payload length: uint16][message type: uint8][payload ...]
+# so the receiver always knows where one message ends and the next begins,
+# even when TCP merges two sends into one recv or splits one send in two.
+# Hot messages (position, input, snapshot) use fixed struct layouts instead of pickle.
+
+PROTOCOL_VERSION = 5
+
+HEADER = struct.Struct("!HB")  # payload length, message type
+MAX_PAYLOAD = 0xFFFF
+
+# Message types
+MSG_WELCOME = 1     # server -> client, sent once after connect
+MSG_POSITION = 2    # client -> server, local player position
+MSG_INPUT = 3       # client -> server, pressed keys for one frame
+MSG_SNAPSHOT = 4    # server -> client, state of the players
+MSG_DELTA = 5       # server -> client, changes since a snapshot the client acknowledged
+MSG_PING = 6        # client -> server, answered right away with MSG_PONG to measure the round trip
+MSG_PONG = 7        # server -> client, echoes the ping payload
+MSG_ATTACK = 8      # client -> server, slash in a direction, checked against what the client saw
+MSG_HIT = 9         # server -> client, an attack hit a player
+MSG_PEER_INPUT = 10  # both ways, rollback matches: inputs of one peer relayed by the server to the other
+MSG_JOIN_INFO = 11   # server -> client, content hash and size of the room map, sent after the welcome
+MSG_JOIN_REQUEST = 12  # client -> server, answers MSG_JOIN_INFO: whether the map is in the client's cache
+MSG_JOIN_CHUNK = 13  # server -> client, part of the map, a few per tick
+MSG_JOIN_DONE = 14   # server -> client, the map is through, the last message of a join
+MSG_JOIN_READY = 15  # client -> server, the client has everything and can play
+
+# Payload layouts
+WELCOME = struct.Struct("!BHhhBBBB")        # protocol version, player id, x, y, r, g, b, server tick rate
+POSITION = struct.Struct("!hh")             # x, y
+INPUT = struct.Struct("!IBI")               # input sequence number, keys bitmask, last snapshot tick received
+SNAPSHOT_HEADER = struct.Struct("!IH")      # tick, entity count
+SNAPSHOT_ENTITY = struct.Struct("!HhhBBB")  # player id, x, y, r, g, b
+SNAPSHOT_TRAILER = struct.Struct("!I")      # last input sequence processed for the receiver
+DELTA_HEADER = struct.Struct("!IIHH")       # tick, baseline tick, changed count, removed count
+DELTA_ENTITY = struct.Struct("!HB")         # player id, changed fields mask, then the fields in the mask
+DELTA_COORD = struct.Struct("!h")           # x or y
+DELTA_COLOR = struct.Struct("!BBB")         # r, g, b
+DELTA_REMOVED = struct.Struct("!H")         # player id
+PING = struct.Struct("!Q")                  # sender timestamp (any unit, only the sender reads it)
+ATTACK = struct.Struct("!IBB")              # server tick the client was showing other players at, 1/256 ticks
+                                            # past it (remote players are drawn between ticks), direction keys
+HIT = struct.Struct("!HH")                  # attacker id, target id
+PEER_INPUT = struct.Struct("!HIIB")         # sender player id, frames of the receiver's inputs confirmed,
+                                            # first frame, count, then count keys bytes
+JOIN_INFO = struct.Struct("!16sI")          # map content hash, map size in bytes
+JOIN_REQUEST = struct.Struct("!16s?")       # map content hash, True if the client has it cached
+JOIN_CHUNK = struct.Struct("!I")            # offset in the map, then the bytes
+
+# Fields mask used by MSG_DELTA
+FIELD_X = 1
+FIELD_Y = 2
+FIELD_COLOR = 4
+FIELD_ALL = FIELD_X | FIELD_Y | FIELD_COLOR
+
+# Keys bitmask used by MSG_INPUT
+KEY_LEFT = 1
+KEY_RIGHT = 2
+KEY_UP = 4
+KEY_DOWN = 8
+KEY_BOMB = 16  # rollback matches only
+
+
+class ProtocolError(Exception):
+    """Raised when a frame can not be decoded"""
+
+
+def frame(msg_type, payload):
+    """
+    Wrap a payload in a frame header
+    Args:
+        msg_type (int): One of the MSG_* constants
+        payload (bytes): Encoded message body
+    Returns: bytes ready to be sent on the socket
+    """
+
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload too large: {len(payload)} bytes")
+    return HEADER.pack(len(payload), msg_type) + payload
+
+
+def encode_welcome(player_id, position, color, tick_rate):
+    return frame(MSG_WELCOME, WELCOME.pack(PROTOCOL_VERSION, player_id, position[0], position[1], *color, tick_rate))
+
+
+def encode_position(x, y):
+    return frame(MSG_POSITION, POSITION.pack(x, y))
+
+
+def encode_input(seq, keys, ack_tick=0):
+    return frame(MSG_INPUT, INPUT.pack(seq, keys, ack_tick))
+
+
+def shared_frame(msg_type, body):
+    """
+    Frame header and body of a snapshot or delta, everything except the per-client trailer
+    The header length already counts the trailer, so one shared part can be sent to every client
+    followed by its own encode_trailer().
+    Returns: bytes
+    """
+
+    if len(body) + SNAPSHOT_TRAILER.size > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload too large: {len(body) + SNAPSHOT_TRAILER.size} bytes")
+    return HEADER.pack(len(body) + SNAPSHOT_TRAILER.size, msg_type) + body
+
+
+def encode_trailer(ack_seq):
+    return SNAPSHOT_TRAILER.pack(ack_seq)
+
+
+def encode_snapshot_shared(tick, entities):
+    """
+    Encode a snapshot of the players without the trailer
+    Args:
+        tick (int): Server tick the snapshot was taken at
+        entities (list): List of (player_id, (x, y), (r, g, b)) tuples
+    Returns: bytes, send encode_trailer(ack_seq) right after it
+    """
+
+    parts = [SNAPSHOT_HEADER.pack(tick, len(entities))]
+    for player_id, position, color in entities:
+        parts.append(SNAPSHOT_ENTITY.pack(player_id, position[0], position[1], *color))
+    return shared_frame(MSG_SNAPSHOT, b"".join(parts))
+
+
+def encode_snapshot(tick, entities, ack_seq=0):
+    """
+    Encode a snapshot of the players
+    Args:
+        tick (int): Server tick the snapshot was taken at
+        entities (list): List of (player_id, (x, y), (r, g, b)) tuples
+        ack_seq (int, optional): Last input sequence the server processed for the receiver.
+            It is the last field so the rest of the frame is the same for every client.
+    Returns: bytes
+    """
+
+    return encode_snapshot_shared(tick, entities) + encode_trailer(ack_seq)
+
+
+def encode_delta_shared(tick, baseline_tick, changed, removed):
+    """
+    Encode the changes between a baseline snapshot and the current one, without the trailer
+    Args:
+        tick (int): Server tick of the new snapshot
+        baseline_tick (int): Tick of the snapshot the changes are relative to
+        changed (list): List of (player_id, mask, (x, y), (r, g, b)), only the fields in mask are written
+        removed (list): Player ids that are in the baseline but not anymore
+    Returns: bytes, send encode_trailer(ack_seq) right after it
+    """
+
+    parts = [DELTA_HEADER.pack(tick, baseline_tick, len(changed), len(removed))]
+    for player_id, mask, position, color in changed:
+        parts.append(DELTA_ENTITY.pack(player_id, mask))
+        if mask & FIELD_X:
+            parts.append(DELTA_COORD.pack(position[0]))
+        if mask & FIELD_Y:
+            parts.append(DELTA_COORD.pack(position[1]))
+        if mask & FIELD_COLOR:
+            parts.append(DELTA_COLOR.pack(*color))
+    for player_id in removed:
+        parts.append(DELTA_REMOVED.pack(player_id))
+    return shared_frame(MSG_DELTA, b"".join(parts))
+
+
+def encode_delta(tick, baseline_tick, changed, removed, ack_seq=0):
+    """
+    Encode the changes between a baseline snapshot and the current one
+    Args:
+        tick (int): Server tick of the new snapshot
+        baseline_tick (int): Tick of the snapshot the changes are relative to
+        changed (list): List of (player_id, mask, (x, y), (r, g, b)), only the fields in mask are written
+        removed (list): Player ids that are in the baseline but not anymore
+        ack_seq (int, optional): Last input sequence the server processed for the receiver
+    Returns: bytes
+    """
+
+    return encode_delta_shared(tick, baseline_tick, changed, removed) + encode_trailer(ack_seq)
+
+
+def encode_ping(timestamp):
+    return frame(MSG_PING, PING.pack(timestamp))
+
+
+def encode_pong(timestamp):
+    return frame(MSG_PONG, PING.pack(timestamp))
+
+
+def encode_attack(view_tick, direction):
+    # view_tick can be fractional, it goes as a whole tick and 1/256 parts
+    whole = int(view_tick)
+    return frame(MSG_ATTACK, ATTACK.pack(whole, int((view_tick - whole) * 256), direction))
+
+
+def encode_hit(attacker_id, target_id):
+    return frame(MSG_HIT, HIT.pack(attacker_id, target_id))
+
+
+def encode_peer_inputs(player_id, ack, first_frame, keys):
+    """
+    Args:
+        player_id (int): Sender, the server overwrites it with the real one when relaying
+        ack (int): Frames of the receiver's inputs the sender has, the receiver resends from there
+        first_frame (int): Frame of keys[0]
+        keys (bytes): Keys bitmask of consecutive frames, at most 255
+    """
+
+    return frame(MSG_PEER_INPUT, PEER_INPUT.pack(player_id, ack, first_frame, len(keys)) + bytes(keys))
+
+
+def encode_join_info(content_hash, size):
+    return frame(MSG_JOIN_INFO, JOIN_INFO.pack(content_hash, size))
+
+
+def encode_join_request(content_hash, cached):
+    return frame(MSG_JOIN_REQUEST, JOIN_REQUEST.pack(content_hash, cached))
+
+
+def encode_join_chunk(offset, data):
+    return frame(MSG_JOIN_CHUNK, JOIN_CHUNK.pack(offset) + data)
+
+
+def encode_join_done():
+    # empty: rooms do not simulate bombs, the map is all a joining player needs
+    return frame(MSG_JOIN_DONE, b"")
+
+
+def encode_join_ready():
+    return frame(MSG_JOIN_READY, b"")
+
+
+def decode_welcome(payload):
+    if not payload:
+        raise ProtocolError("Empty welcome")
+    version = payload[0]  # checked first, a welcome of another version may have another size
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Protocol version mismatch: server {version}, client {PROTOCOL_VERSION}")
+    _, player_id, x, y, r, g, b, tick_rate = WELCOME.unpack(payload)
+    return {"id": player_id, "position": (x, y), "color": (r, g, b), "tick_rate": tick_rate}
+
+
+def decode_position(payload):
+    return POSITION.unpack(payload)
+
+
+def decode_input(payload):
+    seq, keys, ack_tick = INPUT.unpack(payload)
+    return {"seq": seq, "keys": keys, "ack_tick": ack_tick}
+
+
+def decode_ping(payload):
+    return PING.unpack(payload)[0]
+
+
+def decode_attack(payload):
+    view_tick, fraction, direction = ATTACK.unpack(payload)
+    return {"view_tick": view_tick + fraction / 256, "direction": direction}
+
+
+def decode_hit(payload):
+    attacker_id, target_id = HIT.unpack(payload)
+    return {"attacker": attacker_id, "target": target_id}
+
+
+def decode_peer_inputs(payload):
+    player_id, ack, first_frame, count = PEER_INPUT.unpack_from(payload, 0)
+    keys = payload[PEER_INPUT.size:]
+    if len(keys) != count:
+        raise ProtocolError(f"Bad peer input size: {len(keys)} keys, expected {count}")
+    return {"id": player_id, "ack": ack, "frame": first_frame, "keys": bytes(keys)}
+
+
+def decode_join_info(payload):
+    content_hash, size = JOIN_INFO.unpack(payload)
+    return {"hash": content_hash, "size": size}
+
+
+def decode_join_request(payload):
+    content_hash, cached = JOIN_REQUEST.unpack(payload)
+    return {"hash": content_hash, "cached": cached}
+
+
+def decode_join_chunk(payload):
+    (offset,) = JOIN_CHUNK.unpack_from(payload, 0)
+    return {"offset": offset, "data": bytes(payload[JOIN_CHUNK.size:])}
+
+
+def decode_join_done(payload):
+    if payload:
+        raise ProtocolError(f"Bad join done size: {len(payload)} bytes")
+    return {}
+
+
+def decode_join_ready(payload):
+    if payload:
+        raise ProtocolError(f"Bad join ready size: {len(payload)} bytes")
+    return {}
+
+
+def decode_snapshot(payload):
+    tick, count = SNAPSHOT_HEADER.unpack_from(payload, 0)
+    expected = SNAPSHOT_HEADER.size + count * SNAPSHOT_ENTITY.size + SNAPSHOT_TRAILER.size
+    if len(payload) != expected:
+        raise ProtocolError(f"Bad snapshot size: {len(payload)} bytes, expected {expected}")
+    end = len(payload) - SNAPSHOT_TRAILER.size
+    entities = [{"id": player_id, "position": (x, y), "color": (r, g, b)}
+                for player_id, x, y, r, g, b in SNAPSHOT_ENTITY.iter_unpack(payload[SNAPSHOT_HEADER.size:end])]
+    (ack_seq,) = SNAPSHOT_TRAILER.unpack_from(payload, end)
+    return {"tick": tick, "entities": entities, "ack": ack_seq}
+
+
+def decode_delta(payload):
+    """
+    Returns: dict with tick, baseline, removed ids, ack and changed,
+        a list of {"id", "mask", "position", "color"} where only the fields in mask are meaningful
+    """
+
+    tick, baseline_tick, changed_count, removed_count = DELTA_HEADER.unpack_from(payload, 0)
+    offset = DELTA_HEADER.size
+    changed = []
+    for _ in range(changed_count):
+        player_id, mask = DELTA_ENTITY.unpack_from(payload, offset)
+        offset += DELTA_ENTITY.size
+        x = y = None
+        color = None
+        if mask & FIELD_X:
+            (x,) = DELTA_COORD.unpack_from(payload, offset)
+            offset += DELTA_COORD.size
+        if mask & FIELD_Y:
+            (y,) = DELTA_COORD.unpack_from(payload, offset)
+            offset += DELTA_COORD.size
+        if mask & FIELD_COLOR:
+            color = DELTA_COLOR.unpack_from(payload, offset)
+            offset += DELTA_COLOR.size
+        changed.append({"id": player_id, "mask": mask, "position": (x, y), "color": color})
+    removed = [DELTA_REMOVED.unpack_from(payload, offset + i * DELTA_REMOVED.size)[0] for i in range(removed_count)]
+    offset += removed_count * DELTA_REMOVED.size
+    if len(payload) != offset + SNAPSHOT_TRAILER.size:
+        raise ProtocolError(f"Bad delta size: {len(payload)} bytes, expected {offset + SNAPSHOT_TRAILER.size}")
+    (ack_seq,) = SNAPSHOT_TRAILER.unpack_from(payload, offset)
+    return {"tick": tick, "baseline": baseline_tick, "changed": changed, "removed": removed, "ack": ack_seq}
+
+
+DECODERS = {
+    MSG_WELCOME: decode_welcome,
+    MSG_POSITION: decode_position,
+    MSG_INPUT: decode_input,
+    MSG_SNAPSHOT: decode_snapshot,
+    MSG_DELTA: decode_delta,
+    MSG_PING: decode_ping,
+    MSG_PONG: decode_ping,
+    MSG_ATTACK: decode_attack,
+    MSG_HIT: decode_hit,
+    MSG_PEER_INPUT: decode_peer_inputs,
+    MSG_JOIN_INFO: decode_join_info,
+    MSG_JOIN_REQUEST: decode_join_request,
+    MSG_JOIN_CHUNK: decode_join_chunk,
+    MSG_JOIN_DONE: decode_join_done,
+    MSG_JOIN_READY: decode_join_ready,
+}
+
+
+def decode(msg_type, payload):
+    """
+    Decode the payload of one frame
+    Args:
+        msg_type (int): Message type from the frame header
+        payload (bytes): Frame payload
+    Returns: decoded message (dict or tuple depending on the type)
+    """
+
+    decoder = DECODERS.get(msg_type)
+    if decoder is None:
+        raise ProtocolError(f"Unknown message type: {msg_type}")
+    try:
+        return decoder(payload)
+    except struct.error as e:
+        raise ProtocolError(f"Malformed message type {msg_type}: {e}")
+
+
+def split_frames(data):
+    """
+    Split a buffer that holds only whole frames (one UDP datagram, one reliable message)
+    Args:
+        data (bytes): Frames back to back
+    Returns: list of (msg_type, payload) tuples
+    """
+
+    frames = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < HEADER.size:
+            raise ProtocolError("Truncated frame header")
+        length, msg_type = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length
+        if end > len(data):
+            raise ProtocolError("Truncated frame")
+        frames.append((msg_type, bytes(data[offset + HEADER.size:end])))
+        offset = end
+    return frames
+
+
+class FrameDecoder:
+    """
+    Streaming frame decoder
+    Feed it whatever recv() returned and it gives back every complete frame.
+    Partial frames stay in the buffer until the rest arrives.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Args:
+            data (bytes): Bytes received from the socket
+        Returns: list of (msg_type, payload) tuples for every complete frame
+        """
+
+        self.buffer += data
+        frames = []
+        offset = 0
+        end_of_data = len(self.buffer)
+        while end_of_data - offset >= HEADER.size:
+            length, msg_type = HEADER.unpack_from(self.buffer, offset)
+            end = offset + HEADER.size + length
+            if end > end_of_data:
+                break  # wait for the rest of this frame
+            frames.append((msg_type, bytes(self.buffer[offset + HEADER.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
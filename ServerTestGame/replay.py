@@ -0,0 +1,241 @@
+"""
+Feed a capture log (see capture.py) back into a game server
+
+Record one with GameServer(..., capture="traffic.cap"), then run from the ServerTestGame folder:
+    python replay.py traffic.cap                         # TCP, real time, server on localhost:5555
+    python replay.py traffic.cap --speed 0 --spawn       # as fast as possible into a server started here
+    python replay.py traffic.cap --direct --profile      # in process, no sockets, profile the server code
+
+Socket replay opens one TCP connection per captured connection and sends every message at its
+recorded time (divided by --speed, 0 means no waiting). It reads the snapshots the server sends
+back and rewrites the ack in each input to the newest one received, so delta compression behaves
+like it did for the real clients.
+Direct replay calls GameServer.handle_message and run_tick itself, ticking by the recorded time,
+so it measures only the server code.
+"""
+
+import argparse
+import asyncio
+import cProfile
+import multiprocessing
+import pstats
+import time
+import protocol
+from capture import read_capture, EVENT_CONNECT, EVENT_MESSAGE, EVENT_DISCONNECT
+from snapshots import SnapshotHistory, SnapshotReceiver
+
+
+def rewrite_ack(msg_type, payload, tick):
+    # inputs acknowledge snapshot ticks of the recorded session, point them at ticks of this one
+    if msg_type != protocol.MSG_INPUT or len(payload) != protocol.INPUT.size:
+        return payload  # a malformed input is replayed as it was recorded
+    seq, keys, _ = protocol.INPUT.unpack(payload)
+    return protocol.INPUT.pack(seq, keys, tick)
+
+
+class ReplayConnection:
+    """TCP connection that plays back one captured client"""
+
+    def __init__(self, connection_id):
+        self.id = connection_id
+        self.receiver = SnapshotReceiver()
+        self.writer = None
+        self.reader_task = None
+        self.sent = 0
+
+    async def open(self, host, port):
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.reader_task = asyncio.create_task(self.read_loop(reader))
+
+    async def read_loop(self, reader):
+        decoder = protocol.FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                for msg_type, payload in decoder.feed(data):
+                    if msg_type == protocol.MSG_SNAPSHOT or msg_type == protocol.MSG_DELTA:
+                        self.receiver.apply(msg_type, payload)
+        except (ConnectionError, OSError, protocol.ProtocolError):
+            pass
+
+    def send(self, msg_type, payload):
+        self.writer.write(protocol.frame(msg_type, rewrite_ack(msg_type, payload, self.receiver.last_tick)))
+        self.sent += 1
+
+    async def close(self):
+        self.writer.close()
+        self.reader_task.cancel()
+
+
+async def replay_sockets(records, host, port, speed):
+    """
+    Returns: tuple (messages sent, seconds)
+    """
+
+    connections = {}
+    sent = 0
+    start = time.perf_counter()
+    try:
+        for timestamp, connection_id, event, msg_type, payload in records:
+            if speed:
+                delay = start + timestamp / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if event == EVENT_CONNECT:
+                connection = ReplayConnection(connection_id)
+                await connection.open(host, port)
+                connections[connection_id] = connection
+            elif event == EVENT_MESSAGE and connection_id in connections:
+                connections[connection_id].send(msg_type, payload)
+                sent += 1
+                if not speed and sent % 256 == 0:
+                    await asyncio.sleep(0)  # let the readers drain the snapshots
+            elif event == EVENT_DISCONNECT and connection_id in connections:
+                await connections.pop(connection_id).close()
+        elapsed = time.perf_counter() - start
+    finally:
+        for connection in connections.values():
+            await connection.close()
+    return sent, elapsed
+
+
+class DirectConnection:
+    """Stand-in for a connection in direct replay, acknowledges every snapshot right away"""
+
+    def __init__(self, player):
+        self.player = player
+        self.history = SnapshotHistory()
+        self.visible = set()
+        self.room = None
+        self.connection_id = 0
+        self.sent_bytes = 0
+        self.dropped = 0  # never behind, nothing is coalesced
+        self.kick_reason = None
+        self.kick_cause = None
+
+    def send(self, data, reliable=False):
+        self.sent_bytes += len(data)
+
+    def send_snapshot(self, parts):
+        self.send(b"".join(parts))
+
+    def queue_depth(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def replay_direct(records, server_options):
+    """
+    Returns: dict with message and tick counts and the time spent in each
+    """
+
+    from server import GameServer
+    game = GameServer(None, 0, listen=False, stats_interval=None, **server_options)
+    interval = 1 / game.tick_rate
+    connections = {}
+    result = {"messages": 0, "message_time": 0.0, "ticks": 0, "tick_time": 0.0}
+    next_tick = interval
+    perf_counter = time.perf_counter
+
+    def run_tick():
+        start = perf_counter()
+        game.run_tick()
+        result["tick_time"] += perf_counter() - start
+        result["ticks"] += 1
+        for connection in connections.values():
+            if connection.history.order:
+                connection.history.ack(connection.history.order[-1])
+
+    for timestamp, connection_id, event, msg_type, payload in records:
+        while timestamp >= next_tick:
+            run_tick()
+            next_tick += interval
+        if event == EVENT_CONNECT:
+            room, player = game.join()
+            if player is None:
+                continue
+            connection = DirectConnection(player)
+            game.add_client(connection, room)
+            connections[connection_id] = connection
+        elif event == EVENT_MESSAGE and connection_id in connections:
+            connection = connections[connection_id]
+            tick = connection.history.order[-1] if connection.history.order else 0
+            payload = rewrite_ack(msg_type, payload, tick)
+            start = perf_counter()
+            game.handle_message(connection, msg_type, payload)
+            result["message_time"] += perf_counter() - start
+            result["messages"] += 1
+        elif event == EVENT_DISCONNECT and connection_id in connections:
+            game.remove_client(connections.pop(connection_id))
+    return result
+
+
+def spawned_server(port, ready):
+    # child process for --spawn, quiet so the replay output stays readable
+    import os
+    import sys
+    from server import GameServer
+    sys.stdout = open(os.devnull, "w")
+
+    async def main():
+        game = GameServer("127.0.0.1", port, stats_interval=None)
+        await game.start()
+        ready.send(game.port)
+        await game.tick_task
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured session into a game server")
+    parser.add_argument("capture", help="capture file written by GameServer(capture=...)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--speed", type=float, default=1, help="1 = real time, 2 = twice as fast, 0 = no waiting")
+    parser.add_argument("--spawn", action="store_true", help="start a server in a child process")
+    parser.add_argument("--direct", action="store_true", help="call the server code in process, no sockets")
+    parser.add_argument("--profile", action="store_true", help="with --direct, print the top functions")
+    args = parser.parse_args()
+
+    records = list(read_capture(args.capture))
+    connections = len({record[1] for record in records})
+    duration = records[-1][0] if records else 0
+    print(f"{len(records)} records, {connections} connections, {duration:.1f}s captured")
+
+    if args.direct:
+        profiler = cProfile.Profile() if args.profile else None
+        if profiler:
+            profiler.enable()
+        start = time.perf_counter()
+        result = replay_direct(records, {})
+        elapsed = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+        messages, ticks = result["messages"], result["ticks"]
+        print(f"replayed in {elapsed:.2f}s ({duration / elapsed if elapsed else 0:.0f}x real time)")
+        print(f"handle_message: {messages} calls, {result['message_time'] / max(1, messages) * 1e6:.2f} us avg")
+        print(f"run_tick: {ticks} ticks, {result['tick_time'] / max(1, ticks) * 1000:.3f} ms avg")
+        if profiler:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+        return
+
+    process = None
+    if args.spawn:
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=spawned_server, args=(0, child), daemon=True)
+        process.start()
+        args.port = parent.recv()
+    try:
+        sent, elapsed = asyncio.run(replay_sockets(records, args.host, args.port, args.speed))
+        print(f"sent {sent} messages in {elapsed:.2f}s ({sent / elapsed if elapsed else 0:.0f} messages/s)")
+    finally:
+        if process is not None:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
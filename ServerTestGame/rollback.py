@@ -0,0 +1,332 @@
+import random
+import time
+import zlib
+import protocol
+from settings import ROLLBACK_FRAMES
+
+# Rollback netcode for two-player matches
+#
+# Both peers run the same deterministic simulation of the whole match. Every frame a peer
+# simulates with its own input and a prediction of the other peer's input (the last one it
+# received). When the real input of an earlier frame arrives and differs from the prediction,
+# the peer loads the state it saved at that frame and simulates the frames since then again.
+#
+# Saving must be cheap because it happens every frame: MatchState is never changed in place,
+# step() builds a new one (players and bombs are tuples, walls are bytes and only copied when
+# a wall breaks), so saving a frame is keeping a reference and restoring it is taking it back.
+# Nothing here touches pygame, re-simulating only computes.
+#
+# Everything is integer math and iteration in a fixed order, so the same inputs give the
+# same state on both machines.
+
+TILE_SIZE = 32  # Pixels per map tile
+MAP_TILES = 19  # Tiles along one side, odd so the maze fits (see Map/main.py)
+PLAYER_SIZE = 24  # Pixels, a player fits in a corridor
+PLAYER_SPEED = 2  # Pixels per frame
+BOMB_FRAMES = 240  # 4 seconds at 60 frames per second, like Bombs/main.py
+BOMB_RADIUS = 2  # Tiles the blast reaches in each direction
+FLAME_FRAMES = 30  # Frames the blast stays and kills players walking into it
+MAX_BOMBS = 1  # Bombs a player can have on the map at once
+
+# walls
+EMPTY = 0
+SOLID = 1  # border and pillars, never break
+WALL = 2  # breaks in a blast
+
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class MatchState:
+    """
+    State of a match at one frame, never changed once built
+
+    Attributes:
+        frame (int): Frame this is the state at (before the inputs of that frame)
+        players (tuple): (x, y, alive) per player, in player order
+        bombs (tuple): (tile index, frames left, owner) per bomb, oldest first
+        flames (tuple): (tile index, frames left) per burning tile
+        walls (bytes): EMPTY, SOLID or WALL per tile, row by row
+        tiles (int): Tiles along one side
+    """
+
+    __slots__ = ("frame", "players", "bombs", "flames", "walls", "tiles")
+
+    def __init__(self, frame, players, bombs, flames, walls, tiles=MAP_TILES):
+        self.frame = frame
+        self.players = players
+        self.bombs = bombs
+        self.flames = flames
+        self.walls = walls
+        self.tiles = tiles
+
+    def checksum(self):
+        """Same on both peers for the same frame, compare them to find a desync"""
+
+        # not hash(): bytes hash differently in every process
+        return zlib.crc32(repr((self.frame, self.players, self.bombs, self.flames)).encode(), zlib.crc32(self.walls))
+
+
+def generate_walls(tiles=MAP_TILES, seed=0):
+    """
+    Maze of breakable walls between solid pillars
+    Same maze as Map.generate_maze (recursive backtracking over odd cells), without pygame
+    and without recursion, so both peers build it from the same seed.
+    Returns: bytes, one wall value per tile
+    """
+
+    rng = random.Random(seed)
+    walls = bytearray([WALL]) * (tiles * tiles)
+    for i in range(tiles):
+        for j in range(tiles):
+            if i in (0, tiles - 1) or j in (0, tiles - 1) or (i % 2 == 0 and j % 2 == 0):
+                walls[i * tiles + j] = SOLID
+    visited = {(1, 1)}
+    walls[tiles + 1] = EMPTY
+    stack = [(1, 1)]
+    while stack:
+        x, y = stack[-1]
+        options = [(dx, dy) for dx, dy in DIRECTIONS
+                   if 0 < x + dx * 2 < tiles - 1 and 0 < y + dy * 2 < tiles - 1 and (x + dx * 2, y + dy * 2) not in visited]
+        if not options:
+            stack.pop()
+            continue
+        dx, dy = rng.choice(options)
+        walls[(y + dy) * tiles + x + dx] = EMPTY
+        walls[(y + dy * 2) * tiles + x + dx * 2] = EMPTY
+        visited.add((x + dx * 2, y + dy * 2))
+        stack.append((x + dx * 2, y + dy * 2))
+    # room to place a first bomb and step away in both corners
+    last = tiles - 2
+    for x, y in ((1, 1), (2, 1), (1, 2), (last, last), (last - 1, last), (last, last - 1)):
+        walls[y * tiles + x] = EMPTY
+    return bytes(walls)
+
+
+def initial_state(tiles=MAP_TILES, seed=0, walls=None):
+    """
+    Frame 0 of a match: player 0 in the top left corner, player 1 in the bottom right one
+    Args:
+        tiles (int, optional): Tiles along one side. Defaults to MAP_TILES.
+        seed (int, optional): Maze seed, when walls is not given. Defaults to 0.
+        walls (bytes, optional): Map to play on, e.g. the room map from the late join. Defaults to None.
+    """
+
+    offset = (TILE_SIZE - PLAYER_SIZE) // 2
+    first = TILE_SIZE + offset
+    last = (tiles - 2) * TILE_SIZE + offset
+    if walls is None:
+        walls = generate_walls(tiles, seed)
+    return MatchState(0, ((first, first, True), (last, last, True)), (), (), bytes(walls), tiles)
+
+
+def blocked(walls, tiles, x, y):
+    """True if a player at (x, y) would overlap a wall"""
+
+    left, right = x // TILE_SIZE, (x + PLAYER_SIZE - 1) // TILE_SIZE
+    top, bottom = y // TILE_SIZE, (y + PLAYER_SIZE - 1) // TILE_SIZE
+    for row in range(top, bottom + 1):
+        for column in range(left, right + 1):
+            if walls[row * tiles + column] != EMPTY:
+                return True
+    return False
+
+
+def center_tile(x, y, tiles):
+    half = PLAYER_SIZE // 2
+    return ((y + half) // TILE_SIZE) * tiles + (x + half) // TILE_SIZE
+
+
+def step(state, inputs):
+    """
+    Simulate one frame
+    Args:
+        state (MatchState): State before the frame
+        inputs (sequence): Keys bitmask (protocol.KEY_*) of every player for this frame
+    Returns: MatchState of the next frame
+    """
+
+    tiles = state.tiles
+    walls = state.walls
+    players = []
+    bombs = list(state.bombs)
+
+    for index, (x, y, alive) in enumerate(state.players):
+        if alive:
+            keys = inputs[index]
+            dx = (PLAYER_SPEED if keys & protocol.KEY_RIGHT else 0) - (PLAYER_SPEED if keys & protocol.KEY_LEFT else 0)
+            dy = (PLAYER_SPEED if keys & protocol.KEY_DOWN else 0) - (PLAYER_SPEED if keys & protocol.KEY_UP else 0)
+            if dx and not blocked(walls, tiles, x + dx, y):
+                x += dx
+            if dy and not blocked(walls, tiles, x, y + dy):
+                y += dy
+            if keys & protocol.KEY_BOMB:
+                tile = center_tile(x, y, tiles)
+                owned = sum(1 for bomb in bombs if bomb[2] == index)
+                if owned < MAX_BOMBS and all(bomb[0] != tile for bomb in bombs):
+                    bombs.append((tile, BOMB_FRAMES, index))
+        players.append((x, y, alive))
+
+    # count bombs down, a blast sets off the bombs it reaches in the same frame
+    flames = [(tile, left - 1) for tile, left in state.flames if left > 1]
+    bombs = [(tile, left - 1, owner) for tile, left, owner in bombs]
+    exploding = [bomb[0] for bomb in bombs if bomb[1] <= 0]
+    if exploding:
+        new_walls = None
+        burning = set()
+        while exploding:
+            origin = exploding.pop()
+            bombs = [bomb for bomb in bombs if bomb[0] != origin]
+            burning.add(origin)
+            for dx, dy in DIRECTIONS:
+                tile = origin
+                for _ in range(BOMB_RADIUS):
+                    tile += dy * tiles + dx
+                    wall = walls[tile] if new_walls is None else new_walls[tile]
+                    if wall == SOLID:
+                        break
+                    burning.add(tile)
+                    if wall == WALL:
+                        if new_walls is None:
+                            new_walls = bytearray(walls)
+                        new_walls[tile] = EMPTY
+                        break
+                    if any(bomb[0] == tile for bomb in bombs) and tile not in exploding:
+                        exploding.append(tile)
+        if new_walls is not None:
+            walls = bytes(new_walls)
+        flames = [flame for flame in flames if flame[0] not in burning]
+        flames.extend((tile, FLAME_FRAMES) for tile in sorted(burning))
+
+    if flames:
+        burning = {tile for tile, _ in flames}
+        players = [(x, y, alive and center_tile(x, y, tiles) not in burning) for x, y, alive in players]
+
+    return MatchState(state.frame + 1, tuple(players), tuple(bombs), tuple(flames), walls, tiles)
+
+
+class RollbackSession:
+    """
+    One peer of a two-player rollback match
+
+    Call advance() once per rendered frame with the local keys, feed the other peer's
+    inputs to add_remote_inputs() when they arrive and send it outgoing_inputs().
+    state is always the newest (partly predicted) state, draw that.
+
+    Args:
+        local (int): Player index of this peer, 0 or 1
+        state (MatchState): State at frame 0, the same on both peers
+        max_rollback (int, optional): Frames this peer may be ahead of the last input received
+            from the other one. It waits (advance returns False) instead of going further, so a
+            rollback never re-simulates more than this many frames. Defaults to ROLLBACK_FRAMES.
+    """
+
+    def __init__(self, local, state, max_rollback=ROLLBACK_FRAMES):
+        self.local = local
+        self.remote = 1 - local
+        self.state = state
+        self.max_rollback = max_rollback
+        self.saved = [None] * (max_rollback + 1)  # state at each of the last frames, by frame % size
+        self.saved[state.frame % len(self.saved)] = state
+        # keys used for every frame simulated: local ones, and remote ones confirmed or predicted
+        self.inputs = (bytearray(), bytearray())
+        self.confirmed = 0  # remote frames received, every frame below it is exact
+        self.remote_ack = 0  # local frames the other peer has, outgoing_inputs starts there
+        self.rollback_from = None  # earliest frame that was simulated with a wrong prediction
+        self.stats = {"frames": 0, "stalls": 0, "rollbacks": 0, "resimulated": 0,
+                      "rollback_max_ms": 0.0, "rollback_time": 0.0}
+
+    @property
+    def frame(self):
+        return self.state.frame
+
+    def predicted(self):
+        # the other peer most likely still holds the keys it held last
+        remote = self.inputs[self.remote]
+        return remote[self.confirmed - 1] if self.confirmed else 0
+
+    def add_remote_inputs(self, first_frame, keys, ack=None):
+        """
+        Inputs of the other peer for consecutive frames, repeats are ignored
+        Args:
+            first_frame (int): Frame of keys[0]
+            keys (bytes): Keys bitmask per frame
+            ack (int, optional): Local frames the other peer has received. Defaults to None.
+        Returns: False if the inputs start after a frame still missing (lost or reordered)
+        """
+
+        if ack is not None:
+            self.remote_ack = max(self.remote_ack, ack)
+        if first_frame > self.confirmed:
+            return False
+        remote = self.inputs[self.remote]
+        for frame in range(self.confirmed, first_frame + len(keys)):
+            actual = keys[frame - first_frame]
+            if frame < len(remote):
+                if remote[frame] != actual:
+                    remote[frame] = actual
+                    if frame < self.frame and (self.rollback_from is None or frame < self.rollback_from):
+                        self.rollback_from = frame
+            else:
+                remote.append(actual)
+            self.confirmed = frame + 1
+        return True
+
+    def outgoing_inputs(self, limit=255):
+        """
+        Returns: tuple (first frame, keys) of the local inputs the other peer has not acknowledged
+        """
+
+        local = self.inputs[self.local]
+        first = max(self.remote_ack, len(local) - limit)
+        return first, bytes(local[first:])
+
+    def advance(self, keys):
+        """
+        Correct any misprediction, then simulate the next frame
+        Args:
+            keys (int): Local keys bitmask for the next frame
+        Returns: False if this peer is too far ahead and waits for the other one this frame
+        """
+
+        if self.rollback_from is not None:
+            self.rollback()
+        if self.frame - self.confirmed >= self.max_rollback:
+            self.stats["stalls"] += 1
+            return False
+        self.inputs[self.local].append(keys)
+        self.simulate()
+        self.stats["frames"] += 1
+        return True
+
+    def simulate(self):
+        # one frame from self.state, with the remote keys predicted when not received yet
+        frame = self.frame
+        remote = self.inputs[self.remote]
+        if frame >= len(remote):
+            remote.append(self.predicted())
+        elif frame >= self.confirmed:
+            remote[frame] = self.predicted()
+        inputs = [0, 0]
+        inputs[self.local] = self.inputs[self.local][frame]
+        inputs[self.remote] = remote[frame]
+        self.state = step(self.state, inputs)
+        self.saved[self.state.frame % len(self.saved)] = self.state
+
+    def rollback(self):
+        """Go back to the first wrongly predicted frame and simulate up to the current one again"""
+
+        start = time.perf_counter()
+        target = self.frame
+        frame = self.rollback_from
+        self.rollback_from = None
+        saved = self.saved[frame % len(self.saved)]
+        if saved is None or saved.frame != frame:
+            raise RuntimeError(f"Frame {frame} is no longer saved, rollback is limited to {self.max_rollback} frames")
+        self.state = saved
+        while self.frame < target:
+            self.simulate()
+        duration = time.perf_counter() - start
+        self.stats["rollbacks"] += 1
+        self.stats["resimulated"] += target - frame
+        self.stats["rollback_time"] += duration
+        self.stats["rollback_max_ms"] = max(self.stats["rollback_max_ms"], duration * 1000)
@@ -0,0 +1,98 @@
+import pygame
+from networkClass import Network
+import protocol
+import rollback
+from settings import *
+
+# Two-player match with rollback netcode (see rollback.py)
+# The server only relays inputs between the two players of a room, start it with rooms of two:
+#     python dedicated_server.py --room-size 2
+# Arrows move, space drops a bomb.
+
+pygame.init() # Init pygame
+
+size = rollback.MAP_TILES * rollback.TILE_SIZE
+win = pygame.display.set_mode((size, size))
+pygame.display.set_caption("Rollback Match")
+
+# Clock
+clock = pygame.time.Clock()
+
+WALL_COLORS = {rollback.SOLID: (90, 90, 90), rollback.WALL: (160, 110, 60)}
+PLAYER_COLORS = (BLU, RED)
+
+
+def get_input():
+    keys = pygame.key.get_pressed()
+    pressed = 0
+    if keys[pygame.K_LEFT]:
+        pressed |= protocol.KEY_LEFT
+    if keys[pygame.K_RIGHT]:
+        pressed |= protocol.KEY_RIGHT
+    if keys[pygame.K_UP]:
+        pressed |= protocol.KEY_UP
+    if keys[pygame.K_DOWN]:
+        pressed |= protocol.KEY_DOWN
+    if keys[pygame.K_SPACE]:
+        pressed |= protocol.KEY_BOMB
+    return pressed
+
+
+def draw(win, state):
+    # Only the newest state is drawn, frames simulated again in a rollback never are
+    tile = rollback.TILE_SIZE
+    win.fill(BLK)
+    for index, wall in enumerate(state.walls):
+        if wall != rollback.EMPTY:
+            pygame.draw.rect(win, WALL_COLORS[wall], ((index % state.tiles) * tile, (index // state.tiles) * tile, tile, tile))
+    for index, _ in state.flames:
+        pygame.draw.rect(win, (255, 160, 0), ((index % state.tiles) * tile, (index // state.tiles) * tile, tile, tile))
+    for index, _, _ in state.bombs:
+        center = ((index % state.tiles) * tile + tile // 2, (index // state.tiles) * tile + tile // 2)
+        pygame.draw.circle(win, WHT, center, tile // 3)
+    for color, (x, y, alive) in zip(PLAYER_COLORS, state.players):
+        if alive:
+            pygame.draw.rect(win, color, (x, y, rollback.PLAYER_SIZE, rollback.PLAYER_SIZE))
+
+
+conn = Network("192.168.1.250", 5555, TRANSPORT) # Network instance
+conn.start() # From now on the network runs in a background thread
+
+session = None # Created once the other player shows up, lower player id is player 0
+
+# Game loop
+running = True
+while running:
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+
+    conn.new_snapshots() # Not used in rollback matches
+    world = conn.world # Map of the room, both players get the same one
+    for msg_type, event in conn.new_events():
+        if msg_type != protocol.MSG_PEER_INPUT or world is None:
+            continue
+        if session is None:
+            state = rollback.initial_state(world["tiles"], walls=world["layout"])
+            session = rollback.RollbackSession(0 if conn.id < event["id"] else 1, state)
+        session.add_remote_inputs(event["frame"], event["keys"], event["ack"])
+
+    if session is None:
+        if world is not None:
+            conn.send_peer_inputs(0, 0, b"") # Tell the other player we are here
+        win.fill(BLK)
+    else:
+        session.advance(get_input()) # Waits (returns False) when too far ahead of the other player
+        first, keys = session.outgoing_inputs()
+        conn.send_peer_inputs(session.confirmed, first, keys)
+        draw(win, session.state)
+
+    pygame.display.flip()
+
+    clock.tick(TICK_RATE) # Both peers simulate one frame per tick
+
+# Quit Pygame
+if session is not None:
+    print(f"Rollback stats: {session.stats}")
+conn.close()
+pygame.quit()
@@ -1,95 +1,929 @@
+import asyncio
+import heapq
+import os
 import socket
-import threading  
-import pickle  
+import time
+from collections import deque
+import protocol
+import simulation
+from snapshots import SnapshotHistory
+from stats import TickStats, BandwidthStats
+from history import PositionHistory
+from joinstate import World, JoinTransfer
+from metrics import ServerMetrics, serve_metrics
+import rollback
+import transport
+import aoi
+import plugins
+from capture import CaptureWriter, EVENT_CONNECT, EVENT_MESSAGE, EVENT_DISCONNECT
 from settings import *
-import subprocess
-import miniupnpc
 
 
 server_ip = "192.168.1.250"
 port = 5555
 
-# firewall rule to allow incoming connections on the specified port
-rule_name = "MyGameServer"
+colors = [WHT, BLU, RED, BLK] # Colors
+
+player_positions = [(100, 100), (W-100-RectW, 100)]  # Initial positions for players 1 and 2
+
+MAX_INPUTS_PER_TICK = 8  # Inputs applied per player per tick, the rest wait for the next tick
+
+KICK_LAG = "lag"  # ClientConnection.kick_cause: behind on snapshots for longer than max_lag
+KICK_QUEUE_FULL = "queue full"  # ClientConnection.kick_cause: more than queue_size messages waiting
+
+
+def starting_position(player_id):
+    """
+    Starting position for a player slot
+    Players 1 and 2 keep the old positions, the rest are spread on a grid
+    """
+
+    if player_id <= len(player_positions):
+        return player_positions[player_id - 1]
+    columns = max(1, (W - RectW) // (RectW * 2))
+    index = player_id - len(player_positions) - 1
+    return ((index % columns) * RectW * 2, 200 + ((index // columns) * RectH * 2) % (H - 200))
+
+
+class PlayerState:
+    """State of one connected player"""
+
+    def __init__(self, player_id, position, color):
+        self.id = player_id
+        self.x, self.y = position
+        self.color = color
+        self.inputs = deque()  # (seq, keys) received and not simulated yet
+        self.last_queued_seq = 0  # newest input sequence received, older copies are ignored
+        self.last_seq = 0  # last input sequence simulated, sent back in snapshots
+
+
+class GameState:
+    """
+    Shared game state
+    All players live here and it is only touched from the event loop thread,
+    so every client sees the same state without locks.
+    """
+
+    def __init__(self, max_players=None, bounds=WORLD_BOUNDS):
+        self.players = {}  # player_id -> PlayerState
+        self.max_players = max_players
+        self.bounds = bounds
+        self.grid = aoi.SpatialGrid(AOI_CELL_SIZE)  # players by position, for interest management
+        self.free_ids = []  # ids released by players that left, reused lowest first
+        self.next_id = 1
 
-subprocess.run(
-    f'netsh advfirewall firewall add rule '
-    f'name="{rule_name}" dir=in action=allow protocol=TCP localport={port}',
-    shell=True
-)
+    def join(self):
+        """
+        Take a free player slot
+        Returns: PlayerState, or None if the game is full
+        """
 
-# Set up UPnP port forwarding
-upnp = miniupnpc.UPnP()
-upnp.discover()
-upnp.selectigd()
+        if self.max_players is not None and len(self.players) >= self.max_players:
+            return None
+        if self.free_ids:
+            player_id = heapq.heappop(self.free_ids)
+        else:
+            player_id = self.next_id
+            self.next_id += 1
+        player = PlayerState(player_id, starting_position(player_id), colors[(player_id - 1) % len(colors)])
+        self.players[player_id] = player
+        self.grid.insert(player_id, player.x, player.y)
+        return player
 
-external_port = 5555
-internal_port = 5555
+    def leave(self, player_id):
+        if self.players.pop(player_id, None) is not None:
+            self.grid.remove(player_id)
+            heapq.heappush(self.free_ids, player_id)
 
-upnp.addportmapping(
-    external_port, 'TCP',
-    upnp.lanaddr, internal_port,
-    'MyGameServer', ''
-)
+    def update(self, speed):
+        """
+        Simulate one tick: apply the queued inputs of every player
+        """
 
+        for player in self.players.values():
+            if not player.inputs:
+                continue
+            for _ in range(min(len(player.inputs), MAX_INPUTS_PER_TICK)):
+                seq, keys = player.inputs.popleft()
+                player.x, player.y = simulation.move(player.x, player.y, keys, speed, self.bounds)
+                player.last_seq = seq
+            self.grid.move(player.id, player.x, player.y)
 
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def snapshot_state(self):
+        """
+        Returns: dict player id -> (x, y, color), a new dict every call
+        """
 
-try:
-    s.bind((server_ip, port))
-except socket.error as e:
-    print(str(e))
+        return {p.id: (p.x, p.y, p.color) for p in self.players.values()}
 
-s.listen(2)
-print("Server started and listening on port:", port)
 
-def handle_client(conn, addr, player_id): 
-    print(f"New connection from {addr} as Player {player_id}")
-    if player_id == 1:
-        starting_pos = player_positions[0]
-        color = colors[0]
-    else:
-        starting_pos = player_positions[1]
-        color = colors[1]
-    conn.send(pickle.dumps(player_id))  # Send player ID to client
+class ClientConnection:
+    """
+    One connected TCP client
+    Reading happens in GameServer.handle_client, writing in writer_loop,
+    so a slow socket never blocks the code that produces messages.
 
-    conn.send(pickle.dumps({"color": color,
-                            "position": starting_pos}))  # Send color and starting position to client
+    The outbox is bounded. Snapshots are not queued: only the newest one waits for the writer,
+    a newer snapshot replaces one that was not written yet (the client acks an older tick and the
+    next delta is built against that, so nothing is lost). A client that stays behind longer than
+    max_lag, or lets more than queue_size other messages pile up, is disconnected.
 
-    while True:
+    Args:
+        reader (asyncio.StreamReader): Stream of the connection
+        writer (asyncio.StreamWriter): Stream of the connection
+        player (PlayerState): The player of this client
+        queue_size (int, optional): Messages queued besides the snapshot. Defaults to SEND_QUEUE_SIZE.
+        max_lag (float, optional): Seconds behind before the client is dropped, None to never drop.
+            Defaults to MAX_SEND_LAG.
+        metrics (ServerMetrics, optional): Where the bytes written are counted. Defaults to its own.
+    """
+
+    def __init__(self, reader, writer, player, queue_size=SEND_QUEUE_SIZE, max_lag=MAX_SEND_LAG, metrics=None):
+        self.reader = reader
+        self.writer = writer
+        self.player = player
+        self.outbox = deque()  # messages in order, None ends the writer
+        self.pending_snapshot = None  # newest snapshot not written yet
+        self.ready = asyncio.Event()  # set when there is something to write
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self.behind_since = None  # time the first snapshot was coalesced since the writer caught up
+        self.dropped = 0  # snapshots replaced before they were written
+        self.kick_reason = None  # why the server disconnected the client, for the log
+        self.kick_cause = None  # KICK_LAG or KICK_QUEUE_FULL, counted apart by GameServer
+        self.history = SnapshotHistory()  # snapshots sent, for delta compression
+        self.visible = set()  # player ids this client received in the last snapshot
+        self.room = None  # Room the player is in, set by Room.add_client
+        self.connection_id = 0  # set by GameServer.add_client
+        self.metrics = metrics if metrics is not None else ServerMetrics()
+        # small transport buffer so a slow client starts coalescing early instead of buffering seconds of snapshots
+        writer.transport.set_write_buffer_limits(high=SEND_BUFFER)
+
+    def send(self, data, reliable=False):
+        # TCP is always reliable, the flag only matters for UDP clients
+        self.outbox.append(data)
+        self.ready.set()
+        if len(self.outbox) > self.queue_size:
+            self.kick(KICK_QUEUE_FULL, "send queue full")
+
+    def send_snapshot(self, parts):
+        # parts is (shared frame, trailer) from SnapshotHistory.encode_parts
+        if self.pending_snapshot is not None:
+            self.dropped += 1
+            now = time.monotonic()
+            if self.behind_since is None:
+                self.behind_since = now
+            elif self.max_lag is not None and now - self.behind_since > self.max_lag:
+                self.kick(KICK_LAG, f"more than {self.max_lag:g}s behind")
+        self.pending_snapshot = parts
+        self.ready.set()
+
+    def queue_depth(self):
+        return len(self.outbox) + (self.pending_snapshot is not None)
+
+    def buffered_bytes(self):
+        return self.writer.transport.get_write_buffer_size()
+
+    def kick(self, cause, reason):
+        if self.kick_reason is None:
+            self.kick_cause = cause
+            self.kick_reason = reason
+            print(f"Disconnecting Player {self.player.id}: {reason}")
+            # abort drops what is buffered, handle_client sees the connection end and cleans up
+            self.writer.transport.abort()
+
+    async def writer_loop(self):
         try:
-            data, _ = conn.recvfrom(1024)
-            if not data:
-                print(f"Player {player_id} disconnected")
-                break
-            data = pickle.loads(data)
-            # data is expected to be a tuple (x, y)
-            # and contains the player's current position
-            # we update the global variable layer_positions which contains the positions of both players
-            #  and send back the other player's position
-            player_positions[player_id - 1] = data  # Update player position
-            if player_id == 1:
-                other_player_pos = player_positions[1]
-                other_player_color = colors[1]
+            while True:
+                if self.outbox:
+                    data = self.outbox.popleft()  # in order, the welcome goes before any snapshot
+                    if data is None:
+                        break
+                    self.writer.write(data)
+                    self.metrics.bytes_out += len(data)
+                elif self.pending_snapshot is not None:
+                    # the shared frame and the trailer go out as they are, on Python 3.12+
+                    # asyncio hands them to sendmsg without joining them
+                    self.writer.writelines(self.pending_snapshot)
+                    self.metrics.bytes_out += len(self.pending_snapshot[0]) + len(self.pending_snapshot[1])
+                    self.pending_snapshot = None
+                else:
+                    self.behind_since = None  # caught up
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            pass
+
+    def close(self):
+        self.outbox.append(None)
+        self.ready.set()
+
+
+class UdpClientConnection:
+    """
+    One connected UDP client, same interface as ClientConnection
+    Snapshots go on the unreliable sequenced channel, anything sent with reliable=True
+    (welcome, game events) on the reliable ordered channel.
+    """
+
+    def __init__(self, peer, player, addr):
+        self.peer = peer
+        self.player = player
+        self.addr = addr
+        self.dropped = 0  # stays 0, the unreliable channel drops stale snapshots on the client side
+        self.kick_reason = None
+        self.kick_cause = None
+        self.history = SnapshotHistory()  # snapshots sent, for delta compression
+        self.visible = set()  # player ids this client received in the last snapshot
+        self.room = None  # Room the player is in, set by Room.add_client
+        self.connection_id = 0  # set by GameServer.add_client
+
+    def send(self, data, reliable=False):
+        try:
+            if reliable:
+                self.peer.send_reliable(data)
             else:
-                other_player_pos = player_positions[0]
-                other_player_color = colors[0]
+                self.peer.send_unreliable(data)
+        except OSError:
+            pass  # the timeout in update() removes dead clients
+
+    def send_snapshot(self, parts):
+        # the unreliable sequenced channel already drops stale snapshots
+        try:
+            self.peer.send_unreliable_parts(parts)
+        except OSError:
+            pass
 
-            conn.send(pickle.dumps({"color": other_player_color,
-                                    "position": other_player_pos}))  # Send other player's info
+    def queue_depth(self):
+        return len(self.peer.unacked)
 
-        except Exception as e:
-            print(f"Error with Player {player_id}: {e}")
-            break
+    def close(self):
+        self.peer.disconnect()
 
-    conn.close()
 
-current_player = 1
-colors = [WHT, BLU, RED, BLK] # Colors
+class UdpServerProtocol(asyncio.DatagramProtocol):
+    """
+    asyncio datagram endpoint of the server
+    Handles the handshake and routes datagrams to the UdpPeer of each address.
+    """
+
+    def __init__(self, game_server, timeout=5.0):
+        self.game_server = game_server
+        self.timeout = timeout
+        self.transport = None
+        self.sender = None  # socket used for sendmsg, None where the platform has no sendmsg
+        self.clients = {}  # addr -> UdpClientConnection
+        self.tokens = {}  # addr -> connection token, to answer repeated CONNECT packets
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if hasattr(socket.socket, "sendmsg"):
+            # a duplicate of the endpoint socket for sendmsg, the transport only sends whole bytes objects
+            sock = transport.get_extra_info("socket")
+            self.sender = socket.socket(fileno=os.dup(sock.fileno()))
+
+    def connection_lost(self, exc):
+        if self.sender is not None:
+            self.sender.close()
+
+    def send_packet(self, packet, addr):
+        self.game_server.metrics.bytes_out += len(packet)
+        self.transport.sendto(packet, addr)
+
+    def send_parts(self, parts, addr):
+        # scatter-gather: the shared snapshot frame is not copied into every client's datagram
+        self.game_server.metrics.bytes_out += sum(len(part) for part in parts)
+        if self.sender is not None:
+            try:
+                self.sender.sendmsg(parts, (), 0, addr)
+                return
+            except BlockingIOError:
+                pass  # socket buffer full, let the transport queue it
+        self.transport.sendto(b"".join(parts), addr)
+
+    def datagram_received(self, data, addr):
+        if not data:
+            return
+        metrics = self.game_server.metrics
+        metrics.bytes_in += len(data)
+        client = self.clients.get(addr)
+        if data[0] == transport.PKT_CONNECT:
+            self.handle_connect(data, addr, client)
+            return
+        if client is None:
+            return
+        start = time.perf_counter()
+        try:
+            for channel, frames in client.peer.datagram_received(data):
+                for msg_type, payload in protocol.split_frames(frames):
+                    self.game_server.handle_message(client, msg_type, payload)
+        except protocol.ProtocolError as e:
+            print(f"Error with Player {client.player.id}: {e}")
+            self.drop(addr)
+            return
+        finally:
+            metrics.decode_seconds += time.perf_counter() - start
+        if client.peer.closed:
+            print(f"Player {client.player.id} disconnected")
+            self.drop(addr)
+
+    def handle_connect(self, data, addr, client):
+        try:
+            _, token = transport.parse_handshake(data)
+        except protocol.ProtocolError as e:
+            print(f"Refused connection from {addr}: {e}")
+            return
+        if client is not None:
+            # our ACCEPT was lost, send it again
+            if self.tokens.get(addr) == token:
+                self.transport.sendto(transport.handshake_packet(transport.PKT_ACCEPT, token), addr)
+            return
+
+        room, player = self.game_server.join()
+        if player is None:
+            print(f"Refused connection from {addr}: server full")
+            return
+        print(f"New connection from {addr} as Player {player.id}")
+        peer = transport.UdpPeer(lambda packet: self.send_packet(packet, addr), timeout=self.timeout,
+                                 send_datagram_parts=lambda parts: self.send_parts(parts, addr))
+        client = UdpClientConnection(peer, player, addr)
+        self.clients[addr] = client
+        self.tokens[addr] = token
+        self.transport.sendto(transport.handshake_packet(transport.PKT_ACCEPT, token), addr)
+        self.game_server.add_client(client, room)
+
+    def drop(self, addr):
+        client = self.clients.pop(addr, None)
+        self.tokens.pop(addr, None)
+        if client is not None:
+            client.close()
+            self.game_server.remove_client(client)
+
+    def update(self):
+        # resends, keepalives and timeouts of every peer
+        now = time.monotonic()
+        for addr, client in list(self.clients.items()):
+            try:
+                alive = client.peer.update(now)
+            except OSError:
+                alive = False
+            if not alive:
+                print(f"Player {client.player.id} timed out")
+                self.drop(addr)
+
+
+class Room:
+    """
+    One match
+    Every room has its own players, tick counter and snapshot stats, players of
+    different rooms never see each other. Player ids are only unique inside a room.
+
+    Args:
+        room_id (int): Id of the room on this server
+        max_players (int, optional): Players that fit in the room. Defaults to no limit.
+        tick_rate (int, optional): Simulation ticks per second. Defaults to TICK_RATE from settings.
+        snapshot_rate (int, optional): Snapshots per second, rounded to a whole number of ticks.
+            Defaults to SNAPSHOT_RATE from settings.
+        view_size (tuple, optional): (width, height) each client sees around its player,
+            None sends every player to every client. Defaults to VIEW_SIZE from settings.
+        aoi_margin (int, optional): Extra pixels around the view. Defaults to AOI_MARGIN from settings.
+        metrics (ServerMetrics, optional): Where the snapshot encoding time is counted. Defaults to its own.
+        bounds (tuple, optional): Highest (x, y) a player can reach. Defaults to WORLD_BOUNDS from settings.
+    """
+
+    def __init__(self, room_id, max_players=None, tick_rate=TICK_RATE, snapshot_rate=SNAPSHOT_RATE,
+                 view_size=VIEW_SIZE, aoi_margin=AOI_MARGIN, metrics=None, bounds=WORLD_BOUNDS):
+        self.id = room_id
+        self.state = GameState(max_players, bounds)
+        self.clients = {}  # player_id -> ClientConnection or UdpClientConnection
+        self.tick = 0
+        self.tick_rate = tick_rate
+        self.tick_stats = TickStats(tick_rate)
+        self.snapshot_every = max(1, round(tick_rate / snapshot_rate))  # ticks between snapshots
+        self.bandwidth_stats = BandwidthStats(snapshot_rate)
+        self.world_size = (bounds[0] + RectW, bounds[1] + RectH)
+        if view_size is not None and aoi.covers_world(view_size, self.world_size):
+            view_size = None  # every client would see every player anyway
+        self.view_size = view_size
+        self.aoi_margin = aoi_margin
+        # positions of the last LAG_COMPENSATION seconds, to check attacks against what the attacker saw
+        self.history = PositionHistory(round(LAG_COMPENSATION * tick_rate) + 1, (max_players or 16) + 1)
+        # map of the room, streamed to players joining while the match runs
+        layout = rollback.generate_walls(rollback.MAP_TILES, seed=room_id % MAP_ROTATION)
+        self.world = World(layout, rollback.MAP_TILES)
+        self.joining = {}  # player_id -> JoinTransfer until the client is ready
+        self.metrics = metrics if metrics is not None else ServerMetrics()
+
+    def is_full(self):
+        return self.state.max_players is not None and len(self.state.players) >= self.state.max_players
+
+    def add_client(self, client):
+        client.room = self
+        self.clients[client.player.id] = client
+        # Send player ID, color and starting position to client in one frame
+        player = client.player
+        client.send(protocol.encode_welcome(player.id, (player.x, player.y), player.color, self.tick_rate), reliable=True)
+        self.joining[player.id] = JoinTransfer(client, self.world)
+        client.send(protocol.encode_join_info(self.world.map_hash, len(self.world.map_data)), reliable=True)
+
+    def remove_client(self, client):
+        self.state.leave(client.player.id)
+        self.clients.pop(client.player.id, None)
+        self.joining.pop(client.player.id, None)
+
+    def join_request(self, client, message):
+        transfer = self.joining.get(client.player.id)
+        if transfer is not None and transfer.offset is None:
+            transfer.request(message["hash"], message["cached"])
+
+    def join_ready(self, client):
+        """
+        Returns: the JoinTransfer of the client, None if it was not joining
+        """
+
+        transfer = self.joining.get(client.player.id)
+        if transfer is None or not transfer.done:
+            return None
+        return self.joining.pop(client.player.id)
+
+    def stream_joins(self):
+        # share the per tick budget between the joining players, the tick never sends more
+        budget = JOIN_BUDGET
+        for transfer in list(self.joining.values()):
+            if budget <= 0:
+                break
+            budget -= transfer.send_more(budget, JOIN_CHUNK_SIZE, JOIN_WINDOW)
+
+    def run_tick(self):
+        start = time.perf_counter()
+        self.tick += 1
+        self.state.update(MOVE_SPEED)
+        self.history.record(self.tick, self.state.players.values())
+        if self.joining:
+            self.stream_joins()
+        if self.tick % self.snapshot_every == 0:
+            encode_start = time.perf_counter()
+            state = self.state.snapshot_state()
+            # clients that see the same players get the same state object, those acknowledging the
+            # same baseline share one encoded frame and only the 4 byte trailer is per client
+            shared = {}
+            views = {}  # visible players -> state, one per distinct view this tick
+            sent = 0
+            for client in self.clients.values():
+                parts = client.history.encode_parts(self.tick, self.interest_state(client, state, views),
+                                                    client.player.last_seq, shared)
+                client.send_snapshot(parts)
+                sent += len(parts[0]) + len(parts[1])
+            self.bandwidth_stats.record(sent, len(self.clients))
+            self.metrics.encode_seconds += time.perf_counter() - encode_start
+        self.tick_stats.record(time.perf_counter() - start)
+
+    def attack(self, attacker, view_tick, direction):
+        """
+        Check a slash against where the other players were at the tick the attacker saw them
+        The attacker is where the server has it now, like its own prediction showed it.
+        Hits are sent to every client of the room.
+        Args:
+            attacker (PlayerState): Player that attacks
+            view_tick (float): Server tick the attacker's client was showing other players at, can fall
+                between two ticks
+            direction (int): Keys bitmask the attacker faces
+        Returns: list of player ids hit
+        """
+
+        # never rewind further than the history goes, a client can not claim a later or an older view
+        view_tick = min(max(view_tick, self.tick - self.history.frames + 1), self.tick)
+        box = simulation.attack_box(attacker.x, attacker.y, direction, (RectW, RectH), ATTACK_REACH)
+        others = [player for player in self.state.players.values() if player is not attacker]
+        with self.history.rewind(others, view_tick):
+            hits = [player.id for player in others if simulation.overlaps(box, player.x, player.y, (RectW, RectH))]
+        for target_id in hits:
+            data = protocol.encode_hit(attacker.id, target_id)
+            for client in self.clients.values():
+                client.send(data, reliable=True)
+        return hits
+
+    def relay_peer_inputs(self, sender, message):
+        """
+        Pass the inputs of a rollback match peer to the other players of the room
+        The sender id is the one of the connection, a peer can not speak for the other.
+        Unreliable: every message repeats the inputs the receiver has not confirmed yet.
+        """
+
+        data = protocol.encode_peer_inputs(sender.player.id, message["ack"], message["frame"], message["keys"])
+        for player_id, client in self.clients.items():
+            if player_id != sender.player.id:
+                client.send(data)
+
+    def interest_state(self, client, state, views=None):
+        """
+        Part of the snapshot state a client should receive
+        Players entering the area are sent in full by the delta encoder (not in the baseline),
+        players leaving it are sent as removed.
+        Args:
+            views (dict, optional): Filtered states of this tick by visible players, clients that see
+                the same players get the same state object. Defaults to a new state per client.
+        """
+
+        if self.view_size is None:
+            return state
+        player = client.player
+        center = aoi.camera_center((player.x + RectW / 2, player.y + RectH / 2), self.view_size, self.world_size)
+        client.visible = aoi.update_visible(self.state.grid, client.visible, center, self.view_size, self.aoi_margin)
+        client.visible.add(player.id)
+        key = frozenset(client.visible)
+        view = views.get(key) if views is not None else None
+        if view is None:
+            view = {player_id: state[player_id] for player_id in key if player_id in state}
+            if views is not None:
+                views[key] = view
+        return view
+
+
+class RoomManager:
+    """
+    Lobby: puts every new player in a room
+    The fullest room that still has a free slot is filled first, so matches start
+    with as many players as possible. A room is closed when its last player leaves.
+
+    Args:
+        room_size (int, optional): Players per room, None for one room without a limit.
+            Defaults to ROOM_SIZE from settings.
+        **room_options: Passed to every Room (tick_rate, snapshot_rate, view_size, aoi_margin)
+    """
+
+    def __init__(self, room_size=ROOM_SIZE, **room_options):
+        self.room_size = room_size
+        self.room_options = room_options
+        self.rooms = {}  # room_id -> Room
+        self.next_id = 1
+
+    def join(self):
+        """
+        Returns: tuple (Room, PlayerState)
+        """
+
+        open_rooms = [room for room in self.rooms.values() if not room.is_full()]
+        if open_rooms:
+            room = max(open_rooms, key=lambda r: len(r.state.players))
+        else:
+            room = Room(self.next_id, self.room_size, **self.room_options)
+            self.rooms[room.id] = room
+            self.next_id += 1
+        return room, room.state.join()
+
+    def leave(self, client):
+        room = client.room
+        if room is None:
+            return
+        room.remove_client(client)
+        if not room.state.players:
+            del self.rooms[room.id]
+
+    def player_count(self):
+        return sum(len(room.state.players) for room in self.rooms.values())
+
+    def free_slots(self):
+        """
+        Returns: players that still fit in the open rooms, None when rooms have no size limit
+        """
+
+        if self.room_size is None:
+            return None
+        return sum(self.room_size - len(room.state.players) for room in self.rooms.values())
+
+
+class GameServer:
+    """
+    asyncio game server
+    One event loop handles every connection, each client gets a reader and a writer coroutine.
+    The server is authoritative: clients only send inputs, the server simulates
+    every room at a fixed tick rate and pushes snapshots to every client at the snapshot rate.
+
+    Args:
+        host (str): Address to bind
+        port (int): Port to bind
+        max_players (int, optional): Refuse connections when this many players are in, over all rooms.
+            Defaults to no limit.
+        backlog (int, optional): Listen backlog. Defaults to 128.
+        tick_rate (int, optional): Simulation ticks per second. Defaults to TICK_RATE from settings.
+        snapshot_rate (int, optional): Snapshots per second, rounded to a whole number of ticks.
+            Defaults to SNAPSHOT_RATE from settings.
+        stats_interval (float, optional): Seconds between tick stats reports, None to disable. Defaults to 10.
+        transport (str, optional): "tcp" or "udp". Defaults to "tcp".
+        view_size (tuple, optional): (width, height) each client sees around its player,
+            None sends every player to every client. Defaults to VIEW_SIZE from settings.
+        aoi_margin (int, optional): Extra pixels around the view. Defaults to AOI_MARGIN from settings.
+        room_size (int, optional): Players per room, None puts everybody in one room. Defaults to ROOM_SIZE.
+        listen (bool, optional): Open the listening socket. cluster.py workers use False and get
+            their connections through adopt(). Defaults to True.
+        capture (str, optional): Append every message received from clients to this file,
+            see capture.py and replay.py. Defaults to no capture.
+        send_queue_size (int, optional): Messages queued for a TCP client before it is disconnected.
+            Defaults to SEND_QUEUE_SIZE from settings.
+        max_send_lag (float, optional): Seconds a TCP client may stay behind on snapshots before it is
+            disconnected, None to keep slow clients. Defaults to MAX_SEND_LAG from settings.
+        metrics_port (int, optional): Serve Prometheus metrics on http://metrics_host:metrics_port/metrics,
+            None for no endpoint. Defaults to None.
+        metrics_host (str, optional): Address of the metrics endpoint. Defaults to "127.0.0.1".
+    """
+
+    def __init__(self, host, port, max_players=None, backlog=128, tick_rate=TICK_RATE,
+                 snapshot_rate=SNAPSHOT_RATE, stats_interval=10, transport="tcp",
+                 view_size=VIEW_SIZE, aoi_margin=AOI_MARGIN, room_size=ROOM_SIZE, listen=True, capture=None,
+                 send_queue_size=SEND_QUEUE_SIZE, max_send_lag=MAX_SEND_LAG, metrics_port=None,
+                 metrics_host="127.0.0.1"):
+        if transport not in ("tcp", "udp"):
+            raise ValueError(f"Unknown transport: {transport}")
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.listen = listen
+        self.udp = None  # UdpServerProtocol when transport is "udp"
+        self.backlog = backlog
+        self.max_players = max_players
+        self.metrics = ServerMetrics()  # counters for the metrics endpoint, see metrics.py
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.metrics_server = None
+        self.rooms = RoomManager(room_size, tick_rate=tick_rate, snapshot_rate=snapshot_rate,
+                                 view_size=view_size, aoi_margin=aoi_margin, metrics=self.metrics)
+        self.clients = set()  # every connection, in any room
+        self.capture = CaptureWriter(capture) if capture else None
+        self.next_connection_id = 1  # connection ids in the capture
+        self.send_queue_size = send_queue_size
+        self.max_send_lag = max_send_lag
+        self.snapshots_dropped = 0  # coalesced snapshots of clients that already left
+        self.lag_disconnects = 0  # clients disconnected for staying behind on snapshots longer than max_send_lag
+        self.queue_full_disconnects = 0  # clients disconnected for letting more than send_queue_size messages pile up
+        self.join_times = deque(maxlen=100)  # seconds from connect to MSG_JOIN_READY of the last joins
+        self.joins = 0
+        self.joins_cached = 0  # joins that skipped the map download
+        self.join_bytes = 0  # late-join bytes sent, map chunks and done messages
+        self.server = None
+        self.tick = 0
+        self.tick_rate = tick_rate
+        self.tick_stats = TickStats(tick_rate)  # all rooms together
+        self.stats_interval = stats_interval
+        self.tick_task = None
+        self.handler_tasks = set()  # handle_client of every TCP connection, awaited by stop()
+        self.accepted = 0  # TCP connections given a room or refused, cluster.py compares it with what it routed
+
+    async def start(self):
+        if not self.listen:
+            print("Server started without a listener")
+        elif self.transport == "udp":
+            endpoint, self.udp = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: UdpServerProtocol(self), local_addr=(self.host, self.port))
+            # port 0 binds a random free port, store the real one
+            self.port = endpoint.get_extra_info("sockname")[1]
+        else:
+            self.server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=self.backlog)
+            self.port = self.server.sockets[0].getsockname()[1]
+        if self.listen:
+            print(f"Server started and listening on {self.transport.upper()} port:", self.port)
+        if self.metrics_port is not None:
+            self.metrics_server = await serve_metrics(self, self.metrics_host, self.metrics_port)
+            self.metrics_port = self.metrics_server.sockets[0].getsockname()[1]
+            print(f"Metrics on http://{self.metrics_host}:{self.metrics_port}/metrics")
+        self.tick_task = asyncio.create_task(self.tick_loop())
+
+    async def serve_forever(self):
+        if self.tick_task is None:
+            await self.start()
+        if self.server is not None:
+            async with self.server:
+                await self.server.serve_forever()
+        else:
+            await self.tick_task
+
+    async def tick_loop(self):
+        """
+        Fixed rate simulation loop
+        Sleeps until the next tick deadline, so a slow tick eats into the sleep and not into the rate.
+        If we fall more than one tick behind we skip ahead instead of running a burst of ticks.
+        """
+
+        interval = 1 / self.tick_rate
+        next_tick = time.perf_counter()
+        next_report = next_tick + (self.stats_interval or 0)
+        while True:
+            start = time.perf_counter()
+            self.run_tick()
+            end = time.perf_counter()
+            self.tick_stats.record(end - start)
+            self.metrics.tick.observe(end - start)
+
+            if self.stats_interval and end >= next_report:
+                self.report()
+                next_report = end + self.stats_interval
+
+            next_tick += interval
+            if end - next_tick > interval:
+                next_tick = end
+            await asyncio.sleep(max(0, next_tick - time.perf_counter()))
+
+    def run_tick(self):
+        self.tick += 1
+        if self.udp is not None:
+            self.udp.update()
+        for room in list(self.rooms.rooms.values()):
+            room.run_tick()
+
+    def stats(self):
+        """
+        Load of this server, used by the stats report and by cluster.py to pick a worker
+        Returns: dict with rooms, clients, free slots in the open rooms, the tick time summary of
+            all rooms together, the CPU seconds this process used so far and the send queue numbers
+        """
+
+        summary = self.tick_stats.summary()
+        clients = self.clients
+        return {
+            "rooms": len(self.rooms.rooms),
+            "clients": len(self.clients),
+            "free_slots": self.rooms.free_slots(),
+            "accepted": self.accepted,
+            "tick_avg_ms": summary["avg_ms"],
+            "tick_p95_ms": summary["p95_ms"],
+            "tick_max_ms": summary["max_ms"],
+            "tick_overruns": summary["overruns"],
+            "headroom": summary["headroom"],
+            "cpu_time": time.process_time(),
+            "send_queue_max": max((client.queue_depth() for client in clients), default=0),
+            "snapshots_dropped": self.snapshots_dropped + sum(client.dropped for client in clients),
+            "lag_disconnects": self.lag_disconnects,
+            "queue_full_disconnects": self.queue_full_disconnects,
+            "joins": self.joins,
+            "joins_cached": self.joins_cached,
+            "join_bytes": self.join_bytes,
+            "join_avg_ms": sum(self.join_times) / len(self.join_times) * 1000 if self.join_times else 0.0,
+            "join_max_ms": max(self.join_times, default=0.0) * 1000,
+        }
+
+    def report(self):
+        print(f"Tick stats: {self.tick_stats.report()}")
+        stats = self.stats()
+        print(f"Send queues: max depth={stats['send_queue_max']} snapshots dropped={stats['snapshots_dropped']} "
+              f"lag disconnects={stats['lag_disconnects']} queue full disconnects={stats['queue_full_disconnects']}")
+        print(f"Joins: {stats['joins']} ({stats['joins_cached']} with cached map) join to playable "
+              f"avg={stats['join_avg_ms']:.1f}ms max={stats['join_max_ms']:.1f}ms sent={stats['join_bytes']}B")
+        for room in self.rooms.rooms.values():
+            print(f"Room {room.id}: {len(room.clients)} players, tick {room.tick_stats.report()}, "
+                  f"snapshots {room.bandwidth_stats.report()}")
+
+    async def stop(self):
+        if self.tick_task is not None:
+            self.tick_task.cancel()
+            await asyncio.gather(self.tick_task, return_exceptions=True)
+        if self.server is not None:
+            self.server.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self.udp is not None:
+            for addr in list(self.udp.clients):
+                self.udp.drop(addr)
+            self.udp.transport.close()
+        for client in list(self.clients):
+            client.writer.close()
+        # closed connections end their handlers, wait for them so nothing is left pending
+        await asyncio.gather(*self.handler_tasks, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        if self.capture is not None:
+            self.capture.close()
+
+    def join(self):
+        """
+        Find a room and a player slot for a new connection
+        Returns: tuple (Room, PlayerState), or (None, None) if the server is full
+        """
+
+        if self.max_players is not None and self.rooms.player_count() >= self.max_players:
+            return None, None
+        return self.rooms.join()
+
+    def add_client(self, client, room):
+        client.connection_id = self.next_connection_id
+        self.next_connection_id += 1
+        if self.capture is not None:
+            self.capture.record(client.connection_id, EVENT_CONNECT)
+        self.clients.add(client)
+        room.add_client(client)
+
+    def remove_client(self, client):
+        if client in self.clients:
+            if self.capture is not None:
+                self.capture.record(client.connection_id, EVENT_DISCONNECT)
+            self.snapshots_dropped += client.dropped
+            if client.kick_cause == KICK_LAG:
+                self.lag_disconnects += 1
+            elif client.kick_cause == KICK_QUEUE_FULL:
+                self.queue_full_disconnects += 1
+        self.rooms.leave(client)
+        self.clients.discard(client)
+
+    async def adopt(self, sock):
+        """
+        Serve a TCP connection that was accepted somewhere else (cluster.py front end)
+        Args:
+            sock (socket.socket): Connected socket, the server owns it from now on
+        """
+
+        reader, writer = await asyncio.open_connection(sock=sock)
+        await self.handle_client(reader, writer)
+
+    async def handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self.handler_tasks.add(task)
+        try:
+            await self.serve_client(reader, writer)
+        finally:
+            self.handler_tasks.discard(task)
+
+    async def serve_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        self.accepted += 1
+        room, player = self.join()
+        if player is None:
+            print(f"Refused connection from {addr}: server full")
+            writer.close()
+            return
+
+        print(f"New connection from {addr} as Player {player.id} in room {room.id}")
+        client = ClientConnection(reader, writer, player, self.send_queue_size, self.max_send_lag, self.metrics)
+        writer_task = asyncio.create_task(client.writer_loop())
+        self.add_client(client, room)
+
+        decoder = protocol.FrameDecoder()
+        metrics = self.metrics
+        perf_counter = time.perf_counter
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    print(f"Player {player.id} disconnected")
+                    break
+                metrics.bytes_in += len(data)
+                start = perf_counter()
+                # one read can hold several frames or only part of one
+                for msg_type, payload in decoder.feed(data):
+                    self.handle_message(client, msg_type, payload)
+                metrics.decode_seconds += perf_counter() - start
+        except (ConnectionError, OSError, protocol.ProtocolError) as e:
+            print(f"Error with Player {player.id}: {e}")
+        finally:
+            self.remove_client(client)
+            client.close()
+            await writer_task
+            writer.close()
+
+    def handle_message(self, client, msg_type, payload):
+        # protocol.decode turns a payload too short for its type into a ProtocolError,
+        # the caller drops the client for it
+        self.metrics.messages_in[msg_type] += 1
+        if self.capture is not None:
+            self.capture.record(client.connection_id, EVENT_MESSAGE, msg_type, payload)
+        if msg_type == protocol.MSG_INPUT:
+            # inputs are queued and simulated on the next tick
+            message = protocol.decode(msg_type, payload)
+            client.history.ack(message["ack_tick"])
+            # UDP clients repeat their last inputs in every packet, keep only new ones
+            if message["seq"] > client.player.last_queued_seq:
+                client.player.inputs.append((message["seq"], message["keys"]))
+                client.player.last_queued_seq = message["seq"]
+        elif msg_type == protocol.MSG_ATTACK:
+            message = protocol.decode(msg_type, payload)
+            client.room.attack(client.player, message["view_tick"], message["direction"])
+        elif msg_type == protocol.MSG_PING:
+            client.send(protocol.encode_pong(protocol.decode(msg_type, payload)))
+        elif msg_type == protocol.MSG_PEER_INPUT:
+            # rollback matches simulate on the peers, the server only passes the inputs on
+            client.room.relay_peer_inputs(client, protocol.decode(msg_type, payload))
+        elif msg_type == protocol.MSG_JOIN_REQUEST:
+            client.room.join_request(client, protocol.decode(msg_type, payload))
+        elif msg_type == protocol.MSG_JOIN_READY:
+            protocol.decode(msg_type, payload)
+            transfer = client.room.join_ready(client)
+            if transfer is not None:
+                self.join_times.append(time.perf_counter() - transfer.started)
+                self.joins += 1
+                self.joins_cached += transfer.cached
+                self.join_bytes += transfer.sent_bytes
+
+
+async def main():
+    game = GameServer(server_ip, port, transport=TRANSPORT)
+    await game.start()
+    # opening the port to the outside is slow, it runs once we already accept connections
+    plugin_task = asyncio.create_task(plugins.run_plugins(["firewall", "upnp"], game.port, TRANSPORT))
+    try:
+        await game.serve_forever()
+    finally:
+        await plugins.stop(plugin_task)
 
-player_positions = [(100, 100), (W-100-RectW, 100)]  # Initial positions for players
 
-while True:
-    conn, addr = s.accept()
-    threading.Thread(target=handle_client, args=(conn, addr, current_player)).start()
-    current_player = 1 + (current_player % 2)  # Alternate between 1 and 2
+if __name__ == "__main__":
+    asyncio.run(main())
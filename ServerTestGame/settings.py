@@ -1,5 +1,3 @@
-import pygame
-
 # Screen setup
 W, H = 600, 600 
 
@@ -7,5 +5,27 @@ RectW, RectH = 50, 50  # Rectangle dimensions
 
 WHT, BLU, RED, BLK = (255, 255, 255), (0, 200, 255), (255, 0, 0), (0, 0, 0) # Colors
 
-# Clock
-clock = pygame.time.Clock()
+
+# Network simulation
+TICK_RATE = 60  # Server simulation ticks per second
+SNAPSHOT_RATE = 20  # Snapshots per second pushed to each client
+TRANSPORT = "tcp"  # "tcp" or "udp", client and server must match
+INTERPOLATION_DELAY = 2 / SNAPSHOT_RATE  # Remote players are drawn this many seconds in the past
+MOVE_SPEED = 3  # Pixels a player moves per input (clients send one input per frame)
+WORLD_BOUNDS = (W - RectW, H - RectH)  # Highest x, y a player can reach
+VIEW_SIZE = (W, H)  # Area around a player the server sends to its client. main.py has no camera and draws the
+                    # whole world, so the view covers it and the server turns filtering off (aoi.covers_world)
+AOI_MARGIN = 100  # Players this far outside the view are sent too, so they do not pop in at the edge
+AOI_CELL_SIZE = 300  # Cell size of the server's spatial grid, about half the view
+ROOM_SIZE = 16  # Players per room, a new room opens when every room is full
+SEND_QUEUE_SIZE = 64  # Messages (besides the newest snapshot) queued for one client before it is disconnected
+MAX_SEND_LAG = 5.0  # Seconds a client may stay behind on snapshots before it is disconnected, None = never
+SEND_BUFFER = 16384  # Bytes buffered in a client's socket transport before its snapshots are coalesced
+LAG_COMPENSATION = 0.5  # Seconds of player positions the server keeps to check hits against what the attacker saw
+ATTACK_REACH = 40  # Pixels a slash reaches past the attacker
+ROLLBACK_FRAMES = 8  # Rollback matches: frames a peer may run ahead of the other peer's last input before it waits
+JOIN_CHUNK_SIZE = 1024  # Bytes of map data in one late-join chunk
+JOIN_BUDGET = 4096  # Bytes of late-join data a room sends per tick, over all joining players
+JOIN_WINDOW = 8  # Chunks a joining player may have queued or unacknowledged before it gets more
+CONTENT_CACHE = "content_cache"  # Folder where the client keeps maps by content hash
+MAP_ROTATION = 4  # Different maps the rooms cycle through, a client downloads each one once
@@ -0,0 +1,59 @@
+import protocol
+
+# Game rules shared by the server and the client
+# so both move a player the same way for the same input
+
+
+def move(x, y, keys, speed, bounds=None):
+    """
+    Move a player one tick
+    Args:
+        x (int): Current x position
+        y (int): Current y position
+        keys (int): Keys bitmask (protocol.KEY_*)
+        speed (int): Pixels per tick
+        bounds (tuple, optional): (max_x, max_y), positions are clamped to 0..max. Defaults to None.
+    Returns: tuple (x, y) with the new position
+    """
+
+    if keys & protocol.KEY_LEFT:
+        x -= speed
+    if keys & protocol.KEY_RIGHT:
+        x += speed
+    if keys & protocol.KEY_UP:
+        y -= speed
+    if keys & protocol.KEY_DOWN:
+        y += speed
+    if bounds is not None:
+        x = min(max(x, 0), bounds[0])
+        y = min(max(y, 0), bounds[1])
+    return x, y
+
+
+def attack_box(x, y, direction, size, reach):
+    """
+    Area hit by a slash
+    Args:
+        x (int): Attacker x position
+        y (int): Attacker y position
+        direction (int): Keys bitmask the attacker faces, right when empty
+        size (tuple): (width, height) of a player
+        reach (int): How far the slash goes past the attacker's side
+    Returns: tuple (left, top, right, bottom)
+    """
+
+    width, height = size
+    if direction & protocol.KEY_LEFT:
+        return x - reach, y, x, y + height
+    if direction & protocol.KEY_UP:
+        return x, y - reach, x + width, y
+    if direction & protocol.KEY_DOWN:
+        return x, y + height, x + width, y + height + reach
+    return x + width, y, x + width + reach, y + height
+
+
+def overlaps(box, x, y, size):
+    """True if the box touches the player rectangle at (x, y)"""
+
+    left, top, right, bottom = box
+    return x < right and x + size[0] > left and y < bottom and y + size[1] > top
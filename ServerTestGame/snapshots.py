@@ -0,0 +1,162 @@
+from collections import deque
+import protocol
+
+# Delta compressed snapshots
+# A snapshot state is a dict: player id -> (x, y, color)
+# The server remembers the states it sent to each client. Once the client acknowledges
+# one of them (ack_tick in its inputs) the next snapshots only carry what changed since it.
+# Without a usable baseline a full snapshot is sent instead.
+
+
+def diff(baseline, state):
+    """
+    Compare two snapshot states
+    Args:
+        baseline (dict): State the client already has
+        state (dict): Current state
+    Returns: tuple (changed, removed) in the format protocol.encode_delta expects
+    """
+
+    changed = []
+    for player_id, (x, y, color) in state.items():
+        old = baseline.get(player_id)
+        if old is None:
+            mask = protocol.FIELD_ALL  # new entity, send everything
+        else:
+            mask = 0
+            if old[0] != x:
+                mask |= protocol.FIELD_X
+            if old[1] != y:
+                mask |= protocol.FIELD_Y
+            if old[2] != color:
+                mask |= protocol.FIELD_COLOR
+            if not mask:
+                continue
+        changed.append((player_id, mask, (x, y), color))
+    removed = [player_id for player_id in baseline if player_id not in state]
+    return changed, removed
+
+
+class SnapshotHistory:
+    """
+    Server side: states sent to one client and the newest one it acknowledged
+
+    Args:
+        size (int, optional): Number of sent states kept. Defaults to 64.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.sent = {}  # tick -> state
+        self.order = deque()  # ticks in self.sent, oldest first
+        self.acked_tick = 0
+
+    def ack(self, tick):
+        if tick > self.acked_tick and tick in self.sent:
+            self.acked_tick = tick
+            # older states will never be used as a baseline again
+            while self.order and self.order[0] < tick:
+                del self.sent[self.order.popleft()]
+
+    def encode_parts(self, tick, state, ack_seq, shared=None):
+        """
+        Encode a state for this client, delta against the acknowledged baseline when possible
+        Args:
+            tick (int): Server tick of the state
+            state (dict): player id -> (x, y, color), must not be changed afterwards
+            ack_seq (int): Last input sequence processed for this client
+            shared (dict, optional): Encoded frames of this tick. Pass the same dict for every client of
+                the tick: clients that get the same state object and acknowledged the same baseline
+                state object share one encoded frame. With area of interest filtering, give clients
+                that see the same players the same state object. Defaults to encoding for this client only.
+        Returns: tuple (shared part, trailer), the frame is the two sent back to back
+        """
+
+        baseline = self.sent.get(self.acked_tick)
+        baseline_tick = self.acked_tick if baseline is not None else 0
+        # the frame only depends on the two states, both are kept alive for the tick so their ids are stable
+        key = (baseline_tick, id(baseline), id(state))
+        data = shared.get(key) if shared is not None else None
+        if data is None:
+            if baseline is None:
+                entities = [(player_id, (x, y), color) for player_id, (x, y, color) in state.items()]
+                data = protocol.encode_snapshot_shared(tick, entities)
+            else:
+                changed, removed = diff(baseline, state)
+                data = protocol.encode_delta_shared(tick, baseline_tick, changed, removed)
+            if shared is not None:
+                shared[key] = data
+
+        self.sent[tick] = state
+        self.order.append(tick)
+        while len(self.order) > self.size:
+            del self.sent[self.order.popleft()]
+        return data, protocol.encode_trailer(ack_seq)
+
+    def encode(self, tick, state, ack_seq):
+        """
+        Same as encode_parts, returns the whole frame as bytes
+        """
+
+        return b"".join(self.encode_parts(tick, state, ack_seq))
+
+
+class SnapshotReceiver:
+    """
+    Client side: rebuilds full snapshots from MSG_SNAPSHOT and MSG_DELTA frames
+
+    Args:
+        size (int, optional): Number of received states kept as possible baselines. Defaults to 64.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.states = {}  # tick -> state
+        self.order = deque()
+        self.last_tick = 0  # newest tick received, acknowledged with the next input
+
+    def apply(self, msg_type, payload):
+        """
+        Args:
+            msg_type (int): MSG_SNAPSHOT or MSG_DELTA
+            payload (bytes): Frame payload
+        Returns: snapshot dict {"tick", "entities", "ack"} like protocol.decode_snapshot,
+            or None if the delta baseline is unknown
+        """
+
+        if msg_type == protocol.MSG_SNAPSHOT:
+            snapshot = protocol.decode_snapshot(payload)
+            state = {e["id"]: (e["position"][0], e["position"][1], e["color"]) for e in snapshot["entities"]}
+        else:
+            delta = protocol.decode_delta(payload)
+            baseline = self.states.get(delta["baseline"])
+            if baseline is None:
+                return None
+            state = dict(baseline)
+            for player_id in delta["removed"]:
+                state.pop(player_id, None)
+            for entity in delta["changed"]:
+                mask = entity["mask"]
+                x, y, color = state.get(entity["id"], (0, 0, (0, 0, 0)))
+                if mask & protocol.FIELD_X:
+                    x = entity["position"][0]
+                if mask & protocol.FIELD_Y:
+                    y = entity["position"][1]
+                if mask & protocol.FIELD_COLOR:
+                    color = entity["color"]
+                state[entity["id"]] = (x, y, color)
+            snapshot = {
+                "tick": delta["tick"],
+                "entities": [{"id": player_id, "position": (x, y), "color": color}
+                             for player_id, (x, y, color) in state.items()],
+                "ack": delta["ack"],
+            }
+
+        tick = snapshot["tick"]
+        if tick not in self.states:
+            self.states[tick] = state
+            self.order.append(tick)
+            while len(self.order) > self.size:
+                del self.states[self.order.popleft()]
+        self.last_tick = max(self.last_tick, tick)
+        return snapshot
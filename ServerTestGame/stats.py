@@ -0,0 +1,101 @@
+from collections import deque
+
+
+def percentile(ordered, fraction):
+    """
+    Args:
+        ordered (list): Sorted values, not empty
+        fraction (float): 0.5 for the median, 0.95 for p95 ...
+    Returns: the value below which that fraction of the values falls
+    """
+
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class TickStats:
+    """
+    Tick duration metrics for a fixed rate loop
+    Keeps the last durations in a window so we can see how much of the tick budget is used
+
+    Args:
+        tick_rate (int): Ticks per second, the budget of one tick is 1 / tick_rate
+        window (int, optional): Number of recent ticks kept. Defaults to 600.
+    """
+
+    def __init__(self, tick_rate, window=600):
+        self.budget = 1 / tick_rate
+        self.durations = deque(maxlen=window)
+        self.ticks = 0
+        self.overruns = 0  # ticks that took longer than the budget
+
+    def record(self, duration):
+        self.durations.append(duration)
+        self.ticks += 1
+        if duration > self.budget:
+            self.overruns += 1
+
+    def summary(self):
+        """
+        Returns: dict with tick count, overruns, avg/p95/max duration in ms
+            and headroom (percent of the budget left at p95)
+        """
+
+        if not self.durations:
+            return {"ticks": 0, "overruns": 0, "avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0, "headroom": 100.0}
+        ordered = sorted(self.durations)
+        p95 = percentile(ordered, 0.95)
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "avg_ms": sum(ordered) / len(ordered) * 1000,
+            "p95_ms": p95 * 1000,
+            "max_ms": ordered[-1] * 1000,
+            "headroom": (1 - p95 / self.budget) * 100,
+        }
+
+    def report(self):
+        s = self.summary()
+        return (f"ticks={s['ticks']} overruns={s['overruns']} avg={s['avg_ms']:.3f}ms "
+                f"p95={s['p95_ms']:.3f}ms max={s['max_ms']:.3f}ms headroom={s['headroom']:.1f}%")
+
+
+
+class BandwidthStats:
+    """
+    Bytes sent per client for each snapshot tick
+
+    Args:
+        snapshot_rate (int): Snapshots per second, used for the per second numbers
+        window (int, optional): Number of recent snapshot ticks kept. Defaults to 600.
+    """
+
+    def __init__(self, snapshot_rate, window=600):
+        self.snapshot_rate = snapshot_rate
+        self.per_client = deque(maxlen=window)  # average bytes per client of each snapshot tick
+        self.total_bytes = 0
+
+    def record(self, sent_bytes, clients):
+        self.total_bytes += sent_bytes
+        if clients:
+            self.per_client.append(sent_bytes / clients)
+
+    def summary(self):
+        """
+        Returns: dict with average and max bytes per client per snapshot tick
+            and the average bytes per second each client receives
+        """
+
+        if not self.per_client:
+            return {"avg_bytes": 0.0, "max_bytes": 0.0, "bytes_per_sec": 0.0, "total_bytes": self.total_bytes}
+        avg = sum(self.per_client) / len(self.per_client)
+        return {
+            "avg_bytes": avg,
+            "max_bytes": max(self.per_client),
+            "bytes_per_sec": avg * self.snapshot_rate,
+            "total_bytes": self.total_bytes,
+        }
+
+    def report(self):
+        s = self.summary()
+        return (f"bytes/client/tick avg={s['avg_bytes']:.1f} max={s['max_bytes']:.0f} "
+                f"bytes/client/sec={s['bytes_per_sec']:.0f} total={s['total_bytes']}")
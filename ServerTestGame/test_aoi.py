@@ -0,0 +1,88 @@
+import protocol
+import server
+from aoi import SpatialGrid, camera_center, covers_world, update_visible
+from snapshots import SnapshotReceiver, SnapshotHistory
+
+# Area of interest filtering: who enters and leaves a view, and that a client rebuilding the
+# filtered deltas ends up with exactly the players its view holds.
+#     python -m pytest test_aoi.py
+
+WORLD = (2000, 2000)
+VIEW = (400, 400)
+MARGIN = 50
+
+
+def test_default_view_covers_the_game_world():
+    # main.py draws the whole window, the room must send every player
+    assert covers_world(server.VIEW_SIZE, (server.W, server.H))
+    assert server.Room(1).view_size is None
+    assert server.Room(2, view_size=(server.W // 2, server.H // 2)).view_size is not None
+
+
+def test_camera_center_stays_in_the_world():
+    assert camera_center((10, 1990), VIEW, WORLD) == (200, 1800)
+    assert camera_center((1000, 700), VIEW, WORLD) == (1000, 700)
+    assert camera_center((10, 10), WORLD, WORLD) == (1000, 1000)
+
+
+def test_enter_and_leave_margins():
+    grid = SpatialGrid(100)
+    grid.insert(1, 1000, 1000)
+    visible = set()
+    # the view reaches 200 px from the center, entering needs the margin, leaving twice the margin
+    for x, expected in ((1260, False), (1240, True), (1290, True), (1310, False), (1290, False)):
+        grid.move(2, x, 1000)
+        visible = update_visible(grid, visible, (1000, 1000), VIEW, MARGIN)
+        assert (2 in visible) == expected, x
+
+
+class RecordingClient:
+    """Stand-in for a connection, decodes what it is sent like a client"""
+
+    def __init__(self, player):
+        self.player = player
+        self.history = SnapshotHistory()
+        self.visible = set()
+        self.receiver = SnapshotReceiver()
+        self.snapshot = None
+
+    def send(self, data, reliable=False):
+        pass
+
+    def send_snapshot(self, parts):
+        (msg_type, payload), = protocol.split_frames(b"".join(parts))
+        self.snapshot = self.receiver.apply(msg_type, payload)
+        self.history.ack(self.receiver.last_tick)
+
+
+def test_filtered_snapshots_follow_the_view():
+    room = server.Room(1, tick_rate=60, snapshot_rate=60, view_size=VIEW, aoi_margin=MARGIN,
+                       bounds=(WORLD[0] - server.RectW, WORLD[1] - server.RectH))
+    clients = {}
+    for x in (1000, 1100, 1700):
+        player = room.state.join()
+        player.x, player.y = x, 1000
+        room.state.grid.move(player.id, player.x, player.y)
+        clients[player.id] = room.clients[player.id] = RecordingClient(player)
+
+    def seen(player_id):
+        return sorted(entity["id"] for entity in clients[player_id].snapshot["entities"])
+
+    room.run_tick()
+    assert seen(1) == [1, 2]
+    assert seen(3) == [3]
+    # player 3 walks to player 1, it enters the view and is sent in full on top of the delta
+    for _ in range(200):
+        clients[3].player.inputs.append((0, protocol.KEY_LEFT))
+        room.run_tick()
+    assert clients[3].player.x < 1200
+    assert seen(1) == [1, 2, 3]
+    # and back out, it is removed again
+    for _ in range(200):
+        clients[3].player.inputs.append((0, protocol.KEY_RIGHT))
+        room.run_tick()
+    assert seen(1) == [1, 2]
+    state = room.state.snapshot_state()
+    for client in clients.values():
+        for entity in client.snapshot["entities"]:
+            assert state[entity["id"]][:2] == entity["position"]
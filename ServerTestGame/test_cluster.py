@@ -0,0 +1,62 @@
+import asyncio
+import time
+import protocol
+from cluster import ClusterServer
+
+# The front end has to send players to the worker whose room still has a slot, otherwise with
+# N workers the first N players each get a room of their own and never see each other.
+#     python -m pytest test_cluster.py
+
+
+async def read_frames(reader, decoder, seconds, stop):
+    """Frames received for a few seconds, or until stop(msg_type, payload) is true"""
+
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            data = await asyncio.wait_for(reader.read(4096), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            return
+        assert data, "server closed the connection"
+        for msg_type, payload in decoder.feed(data):
+            if stop(msg_type, payload):
+                return msg_type, payload
+
+
+def both_players(msg_type, payload):
+    return msg_type == protocol.MSG_SNAPSHOT and len(protocol.decode_snapshot(payload)["entities"]) == 2
+
+
+async def join_two_clients():
+    # view_size None: the two starting positions are far apart, the test is about rooms and not interest
+    cluster = ClusterServer("127.0.0.1", 0, workers=2, stats_interval=None, report_interval=0.1, room_size=2,
+                            view_size=None)
+    await cluster.start()
+    serve_task = asyncio.create_task(cluster.serve_forever())
+    connections = []
+    try:
+        # back to back, the second connects before any worker reported the first one
+        for _ in range(2):
+            connections.append(await asyncio.open_connection("127.0.0.1", cluster.port))
+        welcomes = []
+        snapshots = []
+        for reader, _ in connections:
+            decoder = protocol.FrameDecoder()
+            _, payload = await read_frames(reader, decoder, 10, lambda msg_type, _: msg_type == protocol.MSG_WELCOME)
+            welcomes.append(protocol.decode_welcome(payload))
+            snapshots.append(await read_frames(reader, decoder, 2, both_players))
+        await asyncio.sleep(0.3)  # a load report from every worker
+        cluster.read_stats()
+        return welcomes, snapshots, [worker.stats for worker in cluster.workers]
+    finally:
+        for _, writer in connections:
+            writer.close()
+        serve_task.cancel()
+        await asyncio.gather(serve_task, return_exceptions=True)
+
+
+def test_two_clients_share_a_room():
+    welcomes, snapshots, stats = asyncio.run(join_two_clients())
+    assert sorted(welcome["id"] for welcome in welcomes) == [1, 2]
+    assert all(snapshot is not None for snapshot in snapshots), "a client never saw the other player"
+    assert sorted((s["rooms"], s["clients"]) for s in stats) == [(0, 0), (1, 2)]
@@ -0,0 +1,108 @@
+import protocol
+import server
+from history import PositionHistory
+from server import PlayerState, Room
+
+# Lag compensation: the position ring buffer, and attacks checked where the attacker saw the target.
+#     python -m pytest test_history.py
+
+
+def players(*positions):
+    return [PlayerState(player_id, position, server.WHT) for player_id, position in enumerate(positions, 1)]
+
+
+def test_ring_buffer_wraps_around():
+    history = PositionHistory(4)
+    player, = players((0, 0))
+    for tick in range(1, 7):
+        player.x = tick * 10
+        history.record(tick, [player])
+    assert [history.has(tick) for tick in range(1, 7)] == [False, False, True, True, True, True]
+    assert history.position(2, 1) is None
+    assert history.position(3, 1) == (30, 0)
+    assert history.position(6, 1) == (60, 0)
+    # a row reused by a newer tick does not answer for the old one
+    assert history.position(6 - 4, 1) is None
+
+
+def test_growing_ids_keep_older_rows():
+    history = PositionHistory(3, capacity=2)
+    history.record(1, players((5, 6)))
+    history.record(2, players((7, 8), (1, 2), (3, 4)))
+    assert history.capacity >= 4
+    assert history.position(1, 1) == (5, 6)
+    assert history.position(1, 3) is None  # not in the game yet
+    assert history.position(2, 3) == (3, 4)
+
+
+def test_interpolates_between_ticks():
+    history = PositionHistory(8)
+    player, = players((0, 100))
+    history.record(10, [player])
+    player.x, player.y = 30, 40
+    history.record(11, [player])
+    assert history.position(10.5, 1) == (15, 70)
+    assert history.position(10.25, 1) == (7.5, 85)
+    # no tick after it: the tick before
+    assert history.position(11.5, 1) == (30, 40)
+
+
+def test_rewind_puts_players_back():
+    history = PositionHistory(8)
+    moved, newcomer = players((10, 10), (20, 20))
+    history.record(1, [moved])
+    moved.x, moved.y = 50, 50
+    history.record(2, [moved, newcomer])
+    with history.rewind([moved, newcomer], 1.5):
+        assert (moved.x, moved.y) == (30, 30)
+        assert (newcomer.x, newcomer.y) == (20, 20)  # was not there at tick 1, stays
+    assert (moved.x, moved.y) == (50, 50)
+    with history.rewind([moved], 100):  # not kept, nobody moves
+        assert (moved.x, moved.y) == (50, 50)
+
+
+def chase_room(ticks):
+    """
+    Player 2 starts right in front of player 1's slash and walks away 3 px a tick
+    Player 2 is at x = 140 + 3 * tick, the slash of player 1 reaches x < 190.
+    """
+
+    room = Room(1, tick_rate=60, view_size=None)
+    attacker = room.state.join()
+    target = room.state.join()
+    attacker.x, attacker.y = 100, 100
+    target.x, target.y = 140, 100
+    for _ in range(ticks):
+        target.inputs.append((0, protocol.KEY_RIGHT))
+        room.run_tick()
+    return room, attacker, target
+
+
+def attack(room, attacker, view_tick):
+    message = protocol.decode_attack(protocol.split_frames(protocol.encode_attack(view_tick, protocol.KEY_RIGHT))[0][1])
+    return room.attack(attacker, message["view_tick"], message["direction"])
+
+
+def test_hit_only_because_of_rewind():
+    room, attacker, target = chase_room(20)
+    assert target.x == 200
+    assert attack(room, attacker, 20) == []  # where the server has the target now
+    assert attack(room, attacker, 10) == [target.id]  # where the attacker saw it
+    assert target.x == 200
+
+
+def test_attack_between_ticks():
+    room, attacker, target = chase_room(20)
+    # x = 189.5 and 190.7: in reach only on the first, neither is a whole tick
+    assert attack(room, attacker, 16.5) == [target.id]
+    assert attack(room, attacker, 16.9) == []
+
+
+def test_view_tick_is_clamped_to_the_history():
+    room, attacker, target = chase_room(40)
+    oldest = room.tick - room.history.frames + 1
+    assert 140 + 3 * oldest < 190  # the target was in reach at the oldest tick kept
+    # older than the history: checked at the oldest tick kept instead of not rewinding at all
+    assert attack(room, attacker, 0) == [target.id]
+    # from the future: checked now
+    assert attack(room, attacker, room.tick + 100) == []
@@ -0,0 +1,124 @@
+import pytest
+import protocol
+import rollback
+from joinstate import ContentCache, JoinReceiver, JoinTransfer, World, content_hash
+
+# Late join: the map goes in paced chunks and is rebuilt on the client, or comes from the
+# client's content cache when the hash matches.
+#     python -m pytest test_joinstate.py
+
+
+class QueueClient:
+    """Connection stand-in, keeps the frames sent until the test delivers them"""
+
+    def __init__(self):
+        self.queue = []
+
+    def send(self, data, reliable=False):
+        assert reliable
+        self.queue.extend(protocol.split_frames(data))
+
+    def queue_depth(self):
+        return len(self.queue)
+
+    def deliver(self, receiver):
+        replies = [receiver.handle(msg_type, payload) for msg_type, payload in self.queue]
+        self.queue.clear()
+        return [reply for reply in replies if reply is not None]
+
+
+def room_world(seed=0):
+    return World(rollback.generate_walls(rollback.MAP_TILES, seed), rollback.MAP_TILES)
+
+
+def start_join(world, receiver):
+    client = QueueClient()
+    transfer = JoinTransfer(client, world)
+    reply, = [receiver.handle(*protocol.split_frames(
+        protocol.encode_join_info(world.map_hash, len(world.map_data)))[0])]
+    message = protocol.decode(*protocol.split_frames(reply)[0])
+    transfer.request(message["hash"], message["cached"])
+    return client, transfer
+
+
+def test_download_in_paced_chunks(tmp_path):
+    world = room_world()
+    receiver = JoinReceiver(ContentCache(str(tmp_path)))
+    client, transfer = start_join(world, receiver)
+    assert not receiver.cached
+
+    sends = []
+    while not transfer.done:
+        sent = transfer.send_more(budget=100, chunk_size=40, window=2)
+        sends.append(sent)
+        # never more than the budget, the window or the chunk size at once
+        assert sent <= 100 + len(protocol.encode_join_done())
+        assert client.queue_depth() <= 3
+        assert all(len(payload) - protocol.JOIN_CHUNK.size <= 40
+                   for msg_type, payload in client.queue if msg_type == protocol.MSG_JOIN_CHUNK)
+        replies = client.deliver(receiver)
+    assert len(sends) > len(world.map_data) // 100
+    assert transfer.sent_bytes == sum(sends)
+    assert transfer.send_more(100, 40, 2) == 0
+    assert replies == [protocol.encode_join_ready()]
+    assert receiver.world == {"tiles": world.tiles, "layout": world.layout}
+    # stored for the next join
+    assert ContentCache(str(tmp_path)).get(world.map_hash) == world.map_data
+
+
+def test_window_holds_chunks_back():
+    world = room_world()
+    client, transfer = start_join(world, JoinReceiver())
+    transfer.send_more(budget=10000, chunk_size=16, window=4)
+    assert client.queue_depth() == 4
+    assert transfer.send_more(budget=10000, chunk_size=16, window=4) == 0
+
+
+def test_cached_map_skips_the_download(tmp_path):
+    world = room_world()
+    cache = ContentCache(str(tmp_path))
+    cache.put(world.map_hash, world.map_data)
+    receiver = JoinReceiver(cache)
+    client, transfer = start_join(world, receiver)
+    assert receiver.cached and transfer.cached
+    transfer.send_more(budget=10000, chunk_size=64, window=8)
+    assert [msg_type for msg_type, _ in client.queue] == [protocol.MSG_JOIN_DONE]
+    assert transfer.sent_bytes == len(protocol.encode_join_done())
+    assert client.deliver(receiver) == [protocol.encode_join_ready()]
+    assert receiver.world["layout"] == world.layout
+
+
+def test_cache_of_another_map_is_not_used(tmp_path):
+    cache = ContentCache(str(tmp_path))
+    old = room_world(seed=1)
+    cache.put(old.map_hash, old.map_data)
+    world = room_world(seed=2)
+    client, transfer = start_join(world, JoinReceiver(cache))
+    assert not transfer.cached
+    # a client claiming to have the map for another hash still downloads ours
+    transfer = JoinTransfer(QueueClient(), world)
+    transfer.request(old.map_hash, True)
+    assert not transfer.cached and transfer.offset == 0
+
+
+def test_cache_rejects_files_that_do_not_match_their_hash(tmp_path):
+    cache = ContentCache(str(tmp_path))
+    data = b"map bytes"
+    key = content_hash(data)
+    cache.put(key, data)
+    assert cache.get(key) == data
+    with open(cache.path(key), "wb") as file:
+        file.write(b"other bytes")
+    assert cache.get(key) is None
+
+
+def test_corrupted_download_is_refused():
+    world = room_world()
+    receiver = JoinReceiver()
+    client, transfer = start_join(world, receiver)
+    transfer.send_more(budget=100000, chunk_size=1024, window=100)
+    msg_type, payload = client.queue[0]
+    client.queue[0] = (msg_type, payload[:-1] + bytes([payload[-1] ^ 1]))
+    with pytest.raises(protocol.ProtocolError):
+        client.deliver(receiver)
+    assert receiver.world is None
@@ -0,0 +1,121 @@
+import asyncio
+import protocol
+from netem_proxy import Conditions, NetemProxy
+from transport import UdpPeer
+
+# The network conditioner on loopback: the UDP transport keeps its reliable channel in order
+# through delay, jitter, loss and reordering, a full bandwidth queue drops datagrams, and a
+# client that went quiet loses its upstream socket.
+#     python -m pytest test_netem_proxy.py
+
+
+class Endpoint(asyncio.DatagramProtocol):
+    """UDP socket that keeps what it receives and who sent it"""
+
+    def __init__(self):
+        self.transport = None
+        self.received = []
+        self.senders = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received.append(data)
+        self.senders.add(addr)
+
+
+async def open_endpoints(conditions, **options):
+    """
+    Returns: (proxy, server, client), the client sends to the proxy and the proxy to the server
+    """
+
+    loop = asyncio.get_running_loop()
+    _, server = await loop.create_datagram_endpoint(Endpoint, local_addr=("127.0.0.1", 0))
+    proxy = NetemProxy(server.transport.get_extra_info("sockname"), conditions, transport="udp", seed=1, **options)
+    await proxy.start()
+    _, client = await loop.create_datagram_endpoint(Endpoint, remote_addr=("127.0.0.1", proxy.port))
+    return proxy, server, client
+
+
+async def close_endpoints(proxy, server, client):
+    client.transport.close()
+    server.transport.close()
+    await proxy.stop()
+
+
+async def reliable_through_proxy():
+    conditions = Conditions(delay=0.01, jitter=0.005, loss=0.2, reorder=0.2, reorder_gap=0.01)
+    proxy, server, client = await open_endpoints(conditions)
+    try:
+        sender = UdpPeer(client.transport.sendto, resend=0.03)
+        # the server answers whichever proxy socket it heard from
+        receiver = UdpPeer(lambda packet: server.transport.sendto(packet, next(iter(server.senders))), resend=0.03)
+        messages = [protocol.encode_hit(i, i + 1) for i in range(60)]
+        for message in messages:
+            sender.send_reliable(message)
+
+        delivered = []
+        for _ in range(300):
+            await asyncio.sleep(0.01)
+            received, server.received = server.received, []
+            for packet in received:
+                delivered += [data for _, data in receiver.datagram_received(packet)]
+            received, client.received = client.received, []
+            for packet in received:
+                sender.datagram_received(packet)
+            if not sender.unacked:
+                break
+            sender.update()
+        return messages, delivered, sender, proxy.stats
+    finally:
+        await close_endpoints(proxy, server, client)
+
+
+def test_reliable_channel_through_delay_and_loss():
+    messages, delivered, sender, stats = asyncio.run(reliable_through_proxy())
+    assert delivered == messages
+    assert not sender.unacked
+    assert stats["lost"] and stats["reordered"] and sender.resent
+    assert stats["connections"] == 1
+
+
+async def burst_into_full_queue():
+    # 10 KB/s with room for 2000 bytes: 4 datagrams of 500 bytes fit, the rest of the burst is dropped
+    proxy, server, client = await open_endpoints(Conditions(bandwidth=10000, queue_size=2000))
+    try:
+        for i in range(10):
+            client.transport.sendto(bytes([i]) * 500)
+        await asyncio.sleep(0.4)
+        return server.received, proxy.stats
+    finally:
+        await close_endpoints(proxy, server, client)
+
+
+def test_full_queue_drops_datagrams():
+    received, stats = asyncio.run(burst_into_full_queue())
+    assert [data[0] for data in received] == [0, 1, 2, 3]
+    assert stats["forwarded"] == 4 and stats["lost"] == 6
+
+
+async def quiet_client():
+    proxy, server, client = await open_endpoints(Conditions(), idle_timeout=0.1)
+    try:
+        client.transport.sendto(b"hello")
+        await asyncio.sleep(0.05)
+        upstream, = proxy.udp.upstreams.values()
+        await asyncio.sleep(0.3)
+        expired = not proxy.udp.upstreams and upstream.transport.is_closing()
+        # the client comes back: a new upstream socket, the server sees a new address
+        client.transport.sendto(b"again")
+        await asyncio.sleep(0.05)
+        return expired, server.received, len(server.senders), proxy.stats
+    finally:
+        await close_endpoints(proxy, server, client)
+
+
+def test_idle_udp_client_expires():
+    expired, received, senders, stats = asyncio.run(quiet_client())
+    assert expired
+    assert received == [b"hello", b"again"]
+    assert senders == 2 and stats["connections"] == 2
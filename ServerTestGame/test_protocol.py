@@ -0,0 +1,84 @@
+import pytest
+import protocol
+
+# Regression tests of the framing: TCP hands FrameDecoder frames split and merged at any byte,
+# and a peer can always send a frame whose payload is too short for its type.
+#     python -m pytest test_protocol.py
+
+
+def sample_frames():
+    return [
+        protocol.encode_position(12, -34),
+        protocol.encode_input(7, protocol.KEY_LEFT | protocol.KEY_UP, 99),
+        protocol.encode_snapshot(5, [(1, (10, 20), (1, 2, 3)), (2, (30, 40), (4, 5, 6))], ack_seq=7),
+        protocol.encode_join_ready(),
+        protocol.encode_join_chunk(0, bytes(range(200))),
+    ]
+
+
+def expected(frames):
+    return protocol.split_frames(b"".join(frames))
+
+
+def test_byte_by_byte():
+    frames = sample_frames()
+    decoder = protocol.FrameDecoder()
+    received = []
+    for byte in b"".join(frames):
+        received += decoder.feed(bytes([byte]))
+    assert received == expected(frames)
+    assert not decoder.buffer
+
+
+@pytest.mark.parametrize("split", [1, 2, 3, 5, 8, 13, 64])
+def test_split_and_merged_reads(split):
+    frames = sample_frames()
+    data = b"".join(frames)
+    decoder = protocol.FrameDecoder()
+    received = []
+    for start in range(0, len(data), split):
+        received += decoder.feed(data[start:start + split])
+    assert received == expected(frames)
+
+
+def test_merged_frames_in_one_read():
+    frames = sample_frames()
+    assert protocol.FrameDecoder().feed(b"".join(frames)) == expected(frames)
+
+
+def test_partial_frame_waits_for_the_rest():
+    data = protocol.encode_input(1, protocol.KEY_DOWN)
+    decoder = protocol.FrameDecoder()
+    assert decoder.feed(data[:-1]) == []
+    assert decoder.feed(data[-1:]) == [(protocol.MSG_INPUT, data[protocol.HEADER.size:])]
+
+
+def test_decoded_messages():
+    (position, player_input, snapshot, _, _) = expected(sample_frames())
+    assert protocol.decode(*position) == (12, -34)
+    assert protocol.decode(*player_input) == {"seq": 7, "keys": protocol.KEY_LEFT | protocol.KEY_UP, "ack_tick": 99}
+    assert protocol.decode(*snapshot)["ack"] == 7
+
+
+@pytest.mark.parametrize("msg_type", sorted(protocol.DECODERS))
+def test_truncated_payloads(msg_type):
+    # every layout but the empty markers is at least one byte,
+    # an empty or cut payload is a ProtocolError, never struct.error
+    for payload in (b"", b"\x01"):
+        if msg_type in (protocol.MSG_JOIN_READY, protocol.MSG_JOIN_DONE) and not payload:
+            continue
+        with pytest.raises(protocol.ProtocolError):
+            protocol.decode(msg_type, payload)
+
+
+def test_truncated_split_frames():
+    data = protocol.encode_input(1, 0)
+    with pytest.raises(protocol.ProtocolError):
+        protocol.split_frames(data[:-1])
+    with pytest.raises(protocol.ProtocolError):
+        protocol.split_frames(data[:2])
+
+
+def test_unknown_type():
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode(255, b"")
@@ -0,0 +1,111 @@
+import random
+import protocol
+import rollback
+from rollback import RollbackSession
+
+# The invariant of rollback: whatever order and delay the remote inputs arrive with, once they
+# are all in, the session holds exactly the states of a straight simulation with the real inputs.
+#     python -m pytest test_rollback.py
+
+FRAMES = 600
+KEYS = (protocol.KEY_LEFT, protocol.KEY_RIGHT, protocol.KEY_UP, protocol.KEY_DOWN,
+        protocol.KEY_RIGHT | protocol.KEY_BOMB, protocol.KEY_DOWN | protocol.KEY_BOMB, 0)
+
+
+def random_inputs(rng, frames):
+    keys = bytearray()
+    current = 0
+    for _ in range(frames):
+        if rng.random() < 0.2:
+            current = rng.choice(KEYS)
+        keys.append(current)
+    return bytes(keys)
+
+
+def fields(state):
+    return tuple(getattr(state, name) for name in rollback.MatchState.__slots__)
+
+
+def straight(keys, frames):
+    states = [rollback.initial_state(seed=1)]
+    for frame in range(frames):
+        states.append(rollback.step(states[-1], (keys[0][frame], keys[1][frame])))
+    return states
+
+
+def test_late_inputs_resimulate_to_the_straight_states():
+    rng = random.Random(0)
+    keys = (random_inputs(rng, FRAMES), random_inputs(rng, FRAMES))
+    expected = straight(keys, FRAMES)
+    # bombs, broken walls and a dead player: every part of the state goes through rollbacks
+    assert expected[-1].walls != expected[0].walls and not all(p[2] for p in expected[-1].players)
+
+    session = RollbackSession(0, rollback.initial_state(seed=1))
+    received = 0
+    while session.frame < FRAMES:
+        # remote inputs come in bursts, from 1 to max_rollback frames late
+        if rng.random() < 0.3:
+            received = min(session.frame, received + rng.randint(1, 4))
+            session.add_remote_inputs(0, keys[1][:received])
+        if session.advance(keys[0][session.frame]):
+            frame = session.frame
+            if frame <= received:
+                assert fields(session.state) == fields(expected[frame])
+        else:
+            received = session.frame  # stalled: the other peer catches up
+            session.add_remote_inputs(0, keys[1][:received])
+    assert session.stats["rollbacks"] > 10
+
+    session.add_remote_inputs(0, keys[1])
+    if session.rollback_from is not None:
+        session.rollback()
+    assert fields(session.state) == fields(expected[FRAMES])
+    assert session.state.checksum() == expected[FRAMES].checksum()
+
+
+def test_two_peers_agree_through_a_lossy_relay():
+    rng = random.Random(5)
+    keys = (random_inputs(rng, FRAMES), random_inputs(rng, FRAMES))
+    peers = [RollbackSession(index, rollback.initial_state(seed=1)) for index in (0, 1)]
+    while min(peer.frame for peer in peers) < FRAMES:
+        for index, peer in enumerate(peers):
+            if peer.frame < FRAMES:
+                peer.advance(keys[index][peer.frame])
+            # half the messages are lost, every message repeats what was not acknowledged
+            if rng.random() < 0.5:
+                first, sent = peer.outgoing_inputs()
+                peers[1 - index].add_remote_inputs(first, sent, ack=peer.confirmed)
+    for index, peer in enumerate(peers):
+        peers[1 - index].add_remote_inputs(0, peer.inputs[index][:FRAMES])
+    for peer in peers:
+        if peer.rollback_from is not None:
+            peer.rollback()
+    expected = straight(keys, FRAMES)[FRAMES]
+    assert fields(peers[0].state) == fields(peers[1].state) == fields(expected)
+
+
+def test_correct_prediction_does_not_roll_back():
+    session = RollbackSession(0, rollback.initial_state(seed=1))
+    for _ in range(4):
+        session.advance(protocol.KEY_RIGHT)
+    session.add_remote_inputs(0, bytes(4))  # the other peer stood still, as predicted
+    session.advance(0)
+    assert session.stats["rollbacks"] == 0
+
+
+def test_waits_instead_of_rolling_back_too_far():
+    session = RollbackSession(0, rollback.initial_state(seed=1), max_rollback=4)
+    assert all(session.advance(0) for _ in range(4))
+    assert not session.advance(0)
+    assert session.frame == 4 and session.stats["stalls"] == 1
+    session.add_remote_inputs(0, bytes([protocol.KEY_LEFT]))
+    assert session.advance(0)
+
+
+def test_inputs_after_a_gap_are_refused():
+    session = RollbackSession(0, rollback.initial_state(seed=1))
+    assert not session.add_remote_inputs(2, bytes(3))
+    assert session.confirmed == 0
+    assert session.add_remote_inputs(0, bytes(3))
+    assert session.add_remote_inputs(1, bytes(4))  # overlapping repeat
+    assert session.confirmed == 5
@@ -0,0 +1,113 @@
+import asyncio
+import time
+import protocol
+import server
+from server import ClientConnection, GameServer, PlayerState
+
+# Send queues of TCP clients: snapshots are coalesced in the outbox instead of queued, and a
+# client is disconnected for a full queue or for staying behind, each counted on its own.
+#     python -m pytest test_server.py
+
+
+class FakeTransport:
+    def __init__(self):
+        self.aborted = False
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        pass
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def abort(self):
+        self.aborted = True
+
+
+class FakeWriter:
+    """StreamWriter stand-in, keeps every frame written"""
+
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def writelines(self, parts):
+        self.write(b"".join(parts))
+
+    async def drain(self):
+        pass
+
+
+def make_client(**options):
+    return ClientConnection(None, FakeWriter(), PlayerState(1, (0, 0), server.WHT), **options)
+
+
+def snapshot_parts(tick):
+    return protocol.encode_snapshot_shared(tick, [(1, (tick, 0), server.WHT)]), protocol.encode_trailer(0)
+
+
+def written_frames(client):
+    return protocol.split_frames(b"".join(client.writer.written))
+
+
+def test_snapshots_coalesce_behind_queued_messages():
+    async def run():
+        client = make_client()
+        client.send(protocol.encode_pong(1))
+        for tick in (1, 2, 3):
+            client.send_snapshot(snapshot_parts(tick))
+        writer = asyncio.create_task(client.writer_loop())
+        for _ in range(5):
+            await asyncio.sleep(0)
+        client.close()
+        await writer
+        return client
+
+    client = asyncio.run(run())
+    frames = written_frames(client)
+    # the queued message first, then only the newest snapshot
+    assert [msg_type for msg_type, _ in frames] == [protocol.MSG_PONG, protocol.MSG_SNAPSHOT]
+    assert protocol.decode_snapshot(frames[1][1])["tick"] == 3
+    assert client.dropped == 2
+    assert client.kick_reason is None
+
+
+def test_kick_when_the_queue_is_full():
+    client = make_client(queue_size=3)
+    for i in range(3):
+        client.send(protocol.encode_pong(i))
+    assert not client.writer.transport.aborted
+    client.send(protocol.encode_pong(3))
+    assert client.writer.transport.aborted
+    assert client.kick_cause == server.KICK_QUEUE_FULL
+    # snapshots never fill the queue, they replace each other
+    client = make_client(queue_size=3, max_lag=None)
+    for tick in range(100):
+        client.send_snapshot(snapshot_parts(tick))
+    assert client.kick_cause is None and client.queue_depth() == 1
+
+
+def test_kick_when_behind_for_too_long():
+    client = make_client(max_lag=0.01)
+    client.send_snapshot(snapshot_parts(1))
+    client.send_snapshot(snapshot_parts(2))  # first coalesced snapshot, behind from now
+    assert client.kick_cause is None
+    time.sleep(0.02)
+    client.send_snapshot(snapshot_parts(3))
+    assert client.kick_cause == server.KICK_LAG
+    assert client.writer.transport.aborted
+
+
+def test_disconnects_are_counted_by_cause():
+    game = GameServer("127.0.0.1", 0, listen=False, stats_interval=None)
+    for cause in (server.KICK_LAG, server.KICK_QUEUE_FULL, server.KICK_QUEUE_FULL, None):
+        client = make_client()
+        client.kick_cause = cause
+        client.kick_reason = cause
+        game.clients.add(client)
+        game.remove_client(client)
+    stats = game.stats()
+    assert stats["lag_disconnects"] == 1
+    assert stats["queue_full_disconnects"] == 2
@@ -0,0 +1,109 @@
+import protocol
+from snapshots import SnapshotHistory, SnapshotReceiver, diff
+
+# Delta compression round trips: whatever the server sends, full or delta, the client rebuilds
+# exactly the state the server encoded.
+#     python -m pytest test_snapshots.py
+
+RED, BLUE = (255, 0, 0), (0, 0, 255)
+
+
+def send(history, receiver, tick, state, ack_seq=0):
+    (msg_type, payload), = protocol.split_frames(history.encode(tick, state, ack_seq))
+    return msg_type, receiver.apply(msg_type, payload)
+
+
+def as_state(snapshot):
+    return {e["id"]: (e["position"][0], e["position"][1], e["color"]) for e in snapshot["entities"]}
+
+
+def test_diff_masks():
+    baseline = {1: (0, 0, RED), 2: (5, 5, RED), 3: (9, 9, RED)}
+    state = {1: (0, 0, RED), 2: (6, 5, BLUE), 4: (1, 2, RED)}
+    changed, removed = diff(baseline, state)
+    assert changed == [(2, protocol.FIELD_X | protocol.FIELD_COLOR, (6, 5), BLUE),
+                       (4, protocol.FIELD_ALL, (1, 2), RED)]
+    assert removed == [3]
+
+
+def test_full_snapshot_without_ack():
+    history = SnapshotHistory()
+    receiver = SnapshotReceiver()
+    state = {1: (10, 20, RED), 2: (-30, 40, BLUE)}
+    msg_type, snapshot = send(history, receiver, 1, state, ack_seq=9)
+    assert msg_type == protocol.MSG_SNAPSHOT
+    assert as_state(snapshot) == state
+    assert snapshot["tick"] == 1 and snapshot["ack"] == 9
+    # nothing acknowledged yet, the next one is full again
+    assert send(history, receiver, 2, state)[0] == protocol.MSG_SNAPSHOT
+
+
+def test_delta_against_acked_baseline():
+    history = SnapshotHistory()
+    receiver = SnapshotReceiver()
+    send(history, receiver, 1, {1: (10, 20, RED), 2: (30, 40, BLUE)})
+    history.ack(receiver.last_tick)
+    state = {1: (13, 20, RED), 2: (30, 40, BLUE), 3: (0, 0, RED)}
+    msg_type, snapshot = send(history, receiver, 2, state, ack_seq=4)
+    assert msg_type == protocol.MSG_DELTA
+    assert as_state(snapshot) == state
+    assert snapshot["tick"] == 2 and snapshot["ack"] == 4
+    # unchanged players cost nothing: the delta is smaller than the full snapshot
+    assert len(history.encode(3, state, 4)) < len(SnapshotHistory().encode(3, state, 4))
+
+
+def test_removed_entities():
+    history = SnapshotHistory()
+    receiver = SnapshotReceiver()
+    send(history, receiver, 1, {1: (0, 0, RED), 2: (5, 5, RED), 3: (9, 9, RED)})
+    history.ack(1)
+    msg_type, snapshot = send(history, receiver, 2, {2: (5, 5, RED)})
+    assert msg_type == protocol.MSG_DELTA
+    assert as_state(snapshot) == {2: (5, 5, RED)}
+
+
+def test_deltas_chain_over_many_acks():
+    history = SnapshotHistory()
+    receiver = SnapshotReceiver()
+    for tick in range(1, 50):
+        state = {player_id: (tick * player_id % 300, tick, RED) for player_id in range(1, 1 + tick % 5)}
+        _, snapshot = send(history, receiver, tick, state)
+        assert as_state(snapshot) == state
+        if tick % 3:  # some acks are lost
+            history.ack(receiver.last_tick)
+
+
+def test_unknown_baseline_is_not_applied():
+    # the client lost the baseline the server built the delta against
+    history = SnapshotHistory()
+    send(history, SnapshotReceiver(), 1, {1: (0, 0, RED)})
+    history.ack(1)
+    (msg_type, payload), = protocol.split_frames(history.encode(2, {1: (3, 0, RED)}, 0))
+    assert msg_type == protocol.MSG_DELTA
+    assert SnapshotReceiver().apply(msg_type, payload) is None
+
+
+def test_evicted_baseline_falls_back_to_full():
+    history = SnapshotHistory(size=4)
+    receiver = SnapshotReceiver()
+    send(history, receiver, 1, {1: (0, 0, RED)})
+    # the client acknowledges a tick the server no longer has: the ack is ignored
+    for tick in range(2, 8):
+        send(history, receiver, tick, {1: (tick, 0, RED)})
+    history.ack(1)
+    assert history.acked_tick == 0
+    msg_type, snapshot = send(history, receiver, 8, {1: (8, 0, RED)})
+    assert msg_type == protocol.MSG_SNAPSHOT
+    assert as_state(snapshot) == {1: (8, 0, RED)}
+
+
+def test_old_acks_do_not_move_the_baseline_back():
+    history = SnapshotHistory()
+    receiver = SnapshotReceiver()
+    for tick in (1, 2, 3):
+        send(history, receiver, tick, {1: (tick, 0, RED)})
+    history.ack(3)
+    history.ack(2)  # late, reordered input
+    assert history.acked_tick == 3
+    (msg_type, payload), = protocol.split_frames(history.encode(4, {1: (4, 0, RED)}, 0))
+    assert protocol.decode_delta(payload)["baseline"] == 3
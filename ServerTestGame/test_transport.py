@@ -0,0 +1,211 @@
+import asyncio
+import socket
+import struct
+import pytest
+import protocol
+import transport
+from server import GameServer
+from transport import UdpPeer
+
+# The UDP transport on loopback: the server handshake, the reliable ordered channel through a
+# link that loses and reorders datagrams, and what a peer does with duplicate, stale,
+# malformed or missing packets.
+#     python -m pytest test_transport.py
+
+
+def data_packet(channel, seq, data=b""):
+    return transport.PACKET_HEADER.pack(transport.PKT_DATA, channel) + transport.SEQUENCE.pack(seq) + data
+
+
+def ack_of(packet):
+    assert packet[0] == transport.PKT_ACK
+    return transport.ACK.unpack_from(packet, transport.PACKET_HEADER.size)
+
+
+class LossyLink:
+    """
+    One direction of a UDP link on 127.0.0.1 that drops and reorders datagrams by a fixed pattern
+    Of every `period` datagrams, the first is dropped and the second is held back until the next one went out.
+    """
+
+    def __init__(self, sock, addr, period=4):
+        self.sock = sock
+        self.addr = addr
+        self.period = period
+        self.count = 0
+        self.held = None
+        self.dropped = 0
+
+    def send(self, packet):
+        self.count += 1
+        step = self.count % self.period
+        if step == 1:
+            self.dropped += 1
+            return
+        if step == 2 and self.held is None:
+            self.held = packet
+            return
+        self.sock.sendto(packet, self.addr)
+        if self.held is not None:
+            self.sock.sendto(self.held, self.addr)
+            self.held = None
+
+
+def receive_all(sock, peer):
+    delivered = []
+    while True:
+        try:
+            packet = sock.recv(transport.MAX_DATAGRAM)
+        except BlockingIOError:
+            return delivered
+        delivered += [data for _, data in peer.datagram_received(packet)]
+
+
+@pytest.fixture
+def socket_pair():
+    sockets = []
+    for _ in range(2):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.setblocking(False)
+        sockets.append(sock)
+    yield sockets
+    for sock in sockets:
+        sock.close()
+
+
+def test_reliable_ordered_through_loss_and_reordering(socket_pair):
+    a, b = socket_pair
+    a_link = LossyLink(a, b.getsockname())
+    b_link = LossyLink(b, a.getsockname())
+    # resend=0: every update() resends what is not acknowledged yet
+    sender = UdpPeer(a_link.send, resend=0)
+    receiver = UdpPeer(b_link.send, resend=0)
+    messages = [protocol.encode_hit(i, i + 1) for i in range(60)]
+    for message in messages:
+        sender.send_reliable(message)
+
+    delivered = []
+    for _ in range(200):
+        delivered += receive_all(b, receiver)
+        receive_all(a, sender)
+        if not sender.unacked:
+            break
+        sender.update()
+        receiver.update()
+    assert delivered == messages
+    assert not sender.unacked
+    assert a_link.dropped and b_link.dropped and sender.resent
+
+
+def test_unreliable_drops_duplicate_and_stale():
+    peer = UdpPeer(lambda packet: None)
+    received = []
+    for seq in (1, 3, 3, 2, 4):
+        received += peer.datagram_received(data_packet(transport.CHANNEL_UNRELIABLE, seq, bytes([seq])))
+    assert received == [(transport.CHANNEL_UNRELIABLE, bytes([seq])) for seq in (1, 3, 4)]
+    assert peer.dropped == 2
+
+
+def test_reliable_delivers_once_and_in_order():
+    sent = []
+    peer = UdpPeer(sent.append)
+    received = []
+    for seq in (3, 1, 1, 2, 3, 4):
+        received += peer.datagram_received(data_packet(transport.CHANNEL_RELIABLE, seq, bytes([seq])))
+    assert received == [(transport.CHANNEL_RELIABLE, bytes([seq])) for seq in (1, 2, 3, 4)]
+    # every reliable packet is acknowledged, duplicates too, in case the first ack was lost
+    assert len(sent) == 6
+    assert ack_of(sent[0]) == (1, 0b10)  # 1 missing, 3 (bit 1: 1 + 1 + 1) early
+    assert ack_of(sent[-1]) == (5, 0)
+
+
+def test_acks_clear_unacked():
+    sent = []
+    peer = UdpPeer(sent.append)
+    for i in range(4):
+        peer.send_reliable(bytes([i]))
+    header = transport.PACKET_HEADER.pack(transport.PKT_ACK, transport.CHANNEL_RELIABLE)
+    # 1 arrived, 2 lost, 3 and 4 arrived early
+    peer.datagram_received(header + transport.ACK.pack(2, 0b11))
+    assert list(peer.unacked) == [2]
+    # malformed acks are ignored
+    peer.datagram_received(header + transport.ACK.pack(5, 0)[:5])
+    peer.datagram_received(header + transport.ACK.pack(5, 0) + b"x")
+    assert list(peer.unacked) == [2]
+    peer.datagram_received(header + transport.ACK.pack(5, 0))
+    assert not peer.unacked
+
+
+def test_keepalive_and_timeout():
+    sent = []
+    peer = UdpPeer(sent.append, timeout=5.0, keepalive=1.0)
+    start = peer.last_received
+    assert peer.update(start + 0.5)
+    assert not sent
+    assert peer.update(start + 1.5)
+    assert sent[-1][0] == transport.PKT_KEEPALIVE
+    assert not peer.update(start + 5.5)
+    # any packet keeps the connection alive, a disconnect ends it
+    peer.datagram_received(transport.PACKET_HEADER.pack(transport.PKT_KEEPALIVE, 0))
+    assert peer.update()
+    peer.datagram_received(transport.PACKET_HEADER.pack(transport.PKT_DISCONNECT, 0))
+    assert peer.closed and not peer.update()
+
+
+def test_parse_handshake_rejects_bad_packets():
+    good = transport.handshake_packet(transport.PKT_CONNECT, 42)
+    assert transport.parse_handshake(good) == (transport.PKT_CONNECT, 42)
+    with pytest.raises(protocol.ProtocolError):
+        transport.parse_handshake(good[:-1])
+    other_version = transport.PACKET_HEADER.pack(transport.PKT_CONNECT, 0) + transport.HANDSHAKE.pack(
+        protocol.PROTOCOL_VERSION + 1, 42)
+    with pytest.raises(protocol.ProtocolError):
+        transport.parse_handshake(other_version)
+
+
+async def receive(loop, sock, seconds=2.0):
+    return await asyncio.wait_for(loop.sock_recv(sock, transport.MAX_DATAGRAM), seconds)
+
+
+async def handshake():
+    game = GameServer("127.0.0.1", 0, transport="udp", stats_interval=None)
+    await game.start()
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    try:
+        sock.connect(("127.0.0.1", game.port))
+        # another protocol version gets no answer
+        sock.send(transport.PACKET_HEADER.pack(transport.PKT_CONNECT, 0) + struct.pack("!BI", 0, 7))
+        with pytest.raises(asyncio.TimeoutError):
+            await receive(loop, sock, 0.2)
+
+        connect = transport.handshake_packet(transport.PKT_CONNECT, 7)
+        sock.send(connect)
+        accept = await receive(loop, sock)
+        # our ACCEPT was lost: a repeated CONNECT is answered again and does not take a second slot
+        sock.send(connect)
+        accept_again = await receive(loop, sock)
+        while accept_again[0] != transport.PKT_ACCEPT:
+            accept_again = await receive(loop, sock)
+
+        peer = UdpPeer(sock.send)
+        welcome = None
+        while welcome is None:
+            for _, data in peer.datagram_received(await receive(loop, sock)):
+                for msg_type, payload in protocol.split_frames(data):
+                    if msg_type == protocol.MSG_WELCOME:
+                        welcome = protocol.decode_welcome(payload)
+        return accept, accept_again, welcome, len(game.udp.clients)
+    finally:
+        sock.close()
+        await game.stop()
+
+
+def test_server_handshake():
+    accept, accept_again, welcome, clients = asyncio.run(handshake())
+    assert transport.parse_handshake(accept) == (transport.PKT_ACCEPT, 7)
+    assert transport.parse_handshake(accept_again) == (transport.PKT_ACCEPT, 7)
+    assert welcome["id"] == 1
+    assert clients == 1
@@ -0,0 +1,214 @@
+import struct
+import time
+import protocol
+
+# UDP transport with two channels on top of plain datagrams
+#
+# Every datagram starts with [packet type: uint8][channel: uint8]
+#   CONNECT / ACCEPT   handshake, carry the protocol version and a connection token
+#   DATA               [sequence: uint32] + protocol frames
+#   ACK                [next expected reliable sequence: uint32][bitfield of the 32 after it: uint32]
+#   KEEPALIVE          nothing, keeps the connection from timing out
+#   DISCONNECT         nothing, the peer is leaving
+#
+# Channels
+#   CHANNEL_UNRELIABLE  unreliable sequenced: snapshots and inputs. Lost packets are not resent,
+#                       packets older than the newest one received are dropped.
+#   CHANNEL_RELIABLE    reliable ordered: welcome and game events (bombs, walls ...). Resent until
+#                       acknowledged and delivered in order, each message in its own datagram.
+
+PKT_CONNECT = 1
+PKT_ACCEPT = 2
+PKT_DATA = 3
+PKT_ACK = 4
+PKT_KEEPALIVE = 5
+PKT_DISCONNECT = 6
+
+CHANNEL_UNRELIABLE = 0
+CHANNEL_RELIABLE = 1
+
+PACKET_HEADER = struct.Struct("!BB")  # packet type, channel
+HANDSHAKE = struct.Struct("!BI")      # protocol version, connection token
+SEQUENCE = struct.Struct("!I")
+ACK = struct.Struct("!II")            # next expected sequence, bitfield of received sequences after it
+
+MAX_DATAGRAM = 65507
+ACK_BITS = 32
+
+
+def handshake_packet(packet_type, token):
+    return PACKET_HEADER.pack(packet_type, 0) + HANDSHAKE.pack(protocol.PROTOCOL_VERSION, token)
+
+
+def parse_handshake(packet):
+    """
+    Returns: tuple (packet type, token)
+    Raises: protocol.ProtocolError on a bad packet or another protocol version
+    """
+
+    if len(packet) != PACKET_HEADER.size + HANDSHAKE.size:
+        raise protocol.ProtocolError("Bad handshake packet")
+    packet_type = packet[0]
+    version, token = HANDSHAKE.unpack_from(packet, PACKET_HEADER.size)
+    if version != protocol.PROTOCOL_VERSION:
+        raise protocol.ProtocolError(f"Protocol version mismatch: peer {version}, ours {protocol.PROTOCOL_VERSION}")
+    return packet_type, token
+
+
+class UdpPeer:
+    """
+    Channel state for one UDP connection, used by both the server and the client
+
+    Args:
+        send_datagram (callable): Function that sends one datagram to the other side
+        timeout (float, optional): Seconds without any packet before the connection is dead. Defaults to 5.
+        keepalive (float, optional): Send a keepalive after this many idle seconds. Defaults to 1.
+        resend (float, optional): Seconds before an unacknowledged reliable message is resent. Defaults to 0.1.
+        send_datagram_parts (callable, optional): Function that sends one datagram given as a list of
+            bytes-like parts (sendmsg), used by send_unreliable_parts. Defaults to joining the parts.
+    """
+
+    def __init__(self, send_datagram, timeout=5.0, keepalive=1.0, resend=0.1, send_datagram_parts=None):
+        self.send_datagram = send_datagram
+        self.send_datagram_parts = send_datagram_parts
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.resend = resend
+
+        now = time.monotonic()
+        self.last_received = now
+        self.last_sent = now
+        self.closed = False
+
+        # unreliable sequenced channel
+        self.unreliable_out = 0
+        self.unreliable_in = 0  # newest sequence received
+
+        # reliable ordered channel
+        self.reliable_out = 0
+        self.unacked = {}  # sequence -> [packet, last sent time]
+        self.reliable_next = 1  # next sequence to deliver
+        self.reliable_early = {}  # sequence -> payload received before reliable_next
+
+        self.resent = 0
+        self.dropped = 0  # unreliable packets dropped as old or duplicate
+
+    def send_packet(self, packet):
+        if len(packet) > MAX_DATAGRAM:
+            raise protocol.ProtocolError(f"Datagram too large: {len(packet)} bytes")
+        self.send_datagram(packet)
+        self.last_sent = time.monotonic()
+
+    def send_unreliable(self, data):
+        self.unreliable_out += 1
+        self.send_packet(PACKET_HEADER.pack(PKT_DATA, CHANNEL_UNRELIABLE) + SEQUENCE.pack(self.unreliable_out) + data)
+
+    def send_unreliable_parts(self, parts):
+        # same as send_unreliable(b"".join(parts)) without copying the parts into one buffer
+        self.unreliable_out += 1
+        header = PACKET_HEADER.pack(PKT_DATA, CHANNEL_UNRELIABLE) + SEQUENCE.pack(self.unreliable_out)
+        if self.send_datagram_parts is None:
+            self.send_packet(header + b"".join(parts))
+            return
+        size = len(header) + sum(len(part) for part in parts)
+        if size > MAX_DATAGRAM:
+            raise protocol.ProtocolError(f"Datagram too large: {size} bytes")
+        self.send_datagram_parts([header, *parts])
+        self.last_sent = time.monotonic()
+
+    def send_reliable(self, data):
+        self.reliable_out += 1
+        packet = PACKET_HEADER.pack(PKT_DATA, CHANNEL_RELIABLE) + SEQUENCE.pack(self.reliable_out) + data
+        self.unacked[self.reliable_out] = [packet, time.monotonic()]
+        self.send_packet(packet)
+
+    def send_ack(self):
+        bits = 0
+        for i in range(ACK_BITS):
+            if self.reliable_next + 1 + i in self.reliable_early:
+                bits |= 1 << i
+        self.send_packet(PACKET_HEADER.pack(PKT_ACK, CHANNEL_RELIABLE) + ACK.pack(self.reliable_next, bits))
+
+    def disconnect(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.send_packet(PACKET_HEADER.pack(PKT_DISCONNECT, 0))
+            except OSError:
+                pass
+
+    def datagram_received(self, packet):
+        """
+        Process one datagram from the other side
+        Args:
+            packet (bytes): The datagram
+        Returns: list of (channel, data) ready for the game, data holds protocol frames
+        """
+
+        if len(packet) < PACKET_HEADER.size:
+            return []
+        self.last_received = time.monotonic()
+        packet_type, channel = PACKET_HEADER.unpack_from(packet, 0)
+        body = PACKET_HEADER.size
+
+        if packet_type == PKT_DISCONNECT:
+            self.closed = True
+            return []
+
+        if packet_type == PKT_ACK:
+            if len(packet) != body + ACK.size:
+                return []  # malformed, dropped like any lost packet
+            next_expected, bits = ACK.unpack_from(packet, body)
+            for seq in [s for s in self.unacked if s < next_expected]:
+                del self.unacked[seq]
+            for i in range(ACK_BITS):
+                if bits & (1 << i):
+                    self.unacked.pop(next_expected + 1 + i, None)
+            return []
+
+        if packet_type != PKT_DATA or len(packet) < body + SEQUENCE.size:
+            return []  # keepalive, late handshake packets ...
+        (seq,) = SEQUENCE.unpack_from(packet, body)
+        data = packet[body + SEQUENCE.size:]
+
+        if channel == CHANNEL_UNRELIABLE:
+            if seq <= self.unreliable_in:
+                self.dropped += 1
+                return []
+            self.unreliable_in = seq
+            return [(channel, data)]
+
+        # reliable: always ack, deliver everything that is now in order
+        delivered = []
+        if seq == self.reliable_next:
+            delivered.append((channel, data))
+            self.reliable_next += 1
+            while self.reliable_next in self.reliable_early:
+                delivered.append((channel, self.reliable_early.pop(self.reliable_next)))
+                self.reliable_next += 1
+        elif seq > self.reliable_next:
+            self.reliable_early[seq] = data
+        self.send_ack()
+        return delivered
+
+    def update(self, now=None):
+        """
+        Resend reliable messages, send keepalives and check the timeout
+        Call it a few times per second (every server tick is fine)
+        Returns: False when the connection is dead or closed
+        """
+
+        if self.closed:
+            return False
+        if now is None:
+            now = time.monotonic()
+        if now - self.last_received > self.timeout:
+            return False
+        for entry in self.unacked.values():
+            if now - entry[1] >= self.resend:
+                self.send_packet(entry[0])
+                entry[1] = now
+                self.resent += 1
+        if now - self.last_sent >= self.keepalive:
+            self.send_packet(PACKET_HEADER.pack(PKT_KEEPALIVE, 0))
+        return True
@@ -0,0 +1,488 @@
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict
+import pygame
+
+# Shared asset cache for every sprite loader in the repo
+#
+# Decoded, converted, scaled and flipped surfaces are kept by what was asked for
+# (path, frames, scale, flip), so the same sheet or prop image is decoded once however many
+# sprites use it. The decoded file itself is cached too when it is small next to the budget,
+# so a scaled or flipped variant of a file already loaded costs a transform and no decode.
+# Big sheets (the Reaper sheets decode to 40-60 MB each) are only kept in their scaled form,
+# keeping the full size decode would evict everything else.
+# Surfaces handed out are shared: blit them, never draw on them.
+#
+# A bundle (build_bundle.py) holds the pixels of the surfaces a game used, already scaled,
+# flipped and in the display format. cache.mount(BUNDLE_FILE) memory-maps it and assets found
+# in it become surfaces over the mapped pixels (pygame.image.frombuffer): no decode, no copy.
+# The map is copy-on-write (mmap.ACCESS_COPY): SDL writes straight into surface pixels, on a
+# read-only map a fill() or blit onto a bundle surface would crash the process. A page is only
+# copied when something draws on it, and the file itself is never changed.
+# Each entry records the mtime and size of its PNG, an entry whose PNG changed since is skipped.
+# Anything missing from the bundle, or stale, is loaded from the PNGs as usual.
+#
+# The scripts in Map/, Player/, Bombs/ and GamePrototypeDienix/ run from their own folder, they
+# import this module through the assets.py of that folder, which puts the repo root on sys.path.
+
+DEFAULT_BUDGET = 64 * 1024 * 1024  # bytes of pixel data kept before the least recently used asset goes
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUNDLE_FILE = os.path.join(ROOT, "assets.bundle")
+BUNDLE_MAGIC = b"PGAB"
+BUNDLE_VERSION = 2
+BUNDLE_HEADER = struct.Struct("<4sIII")  # magic, version, index bytes, offset of the pixel data
+BUNDLE_FORMAT = "BGRA"  # byte order of convert_alpha() surfaces on little endian machines, blits need no conversion
+BUNDLE_ALIGN = 64  # every surface starts on a cache line
+
+
+def surface_bytes(value):
+    """
+    Pixel memory of a surface or a list of surfaces
+    Subsurfaces count as their own size, so a sheet cut into frames is counted twice at most.
+    """
+
+    if isinstance(value, pygame.Surface):
+        return value.get_width() * value.get_height() * value.get_bytesize()
+    return sum(surface_bytes(item) for item in value)
+
+
+class AssetCache:
+    """
+    LRU cache of pygame surfaces with a memory budget
+
+    Args:
+        budget (int, optional): Bytes of pixel data kept, least recently used assets are dropped
+            above it. Defaults to DEFAULT_BUDGET.
+    Attributes:
+        hits (int): Requests answered from the cache
+        misses (int): Requests that had to build the asset
+        decodes (int): Image files decoded from disk
+        evictions (int): Assets dropped to stay in the budget
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()  # key -> (asset, bytes), least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.decodes = 0
+        self.evictions = 0
+        self.listings = {}  # folder -> sorted .png file names
+        self.bundle = None  # AssetBundle, see mount()
+        self.bundle_hits = 0
+        self.used_files = set()  # keys of decoded files handed out as they are, see save_bundle()
+
+    def get(self, key, build, max_size=None):
+        """
+        Cached asset for key, build() makes it on a miss
+        Args:
+            key (tuple): Everything the asset depends on
+            build (callable): Returns the asset, a surface or a list of surfaces
+            max_size (int, optional): Bytes above which the asset is returned but not kept.
+                Defaults to the whole budget.
+        Returns: the asset
+        """
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        asset = self.bundle.get(key) if self.bundle is not None else None
+        if asset is None:
+            asset = build()
+        else:
+            self.bundle_hits += 1
+        size = surface_bytes(asset)
+        if size > (self.budget if max_size is None else max_size):
+            return asset
+        self.entries[key] = (asset, size)
+        self.size += size
+        while self.size > self.budget and len(self.entries) > 1:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+        return asset
+
+    def decoded(self, fullname, alpha=True):
+        """
+        The file as it is on disk, converted to the display format when there is a display
+        Raises: FileNotFoundError when the file is missing
+        """
+
+        def build():
+            self.decodes += 1
+            image = pygame.image.load(fullname)
+            if pygame.display.get_surface() is None:
+                return image
+            return image.convert_alpha() if alpha else image.convert()
+
+        return self.get(("file", fullname, alpha), build, self.budget // 8)
+
+    def image(self, fullname, scale=None, size=None, flipped=False, height=None):
+        """
+        One image, optionally scaled and flipped
+        Args:
+            fullname (str): Path of the image
+            scale (float, optional): Factor for both sides, sizes are rounded down. Defaults to None.
+            size (tuple, optional): (width, height) to scale to, instead of scale. Defaults to None.
+            flipped (bool, optional): Mirror horizontally. Defaults to False.
+            height (int, optional): Height to scale to keeping the aspect ratio, instead of scale.
+                Defaults to None.
+        Returns: pygame.Surface, shared with every other caller
+        """
+
+        def build():
+            image = self.decoded(fullname)
+            target = size
+            if scale is not None:
+                target = (int(image.get_width() * scale), int(image.get_height() * scale))
+            if height is not None:
+                target = (int(image.get_width() * height / image.get_height()), height)
+            if target is not None:
+                image = pygame.transform.scale(image, target)
+            if flipped:
+                image = pygame.transform.flip(image, True, False)
+            return image
+
+        if scale is None and size is None and height is None and not flipped:
+            self.used_files.add(("file", fullname, True))
+            return self.decoded(fullname)
+        return self.get(("image", fullname, scale, size, flipped, height), build)
+
+    def sprite_sheet(self, fullname, num_frames=1, scale_to_height=None, flipped=False):
+        """
+        Frames of a horizontal strip, each scaled to a height (keeping aspect ratio) and flipped
+        Flipped frames are mirrored from the cached unflipped ones, the sheet is not decoded again.
+        Returns: list of pygame.Surface, shared with every other caller
+        """
+
+        def build_flipped():
+            frames = self.sprite_sheet(fullname, num_frames, scale_to_height)
+            return [pygame.transform.flip(frame, True, False) for frame in frames]
+
+        def build():
+            sheet = self.decoded(fullname)
+            frame_width = sheet.get_width() // num_frames
+            frame_height = sheet.get_height()
+            frames = []
+            for i in range(num_frames):
+                frame = sheet.subsurface(pygame.Rect(i * frame_width, 0, frame_width, frame_height))
+                if scale_to_height is not None:
+                    new_width = int(frame_width * scale_to_height / frame_height)
+                    frame = pygame.transform.scale(frame, (new_width, scale_to_height))
+                frames.append(frame)
+            return frames
+
+        return self.get(("sheet", fullname, num_frames, scale_to_height, flipped), build_flipped if flipped else build)
+
+    def png_files(self, folder):
+        """Sorted .png names in a folder, the folder is listed once"""
+
+        files = self.listings.get(folder)
+        if files is None:
+            files = sorted(f for f in os.listdir(folder) if f.endswith(".png"))
+            self.listings[folder] = files
+        return files
+
+    def mount(self, filename=BUNDLE_FILE):
+        """
+        Serve assets from a bundle written by save_bundle()
+        Returns: True if mounted, False if the file is missing or not a bundle of this version
+        """
+
+        try:
+            self.bundle = AssetBundle(filename)
+        except FileNotFoundError:
+            return False
+        except ValueError as e:
+            print(f"Cannot mount {filename}: {e}")
+            return False
+        return True
+
+    def save_bundle(self, filename=BUNDLE_FILE):
+        """
+        Write the cached assets the game used to a bundle, for the next run to mount()
+        Decoded files only kept to derive scaled or flipped surfaces from are left out, a
+        1024 px tile shown at 38 px would otherwise take 4 MB of the bundle for nothing.
+        Returns: number of assets written
+        """
+
+        return write_bundle(filename, ((key, asset) for key, (asset, _) in self.entries.items()
+                                if key[0] != "file" or key in self.used_files))
+
+    def stats(self):
+        """
+        Returns: dict with hits, misses, decodes, bundle hits, stale bundle entries skipped, evictions,
+            entries and bytes kept
+        """
+
+        return {"hits": self.hits, "misses": self.misses, "decodes": self.decodes, "bundle_hits": self.bundle_hits,
+                "bundle_stale": self.bundle.stale if self.bundle is not None else 0,
+                "evictions": self.evictions, "entries": len(self.entries), "bytes": self.size}
+
+    def clear(self):
+        self.entries.clear()
+        self.listings.clear()
+        self.used_files.clear()
+        self.size = 0
+
+
+def bundle_key(key):
+    # the key of an asset in a bundle: its cache key with the path relative to the repo root,
+    # so a bundle built on one machine matches r"Map\map_tiles_assets" paths on another
+    kind, fullname, *rest = key
+    path = os.path.relpath(os.path.abspath(fullname.replace("\\", "/")), ROOT).replace(os.sep, "/")
+    return repr((kind, path) + tuple(rest))
+
+
+def source_stamp(key):
+    # [mtime in ns, size] of the file an asset was made from, None when it is missing
+    try:
+        stat = os.stat(key[1].replace("\\", "/"))
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def write_bundle(filename, assets):
+    """
+    Args:
+        filename (str): Bundle to write, replaced atomically
+        assets (iterable): (cache key, surface or list of surfaces)
+    Returns: number of assets written
+
+    Layout: BUNDLE_HEADER, the JSON index (bundle key -> list flag, source_stamp() of the PNG
+    and (offset, width, height) of each surface), then the pixels of every surface in
+    BUNDLE_FORMAT, BUNDLE_ALIGN aligned.
+    """
+
+    index = {}
+    pixels = []
+    offset = 0
+    for key, asset in assets:
+        surfaces = [asset] if isinstance(asset, pygame.Surface) else asset
+        records = []
+        for surface in surfaces:
+            data = pygame.image.tobytes(surface, BUNDLE_FORMAT)
+            records.append((offset, surface.get_width(), surface.get_height()))
+            pixels.append(data)
+            pixels.append(bytes(-len(data) % BUNDLE_ALIGN))
+            offset += len(data) + len(pixels[-1])
+        index[bundle_key(key)] = {"list": not isinstance(asset, pygame.Surface), "source": source_stamp(key),
+                                  "surfaces": records}
+    index_data = json.dumps(index).encode()
+    start = BUNDLE_HEADER.size + len(index_data)
+    start += -start % BUNDLE_ALIGN
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(index_data), start))
+        file.write(index_data)
+        file.write(bytes(start - BUNDLE_HEADER.size - len(index_data)))
+        file.writelines(pixels)
+    os.replace(temporary, filename)
+    return len(index)
+
+
+class AssetBundle:
+    """
+    Read side of a bundle, the file stays mapped while any of its surfaces is alive
+    Mapped copy-on-write, drawing on a surface changes this process's copy of its pages only.
+
+    Args:
+        filename (str): Bundle written by write_bundle()
+    Raises: FileNotFoundError when missing, ValueError when not a bundle of this version
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)  # the map outlives the file
+        if len(self.map) < BUNDLE_HEADER.size:
+            raise ValueError("file too short")
+        magic, version, index_size, self.start = BUNDLE_HEADER.unpack_from(self.map, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError(f"not a version {BUNDLE_VERSION} bundle")
+        self.index = json.loads(self.map[BUNDLE_HEADER.size:BUNDLE_HEADER.size + index_size])
+        self.view = memoryview(self.map)
+        self.stale = 0  # entries skipped because their PNG changed since the bundle was built
+
+    def get(self, key):
+        """
+        Returns: the asset as the cache would have built it, surfaces over the mapped pixels,
+            None if the bundle does not have it or its PNG changed since the bundle was built
+        """
+
+        entry = self.index.get(bundle_key(key))
+        if entry is None:
+            return None
+        if entry["source"] is None or entry["source"] != source_stamp(key):
+            self.stale += 1
+            return None
+        surfaces = []
+        for offset, width, height in entry["surfaces"]:
+            start = self.start + offset
+            pixels = self.view[start:start + width * height * 4]
+            surfaces.append(pygame.image.frombuffer(pixels, (width, height), BUNDLE_FORMAT))
+        return surfaces if entry["list"] else surfaces[0]
+
+
+cache = AssetCache()  # shared by every loader of the process
+
+
+def load_sprite_sheet(path, spritesheet_file, num_frames=1, scale_to_height=None, flipped=False):
+    """
+    Load image frames and return image object
+
+    Args:
+        path (str): Path to the spritesheet directory
+        spritesheet_file (str): Filename of the spritesheet
+        num_frames (int, optional): Number of frames in the spritesheet. Defaults to 1.
+        scale_to_height (int, optional): Height to scale frames to. Defaults to None.
+        flipped (bool, optional): Whether to flip frames horizontally. Defaults to False.
+        Returns: List of pygame.Surface objects representing the frames,
+            a single pygame.Surface when num_frames is 1
+    """
+
+    fullname = os.path.join(path, spritesheet_file)
+    try:
+        if num_frames == 1:
+            # a single frame needs no subsurface, like the old loaders
+            return cache.image(fullname, flipped=flipped, height=scale_to_height)
+        return list(cache.sprite_sheet(fullname, num_frames, scale_to_height, flipped))
+    except FileNotFoundError:
+        print(f"Cannot load image: {fullname}")
+        raise SystemExit
+
+
+class Animations(dict):
+    """
+    Frames of a character by direction then state: animations["left"]["idle"][frame]
+
+    "right" is loaded from the sheets, "left" is mirrored from it the first time a sprite
+    turns left, so a character that never does costs half the memory and no flip.
+
+    Args:
+        path (str): Path to the spritesheet directory
+        sheets (dict): state -> (spritesheet file, number of frames)
+        scale_to_height (int, optional): Height to scale frames to. Defaults to None.
+    """
+
+    def __init__(self, path, sheets, scale_to_height=None):
+        super().__init__()
+        self.path = path
+        self.sheets = sheets
+        self.scale_to_height = scale_to_height
+        self["right"] = self.load(flipped=False)
+
+    def load(self, flipped):
+        return {state: load_sprite_sheet(self.path, file, num_frames, self.scale_to_height, flipped)
+                for state, (file, num_frames) in self.sheets.items()}
+
+    def __missing__(self, direction):
+        if direction != "left":
+            raise KeyError(direction)
+        self["left"] = self.load(flipped=True)
+        return self["left"]
+
+    def offset(self, direction, state, index):
+        """Returns: (x, y) of a frame in the untrimmed frame, frames of a sheet are never trimmed"""
+
+        return (0, 0)
+
+    def size(self, state):
+        """Returns: (width, height) of the frames of a state"""
+
+        return self["right"][state][0].get_size()
+
+
+class Atlas:
+    """
+    Pages and manifest written by GamePrototypeDienix/png_combiner.make_atlas
+
+    Each page is decoded once (through the cache), frames are subsurfaces of it, so a whole
+    character or prop set costs a few file loads. Frames are trimmed to their visible pixels:
+    blit a frame at the untrimmed position + offsets(region)[i] to draw it where it was.
+
+    Args:
+        manifest (str): Path of the .json manifest, the pages are next to it
+    Raises: FileNotFoundError when the manifest or a page is missing
+    """
+
+    def __init__(self, manifest):
+        with open(manifest) as file:
+            data = json.load(file)
+        folder = os.path.dirname(manifest)
+        self.pages = [cache.decoded(os.path.join(folder, page)) for page in data["pages"]]
+        self.regions = data["regions"]
+
+    def frames(self, region):
+        """Returns: list of pygame.Surface, subsurfaces of the pages, shared with every other caller"""
+
+        return [self.pages[frame["page"]].subsurface(frame["rect"]) for frame in self.regions[region]]
+
+    def offsets(self, region):
+        """Returns: list of (x, y), where each trimmed frame sat in the untrimmed one"""
+
+        return [tuple(frame["offset"]) for frame in self.regions[region]]
+
+    def size(self, region):
+        """Returns: (width, height) of the untrimmed frames of a region"""
+
+        return tuple(self.regions[region][0]["size"])
+
+
+class AtlasAnimations(dict):
+    """
+    Animations with the frames taken from an Atlas instead of spritesheets
+
+    Used like Animations: animations["left"]["idle"][frame], "left" is mirrored on the first
+    turn. The frames are trimmed, draw frame i of a state at the untrimmed position plus
+    offset(direction, state, i).
+
+    Args:
+        atlas (Atlas): The atlas, one region per state
+        states (iterable): Names of the states, each is the name of its region in the atlas
+    """
+
+    def __init__(self, atlas, states):
+        super().__init__()
+        self.atlas = atlas
+        self["right"] = {state: atlas.frames(state) for state in states}
+        self.offsets = {"right": {state: atlas.offsets(state) for state in states}}
+
+    def __missing__(self, direction):
+        if direction != "left":
+            raise KeyError(direction)
+        self["left"] = {state: [pygame.transform.flip(frame, True, False) for frame in frames]
+                        for state, frames in self["right"].items()}
+        # mirrored, the trimmed rect sits as far from the right edge as it sat from the left one
+        self.offsets["left"] = {}
+        for state, frames in self["right"].items():
+            width = self.atlas.size(state)[0]
+            self.offsets["left"][state] = [(width - x - frame.get_width(), y)
+                                           for frame, (x, y) in zip(frames, self.offsets["right"][state])]
+        return self["left"]
+
+    def offset(self, direction, state, index):
+        """Returns: (x, y) of the trimmed frame in the untrimmed one"""
+
+        self[direction]  # mirrors "left" on first use
+        return self.offsets[direction][state][index]
+
+    def size(self, state):
+        """Returns: (width, height) of the untrimmed frames of a state"""
+
+        return self.atlas.size(state)
+
+
+def load_atlas(manifest):
+    try:
+        return Atlas(manifest)
+    except FileNotFoundError as e:
+        print(f"Cannot load atlas: {e.filename}")
+        raise SystemExit
@@ -0,0 +1,157 @@
+"""
+Benchmark: building a prop-heavy Player/map.py map with and without the shared asset cache
+
+    uncached   every prop and tile decodes and scales its PNG, like the loaders did before
+    cached     asset_manager.cache, each file is decoded once, the floor is a TileSet index array
+
+and loading the Reaper of Map/player.py
+
+    eager      both directions from the sheets, each sheet decoded and scaled twice
+    mirrored   asset_manager.Animations, "left" mirrored from the "right" frames on the first turn
+
+Runs headless (SDL dummy video driver), from the repo root:
+    python bench_assets.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROPS = 400  # props placed on the map
+TILES = 100  # floor tiles, a 10x10 map
+CHARACTER_HEIGHT = 100  # Reaper frame height, GamePrototypeDienix/main.py uses 100
+
+
+def uncached_image(path, scale=None, size=None):
+    image = pygame.image.load(path).convert_alpha()
+    if scale is not None:
+        size = (int(image.get_width() * scale), int(image.get_height() * scale))
+    if size is not None:
+        image = pygame.transform.scale(image, size)
+    return image
+
+
+def build_uncached(map_module, rng):
+    # the same rng calls as build_cached: both runs place the same tiles and the same props
+    group = pygame.sprite.Group()
+    for _ in range(TILES):
+        files = sorted(f for f in os.listdir("tiles/Tiles") if f.endswith(".png"))
+        uncached_image(os.path.join("tiles/Tiles", files[rng.randrange(len(files))]),
+                       size=(map_module.TILE_SIZE, map_module.TILE_SIZE))
+    data = {**map_module.UNB_PROP_DATA, **map_module.BR_PROP_DATA}
+    types = list(data)
+    for _ in range(PROPS):
+        prop = data[rng.choice(types)]
+        sprite = pygame.sprite.Sprite()
+        sprite.image = uncached_image(prop["file"], scale=prop["scale"])
+        sprite.render_rect = sprite.image.get_rect()
+        sprite.collision_rect = pygame.Rect(0, 0, prop["col_w"], prop["col_h"])
+        group.add(sprite)
+    return group
+
+
+def build_cached(map_module, rng, screen):
+    group = pygame.sprite.Group()
+    tile_set = map_module.TileSet("tiles/Tiles", map_module.TILE_SIZE)
+    tile_set.load(tile_set.random_indexes(TILES, rng))
+    types = list(map_module.UNB_PROP_DATA) + list(map_module.BR_PROP_DATA)
+    for _ in range(PROPS):
+        prop_type = rng.choice(types)
+        # one prop per type drawn, each class only builds the types of its own table
+        if prop_type in map_module.UNB_PROP_DATA:
+            prop_class = map_module.UnbreakableProps
+        else:
+            prop_class = map_module.BreakableProps
+        prop_class(0, 0, prop_type, screen, group)
+    return group
+
+
+def uncached_sheet(path, num_frames, scale_to_height, flipped):
+    sheet = pygame.image.load(path).convert_alpha()
+    frame_width = sheet.get_width() // num_frames
+    frames = []
+    for i in range(num_frames):
+        frame = sheet.subsurface(pygame.Rect(i * frame_width, 0, frame_width, sheet.get_height()))
+        frame = pygame.transform.scale(frame, (int(frame_width * scale_to_height / sheet.get_height()), scale_to_height))
+        if flipped:
+            frame = pygame.transform.flip(frame, True, False)
+        frames.append(frame)
+    return frames
+
+
+def bench_reaper():
+    from asset_manager import Animations, cache, surface_bytes
+    sys.path.insert(0, os.path.join(ROOT, "Map"))
+    import player
+    path = os.path.join(ROOT, "GamePrototypeDienix", "spritesheets")
+    sheets = {"idle": ("idle.png", 18), "running": ("running.png", 12),
+              "idle_slashing": ("idle_slashing.png", 12), "running_slashing": ("running_slashing.png", 12)}
+
+    start = time.perf_counter()
+    eager = {direction: {state: uncached_sheet(os.path.join(path, file), frames, CHARACTER_HEIGHT, direction == "left")
+                         for state, (file, frames) in sheets.items()}
+             for direction in ("right", "left")}
+    eager_time = time.perf_counter() - start
+    eager_bytes = surface_bytes(frames for states in eager.values() for frames in states.values())
+
+    cache.clear()
+    decodes = cache.decodes
+    start = time.perf_counter()
+    reaper = player.Reaper(path, pygame.Rect(0, 0, 1000, 800), scale_to_height=CHARACTER_HEIGHT)
+    mirrored_time = time.perf_counter() - start
+    mirrored_bytes = surface_bytes(frames for frames in reaper.spritesheets_dict["right"].values())
+    start = time.perf_counter()
+    reaper.spritesheets_dict["left"]
+    turn_time = time.perf_counter() - start
+
+    print(f"Reaper, {CHARACTER_HEIGHT} px high")
+    print(f"eager:    {eager_time * 1000:.1f} ms, 8 decodes, {eager_bytes / 1024:.0f} KB of frames")
+    print(f"mirrored: {mirrored_time * 1000:.1f} ms, {cache.decodes - decodes} decodes, "
+          f"{mirrored_bytes / 1024:.0f} KB of frames, first turn left {turn_time * 1000:.1f} ms")
+
+
+def main():
+    pygame.init()
+    screen = pygame.display.set_mode((1000, 800))
+    # Player/map.py loads "Assets/Props/..." and "tiles/Tiles" relative to where it runs
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "Assets"))
+    os.makedirs(os.path.join(workdir, "tiles"))
+    os.symlink(os.path.join(ROOT, "Player", "Props"), os.path.join(workdir, "Assets", "Props"))
+    os.symlink(os.path.join(ROOT, "Player", "tiles"), os.path.join(workdir, "tiles", "Tiles"))
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.join(ROOT, "Player"))
+    import map as map_module
+    from asset_manager import cache
+
+    start = time.perf_counter()
+    uncached_props = build_uncached(map_module, random.Random(1))
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cached_props = build_cached(map_module, random.Random(1), screen)
+    cached = time.perf_counter() - start
+
+    # same workload: the same props, in the same order, at the same size
+    assert [sprite.image.get_size() for sprite in uncached_props] == \
+           [sprite.image.get_size() for sprite in cached_props]
+
+    stats = cache.stats()
+    print(f"{TILES} tiles + {PROPS} props")
+    print(f"uncached: {uncached * 1000:.1f} ms, {TILES + PROPS} decodes")
+    print(f"cached:   {cached * 1000:.1f} ms, {stats['decodes']} decodes, {stats['hits']} hits, "
+          f"{stats['misses']} misses, {stats['bytes'] / 1024:.0f} KB kept")
+    print(f"speedup:  {uncached / cached:.1f}x")
+    print()
+    bench_reaper()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: time to first frame of Map/test.py, loose PNGs against the prebuilt asset bundle
+
+    loose    decode, convert and scale every PNG, like Map/test.py without assets.bundle
+    bundle   cache.mount() the bundle, surfaces are made over its mapped pixels
+
+Each run is a fresh process, timed from pygame.init() to the first display flip. The PNGs
+and the bundle are read once before, so both sides load from the OS page cache.
+Builds the bundle first if there is none. Runs headless, from the repo root:
+    python bench_bundle.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RUNS = 5  # processes per side, alternating
+
+
+def first_frame(use_bundle):
+    import pygame
+    import build_bundle
+    map_test = build_bundle.import_map_test()
+    from asset_manager import cache
+
+    start = time.perf_counter()
+    pygame.init()
+    screen = pygame.display.set_mode(map_test.SCREEN_SIZE)
+    if use_bundle:
+        cache.mount()
+    map, player1 = map_test.load_game(os.path.join("Map", "map_tiles_assets"),
+                                      os.path.join("GamePrototypeDienix", "spritesheets"))
+    screen.blit(map.image, map.rect)
+    map.sturdy_walls_sprites_group.draw(screen)
+    screen.blit(player1.image, player1.rect)
+    pygame.display.flip()
+    print(time.perf_counter() - start, cache.decodes)
+
+
+def run(mode):
+    output = subprocess.run([sys.executable, __file__, mode], cwd=ROOT, capture_output=True, text=True,
+                            check=True).stdout.split()
+    return float(output[-2]), int(output[-1])
+
+
+def main():
+    from asset_manager import BUNDLE_FILE
+    if not os.path.exists(BUNDLE_FILE):
+        subprocess.run([sys.executable, "build_bundle.py"], cwd=ROOT, check=True)
+    times = {"loose": [], "bundle": []}
+    decodes = {}
+    run("loose")
+    run("bundle")  # warm the page cache
+    for _ in range(RUNS):
+        for mode in times:
+            seconds, decodes[mode] = run(mode)
+            times[mode].append(seconds)
+
+    print(f"Map/test.py, time to first frame, median of {RUNS} runs")
+    for mode, samples in times.items():
+        print(f"{mode + ':':8} {statistics.median(samples) * 1000:7.1f} ms, {decodes[mode]} decodes")
+    print(f"speedup: {statistics.median(times['loose']) / statistics.median(times['bundle']):.1f}x")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        os.chdir(ROOT)
+        sys.path.insert(0, ROOT)
+        first_frame(sys.argv[1] == "bundle")
+    else:
+        main()
@@ -0,0 +1,50 @@
+"""
+Offline build of assets.bundle, the pixels Map/test.py shows on its first frames
+
+Loads the map tiles and the Reaper like Map/test.py does, at its window size, mirrors the
+Reaper's "left" frames too, and writes the surfaces the game uses, scaled, flipped and in the
+display format. Map/test.py mounts the bundle at startup and decodes no PNG.
+Entries whose PNG changed since the build are skipped and load from the PNG, build again after
+changing assets or SCREEN_SIZE to get them back from the bundle.
+
+Runs headless (SDL dummy video driver), from the repo root:
+    python build_bundle.py
+"""
+
+import importlib.util
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_map_test():
+    # Map/test.py by path, "import test" would find the standard library package
+    sys.path.insert(0, os.path.join(ROOT, "Map"))
+    spec = importlib.util.spec_from_file_location("map_test", os.path.join(ROOT, "Map", "test.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    os.chdir(ROOT)
+    map_test = import_map_test()
+    from asset_manager import BUNDLE_FILE, cache
+
+    pygame.init()
+    pygame.display.set_mode(map_test.SCREEN_SIZE)
+    _, player1 = map_test.load_game(os.path.join("Map", "map_tiles_assets"),
+                                    os.path.join("GamePrototypeDienix", "spritesheets"))
+    player1.spritesheets_dict["left"]
+    saved = cache.save_bundle(BUNDLE_FILE)
+    print(f"Bundle saved as {BUNDLE_FILE}: {saved} assets, "
+          f"{os.path.getsize(BUNDLE_FILE) / 1024:.0f} KB")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()